@@ -0,0 +1,86 @@
+"""Per-table access plans for the record routes.
+
+A plan is built once per reflected table and holds what every create, edit
+and delete request would otherwise recompute: each column's Python type
+and string converter, the primary key columns, and INSERT/SELECT/UPDATE/
+DELETE statements whose primary key values are bind parameters. Executing
+the same statement object lets SQLAlchemy reuse its compiled form from the
+engine's compiled cache instead of building and compiling a new construct
+per request.
+
+SchemaCache.plan() keeps one plan per table and drops them whenever the
+schema is reflected again.
+"""
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Tuple
+
+from flask import abort
+from sqlalchemy import Table, bindparam, select
+
+from records import converter_for, python_type_for
+
+PK_PARAM_PREFIX = "pk_"
+
+
+class ColumnPlan(NamedTuple):
+    name: str
+    python_type: Any
+    convert: Callable[[str], Any]
+    autoincrement: bool
+
+
+class AccessPlan:
+    def __init__(self, table: Table) -> None:
+        self.table = table
+        self.columns = [
+            ColumnPlan(
+                column.name,
+                python_type_for(column),
+                converter_for(python_type_for(column)),
+                bool(column.autoincrement),
+            )
+            for column in table.columns
+        ]
+        self.converters = {plan.name: plan.convert for plan in self.columns}
+        self.pk_columns = list(table.primary_key.columns)
+        self.pk_names = [column.name for column in self.pk_columns]
+
+        by_pk = [column == bindparam(PK_PARAM_PREFIX + column.name) for column in self.pk_columns]
+        self.insert = table.insert()
+        self.select_by_pk = select(table).where(*by_pk)
+        # UPDATE without .values() takes its SET clause from the parameter keys.
+        self.update_by_pk = table.update().where(*by_pk)
+        self.delete_by_pk = table.delete().where(*by_pk)
+
+    def coerce(self, name: str, value: str) -> Any:
+        return None if value == "" else self.converters[name](value)
+
+    def payload(self, form_data: Mapping[str, str]) -> Dict[str, Any]:
+        """Same rules as records.build_payload, using the precomputed converters."""
+        payload: Dict[str, Any] = {}
+        for plan in self.columns:
+            if plan.name not in form_data:
+                if plan.python_type is bool:
+                    payload[plan.name] = False
+                continue
+            raw_value = form_data.get(plan.name, "")
+            if raw_value == "" and plan.autoincrement:
+                continue
+            payload[plan.name] = None if raw_value == "" else plan.convert(raw_value)
+        return payload
+
+    def pk_params(self, source: Mapping[str, str]) -> Dict[str, Any]:
+        """Bind parameters for the *_by_pk statements; 400 if a key field is missing."""
+        params = {}
+        for name in self.pk_names:
+            if name not in source:
+                abort(400, description=f"Missing primary key field '{name}'")
+            params[PK_PARAM_PREFIX + name] = self.coerce(name, source[name])
+        return params
+
+    def pk_key(self, pk_params: Mapping[str, Any]) -> Tuple[Any, ...]:
+        """The primary key values of ``pk_params``, in column order."""
+        return tuple(pk_params[PK_PARAM_PREFIX + name] for name in self.pk_names)
+
+    def pk_filters(self, pk_params: Mapping[str, Any]) -> List[Any]:
+        """Literal-valued filters for callers that build their own queries."""
+        return [column == pk_params[PK_PARAM_PREFIX + column.name] for column in self.pk_columns]
@@ -0,0 +1,443 @@
+"""GROUP BY queries over the reflected tables, described as JSON.
+
+``POST /api/aggregate`` (and ``python aggregate.py spec.json``) take a spec
+such as the caregiver earnings from alchemy.part2.py::
+
+    {
+      "table": "appointment",
+      "join": ["caregiver", {"table": "users", "as": "c", "via": "caregiver.caregiver_user_id"}],
+      "group_by": ["caregiver.caregiver_user_id", "c.given_name"],
+      "aggregates": [
+        {"fn": "sum", "expr": "work_hours", "as": "hours"},
+        {"fn": "avg", "expr": "caregiver.hourly_rate * appointment.work_hours", "as": "avg_pay"}
+      ],
+      "filters": {"status": "confirmed", "work_hours__gte": 1},
+      "order_by": ["-hours"],
+      "limit": 10
+    }
+
+and compile it to a single SELECT ... GROUP BY.
+
+* ``join`` adds tables along reflected foreign keys, in either direction,
+  to any table already in the query. ``as`` names a second copy of a table
+  and ``via`` picks the foreign key column when there is more than one.
+  ``"outer": true`` makes it a LEFT OUTER JOIN.
+* Column references are ``source.column``, or a bare column name that only
+  one source has. ``expr`` allows column references, numbers, ``+ - * /``
+  and parentheses.
+* ``fn`` is one of count, count_distinct, sum, avg, min and max; count
+  without ``expr`` is COUNT(*).
+* ``filters`` use the table browser's operators (see filters.py); a list
+  value means IN.
+* ``order_by`` names output columns, ``-`` for descending; by default rows
+  are ordered by the group-by columns.
+
+Limits, from the environment:
+
+* AGGREGATE_MAX_ROWS    - rows returned at most (default 1000); ``limit``
+  can only lower it. One extra row is fetched to report ``truncated``.
+* AGGREGATE_TIMEOUT_MS  - statement timeout (default 5000, 0 for none):
+  ``SET LOCAL statement_timeout`` on PostgreSQL, a progress handler that
+  interrupts the statement on SQLite.
+* AGGREGATE_MAX_JOINS   - joins per query (default 4).
+* AGGREGATE_CACHE_ENTRIES - results kept per process (default 256, 0 for
+  none), keyed on the normalized spec and the change versions of every
+  table it reads (see table_versions.py), so a write to any of them makes
+  the cached result unreachable.
+
+Decimals are returned as JSON numbers and dates as ISO strings.
+"""
+import argparse
+import datetime
+import decimal
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+from sqlalchemy import Table, and_, distinct, func, literal, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+
+from filters import column_filter
+
+MAX_ROWS = int(os.getenv("AGGREGATE_MAX_ROWS", "1000"))
+TIMEOUT_MS = int(os.getenv("AGGREGATE_TIMEOUT_MS", "5000"))
+MAX_JOINS = int(os.getenv("AGGREGATE_MAX_JOINS", "4"))
+CACHE_ENTRIES = int(os.getenv("AGGREGATE_CACHE_ENTRIES", "256"))
+
+FUNCTIONS: Dict[str, Callable[[Any], Any]] = {
+    "count": func.count,
+    "count_distinct": lambda expr: func.count(distinct(expr)),
+    "sum": func.sum,
+    "avg": func.avg,
+    "min": func.min,
+    "max": func.max,
+}
+OPERATORS = {
+    "+": lambda left, right: left + right,
+    "-": lambda left, right: left - right,
+    "*": lambda left, right: left * right,
+    "/": lambda left, right: left / right,
+}
+TOKEN = re.compile(
+    r"\s*(?:(?P<number>\d+(?:\.\d+)?)|(?P<name>[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)?)|(?P<op>[-+*/()]))"
+)
+# Only checks once every this many SQLite VM instructions.
+PROGRESS_STEPS = 10000
+POSTGRES_QUERY_CANCELED = "57014"
+
+
+class AggregateTimeout(Exception):
+    pass
+
+
+class Source(NamedTuple):
+    name: str
+    table: Table
+    selectable: Any
+
+
+class AggregateQuery(NamedTuple):
+    statement: Any
+    columns: List[str]
+    tables: List[str]
+    limit: int
+    normalized: str
+
+
+class _Sources:
+    """The tables a query reads, by the name column references use."""
+
+    def __init__(self, get_table: Callable[[str], Optional[Table]]) -> None:
+        self._get_table = get_table
+        self.by_name: Dict[str, Source] = {}
+
+    def add(self, table_name: Any, alias: Optional[str] = None) -> Source:
+        if not isinstance(table_name, str):
+            raise ValueError("Table names must be strings")
+        table = self._get_table(table_name)
+        if table is None:
+            raise ValueError(f"Unknown table '{table_name}'")
+        name = alias or table_name
+        if not re.fullmatch(r"[A-Za-z_]\w*", name):
+            raise ValueError(f"Invalid alias '{name}'")
+        if name in self.by_name:
+            raise ValueError(f"'{name}' is already in the query; name the second copy with 'as'")
+        source = Source(name, table, table.alias(name) if alias else table)
+        self.by_name[name] = source
+        return source
+
+    def column(self, ref: Any) -> Tuple[str, Any]:
+        """Resolve ``source.column`` or an unambiguous bare column name."""
+        if not isinstance(ref, str):
+            raise ValueError("Column references must be strings")
+        source_name, _, column_name = ref.rpartition(".")
+        if source_name:
+            source = self.by_name.get(source_name)
+            if source is None:
+                raise ValueError(f"Unknown source '{source_name}' in '{ref}'")
+            if column_name not in source.selectable.c:
+                raise ValueError(f"Unknown column '{column_name}' for '{source_name}'")
+            return f"{source_name}.{column_name}", source.selectable.c[column_name]
+        owners = [source for source in self.by_name.values() if column_name in source.selectable.c]
+        if not owners:
+            raise ValueError(f"Unknown column '{column_name}'")
+        if len(owners) > 1:
+            raise ValueError(f"Column '{column_name}' is ambiguous; qualify it with one of "
+                             + ", ".join(source.name for source in owners))
+        return f"{owners[0].name}.{column_name}", owners[0].selectable.c[column_name]
+
+    def join_condition(self, new: Source, via: Optional[str]):
+        candidates = []
+        for existing in self.by_name.values():
+            if existing is new:
+                continue
+            for child, parent in ((new, existing), (existing, new)):
+                for constraint in child.table.foreign_key_constraints:
+                    if constraint.referred_table.name != parent.table.name:
+                        continue
+                    pairs = [(element.parent.name, element.column.name) for element in constraint.elements]
+                    refs = {f"{child.name}.{local}" for local, _ in pairs}
+                    refs |= {f"{parent.name}.{remote}" for _, remote in pairs}
+                    condition = and_(*[
+                        child.selectable.c[local] == parent.selectable.c[remote] for local, remote in pairs
+                    ])
+                    candidates.append((refs, condition))
+        if via is not None:
+            candidates = [candidate for candidate in candidates if via in candidate[0]]
+        if not candidates:
+            raise ValueError(f"No foreign key joins '{new.name}' to the query"
+                             + (f" via '{via}'" if via else ""))
+        if len(candidates) > 1:
+            raise ValueError(f"More than one foreign key joins '{new.name}'; pick one with 'via'")
+        refs, condition = candidates[0]
+        return condition, sorted(refs)
+
+
+def _parse_expr(text: Any, sources: _Sources) -> Tuple[str, Any]:
+    """Parse arithmetic over column references; returns (canonical text, expression)."""
+    if not isinstance(text, str):
+        raise ValueError("'expr' must be a string")
+    tokens: List[Tuple[str, str]] = []
+    position = 0
+    while position < len(text.rstrip()):
+        match = TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Cannot parse expression '{text}' at position {position}")
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+    tokens.append(("end", ""))
+    index = 0
+
+    def take(*values: str) -> Optional[str]:
+        nonlocal index
+        kind, value = tokens[index]
+        if kind == "op" and value in values:
+            index += 1
+            return value
+        return None
+
+    def binary(operand, operators: Tuple[str, ...]):
+        canonical, expr = operand()
+        while True:
+            operator = take(*operators)
+            if operator is None:
+                return canonical, expr
+            right_canonical, right = operand()
+            canonical, expr = f"({canonical} {operator} {right_canonical})", OPERATORS[operator](expr, right)
+
+    def factor():
+        nonlocal index
+        kind, value = tokens[index]
+        if take("("):
+            inner = binary(term, ("+", "-"))
+            if not take(")"):
+                raise ValueError(f"Missing ')' in expression '{text}'")
+            return inner
+        if take("-"):
+            canonical, expr = factor()
+            return f"(-{canonical})", -expr
+        index += 1
+        if kind == "number":
+            number = decimal.Decimal(value) if "." in value else int(value)
+            return value, literal(number)
+        if kind == "name":
+            return sources.column(value)
+        raise ValueError(f"Unexpected '{value or 'end'}' in expression '{text}'")
+
+    def term():
+        return binary(factor, ("*", "/"))
+
+    result = binary(term, ("+", "-"))
+    if tokens[index][0] != "end":
+        raise ValueError(f"Unexpected '{tokens[index][1]}' in expression '{text}'")
+    return result
+
+
+def _items(spec: Mapping[str, Any], key: str) -> List[Any]:
+    items = spec.get(key) or []
+    if not isinstance(items, list):
+        raise ValueError(f"'{key}' must be a list")
+    return items
+
+
+def parse_aggregate(spec: Any, get_table: Callable[[str], Optional[Table]], max_rows: int = MAX_ROWS,
+                    max_joins: int = MAX_JOINS) -> AggregateQuery:
+    """Validate a JSON spec and compile it; raises ValueError for bad input."""
+    if not isinstance(spec, Mapping):
+        raise ValueError("Expected a JSON object")
+    sources = _Sources(get_table)
+    base = sources.add(spec.get("table"))
+    from_clause = base.selectable
+    normalized: Dict[str, Any] = {"table": base.name, "join": []}
+
+    joins = _items(spec, "join")
+    if len(joins) > max_joins:
+        raise ValueError(f"At most {max_joins} joins are allowed")
+    for item in joins:
+        if isinstance(item, str):
+            item = {"table": item}
+        if not isinstance(item, Mapping):
+            raise ValueError("Each join is a table name or an object")
+        source = sources.add(item.get("table"), item.get("as"))
+        condition, refs = sources.join_condition(source, item.get("via"))
+        outer = bool(item.get("outer"))
+        from_clause = from_clause.join(source.selectable, condition, isouter=outer)
+        normalized["join"].append([source.table.name, source.name, refs, outer])
+
+    labels: Dict[str, Any] = {}
+    selected = []
+
+    def output(label: Any, expr) -> None:
+        if not isinstance(label, str) or not label:
+            raise ValueError("Output column names must be non-empty strings")
+        if label in labels:
+            raise ValueError(f"Duplicate output column '{label}'; name it with 'as'")
+        labels[label] = expr
+        selected.append(expr.label(label))
+
+    group_by = []
+    normalized["group_by"] = []
+    for item in _items(spec, "group_by"):
+        if isinstance(item, str):
+            item = {"column": item}
+        if not isinstance(item, Mapping):
+            raise ValueError("Each group_by entry is a column reference or an object")
+        ref, column = sources.column(item.get("column"))
+        label = item.get("as") or ref.rpartition(".")[2]
+        output(label, column)
+        group_by.append(column)
+        normalized["group_by"].append([label, ref])
+
+    normalized["aggregates"] = []
+    for item in _items(spec, "aggregates"):
+        if not isinstance(item, Mapping):
+            raise ValueError("Each aggregate is an object with 'fn'")
+        name = str(item.get("fn", "")).lower()
+        if name not in FUNCTIONS:
+            raise ValueError(f"Unknown aggregate function '{name}'; use one of {', '.join(FUNCTIONS)}")
+        if item.get("expr") is None:
+            if name != "count":
+                raise ValueError(f"'{name}' needs an 'expr'")
+            canonical, expr = "*", func.count()
+        else:
+            canonical, argument = _parse_expr(item["expr"], sources)
+            expr = FUNCTIONS[name](argument)
+        label = item.get("as") or "_".join([name] + re.findall(r"\w+", canonical))
+        output(label, expr)
+        normalized["aggregates"].append([label, name, canonical])
+    if not selected:
+        raise ValueError("Give at least one 'group_by' column or aggregate")
+
+    filters = spec.get("filters") or {}
+    if not isinstance(filters, Mapping):
+        raise ValueError("'filters' must be an object")
+    where = []
+    normalized["filters"] = []
+    for key, value in filters.items():
+        target, _, operator = key.partition("__")
+        ref, column = sources.column(target)
+        values = value if isinstance(value, list) else [value]
+        raw = ["" if item is None else str(item) for item in values]
+        if not raw:
+            raise ValueError(f"Filter '{key}' has no values")
+        where.append(column_filter(column, operator, raw))
+        normalized["filters"].append([ref, operator, sorted(raw)])
+    normalized["filters"].sort()
+
+    order_by = []
+    normalized["order_by"] = []
+    for item in _items(spec, "order_by"):
+        if not isinstance(item, str):
+            raise ValueError("order_by entries are output column names")
+        label = item.lstrip("-")
+        if label not in labels:
+            raise ValueError(f"Cannot order by '{label}'; it is not an output column")
+        order_by.append(labels[label].desc() if item.startswith("-") else labels[label].asc())
+        normalized["order_by"].append(item)
+    if not order_by:
+        order_by = list(group_by)
+
+    try:
+        limit = int(spec.get("limit", max_rows))
+    except (TypeError, ValueError):
+        raise ValueError("'limit' must be an integer")
+    limit = max(1, min(limit, max_rows))
+    normalized["limit"] = limit
+
+    statement = select(*selected).select_from(from_clause).where(*where).group_by(*group_by).order_by(*order_by)
+    return AggregateQuery(
+        statement=statement,
+        columns=list(labels),
+        tables=sorted({source.table.name for source in sources.by_name.values()}),
+        limit=limit,
+        normalized=json.dumps(normalized, sort_keys=True, separators=(",", ":")),
+    )
+
+
+@contextmanager
+def statement_timeout(conn: Connection, timeout_ms: int) -> Iterator[None]:
+    if timeout_ms <= 0:
+        yield
+        return
+    if conn.dialect.name == "postgresql":
+        # Scoped to the transaction, which ends when the connection is returned.
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+        yield
+        return
+    if conn.dialect.name != "sqlite":
+        yield
+        return
+    deadline = time.monotonic() + timeout_ms / 1000
+    driver = conn.connection.driver_connection
+    driver.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+    try:
+        yield
+    finally:
+        driver.set_progress_handler(None, 0)
+
+
+def _timed_out(exc: OperationalError) -> bool:
+    original = getattr(exc, "orig", None)
+    return getattr(original, "pgcode", None) == POSTGRES_QUERY_CANCELED or "interrupted" in str(original)
+
+
+def run_aggregate(conn: Connection, query: AggregateQuery, timeout_ms: int = TIMEOUT_MS) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        with statement_timeout(conn, timeout_ms):
+            rows = conn.execute(query.statement.limit(query.limit + 1)).all()
+    except OperationalError as exc:
+        if _timed_out(exc):
+            raise AggregateTimeout(f"Query exceeded the {timeout_ms} ms time limit") from exc
+        raise
+    return {
+        "columns": query.columns,
+        "rows": [list(row) for row in rows[:query.limit]],
+        "row_count": min(len(rows), query.limit),
+        "truncated": len(rows) > query.limit,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def json_value(value: Any) -> Any:
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(result: Mapping[str, Any]) -> str:
+    return json.dumps(result, default=json_value)
+
+
+def main() -> None:
+    from database import make_engine
+    from schema_cache import schema_cache_from_env
+
+    parser = argparse.ArgumentParser(description="Run a JSON aggregation spec and print the result.")
+    parser.add_argument("spec", help="JSON file with the query spec, or - for stdin")
+    parser.add_argument("--timeout-ms", type=int, default=TIMEOUT_MS)
+    parser.add_argument("--sql", action="store_true", help="print the compiled SQL instead of running it")
+    args = parser.parse_args()
+
+    spec = json.load(sys.stdin if args.spec == "-" else open(args.spec))
+    engine = make_engine()
+    try:
+        query = parse_aggregate(spec, schema_cache_from_env(engine).get_table)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.sql:
+        print(query.statement.limit(query.limit + 1).compile(engine))
+        return
+    with engine.connect() as conn:
+        print(json.dumps(run_aggregate(conn, query, args.timeout_ms), default=json_value, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,144 +1,276 @@
+import glob
+import io
+import json
 import os
-from typing import Any, Dict, Iterable, List, Mapping
-
-from flask import Flask, abort, flash, redirect, render_template, request, url_for
-from sqlalchemy import MetaData, Table, create_engine, func, select
-from sqlalchemy.engine import Engine, Row
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from flask import (
+    Flask,
+    Response,
+    abort,
+    flash,
+    get_flashed_messages,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    stream_template,
+    stream_with_context,
+    url_for,
+)
+from sqlalchemy import Table
 from sqlalchemy.exc import SQLAlchemyError
 
-
-def python_type_for(column) -> Any:
-    try:
-        return column.type.python_type
-    except NotImplementedError:
-        return str
-
-
-def coerce_value(column, value: str) -> Any:
-    if value == "":
-        return None
-    python_type = python_type_for(column)
-    if python_type is bool:
-        return value.lower() in {"1", "true", "yes", "on"}
-    if python_type is int:
-        return int(value)
-    if python_type is float:
-        return float(value)
-    return python_type(value)
-
-
-def normalize_database_url(database_url: str) -> str:
-    """Ensure SQLAlchemy understands URLs from managed hosts like Render."""
-    database_url = database_url.strip()
-    if database_url.startswith("postgres://"):
-        database_url = database_url.replace("postgres://", "postgresql+psycopg2://", 1)
-    if "sslmode=" not in database_url:
-        separator = "&" if "?" in database_url else "?"
-        database_url = f"{database_url}{separator}sslmode=require"
-    return database_url
-
-
-def make_engine() -> Engine:
-    """Create a SQLAlchemy engine using DATABASE_URL or the local default."""
-    database_url = os.getenv("DATABASE_URL")
-    if not database_url:
-        database_url = "sqlite:///local.db"
-    database_url = normalize_database_url(database_url)
-    return create_engine(database_url, future=True)
+from access_plan import AccessPlan
+from aggregate import CACHE_ENTRIES as AGGREGATE_CACHE_ENTRIES, AggregateTimeout, dumps, parse_aggregate, run_aggregate
+from batch_ops import DEFAULT_CHUNK_SIZE, BatchReport, delete_keys, parse_keys, parse_values, update_rows
+from bulk_import import DEFAULT_BATCH_SIZE, FORMATS, detect_format, import_rows, read_rows
+from database import make_engine, pool_status
+from export import FORMATS as EXPORT_FORMATS, MIMETYPES as EXPORT_MIMETYPES, export_chunks, parse_key
+from filters import parse_table_query, text_columns
+from fk_lookup import CACHE_ENTRIES as LOOKUP_CACHE_ENTRIES, build_lookup, clamp_limit, lookup_columns, search
+from instrumentation import instrumentation_from_env
+from pagination import StreamedPage, buffered, clamp_page_size, page_key_columns
+from records import (
+    RowLinks,
+    cursor_values_or_400,
+    inserted_pk_filters,
+    python_type_for,
+)
+from replicas import router_from_env
+from reporting import REPORT_MAX_AGE, REPORTS, ReportStore, report_title
+from row_cache import row_cache_from_env
+from row_counts import counter_from_env
+from schema_cache import schema_cache_from_env
+from table_versions import PageCache, TableVersions, code_fingerprint, dependents, page_cache_from_env, page_etag
 
 
 engine = make_engine()
 
-# Initialize database on first run
+# Apply pending migrations; a new database is also seeded from assigm3.sql.
 try:
     from init_db import init_database
-    init_database()
+    init_database(engine)
 except Exception as e:
     print(f"Note: Database initialization skipped: {e}")
 
-metadata = MetaData()
-metadata.reflect(bind=engine)
+schema = schema_cache_from_env(engine)
+metadata = schema.metadata
+
+row_counter = counter_from_env()
+reports = ReportStore(schema.get_table)
+versions = TableVersions(engine, schema.all_tables)
+page_cache = page_cache_from_env()
+aggregate_cache = PageCache(AGGREGATE_CACHE_ENTRIES)
+lookup_cache = PageCache(LOOKUP_CACHE_ENTRIES)
+row_cache = row_cache_from_env()
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_FINGERPRINT = code_fingerprint(
+    glob.glob(os.path.join(APP_DIR, "*.py")) + glob.glob(os.path.join(APP_DIR, "templates", "*.html"))
+)
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-key")
 app.jinja_env.globals["python_type_for"] = python_type_for
 
+instrumentation = instrumentation_from_env()
+instrumentation.install(app, engine)
+
+# Read-only routes use a replica when DATABASE_REPLICA_URLS is set; writes,
+# reflection and report refreshes stay on the primary.
+router = router_from_env(engine)
+for replica in router.replicas:
+    instrumentation.instrument_engine(replica.engine)
+
+
+def conditional(response: Response, etag: str) -> Response:
+    response.set_etag(etag)
+    # Cacheable, but the browser revalidates every time.
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 
 def get_table_or_404(table_name: str) -> Table:
-    table = metadata.tables.get(table_name)
+    table = schema.get_table(table_name)
     if table is None:
         abort(404, description=f"Unknown table '{table_name}'")
     return table
 
 
-def build_payload(table: Table, form_data: Mapping[str, str]) -> Dict[str, Any]:
-    payload: Dict[str, Any] = {}
-    for column in table.columns:
-        python_type = python_type_for(column)
-        if column.name not in form_data:
-            if python_type is bool:
-                payload[column.name] = False
-            continue
-        raw_value = form_data.get(column.name, "")
-        if raw_value == "" and column.autoincrement:
-            continue
-        payload[column.name] = coerce_value(column, raw_value)
-    return payload
-
-
-def build_pk_filters(table: Table, source: Mapping[str, str]) -> List[Any]:
-    filters = []
-    for column in table.primary_key.columns:
-        if column.name not in source:
-            abort(400, description=f"Missing primary key field '{column.name}'")
-        filters.append(column == coerce_value(column, source[column.name]))
-    return filters
-
-
-def rows_with_metadata(table: Table, raw_rows: Iterable[Row]) -> List[Dict[str, Any]]:
-    rows = []
-    pk_columns = [col.name for col in table.primary_key.columns]
-    for raw in raw_rows:
-        mapping = dict(raw._mapping)
-        pk_values = {pk: mapping[pk] for pk in pk_columns}
-        edit_url = url_for("edit_record", table_name=table.name, **pk_values)
-        rows.append({"data": mapping, "pk": pk_values, "edit_url": edit_url})
-    return rows
+def get_plan_or_404(table_name: str) -> AccessPlan:
+    plan = schema.plan(table_name)
+    if plan is None:
+        abort(404, description=f"Unknown table '{table_name}'")
+    return plan
+
+
+def rows_written(table: Table, keys: Optional[List[Tuple[Any, ...]]] = None, cascade: bool = False) -> None:
+    """Drop committed changes from the row cache: ``keys`` of ``table`` (all
+    of its rows without keys) and, for deletes, every row of the tables that
+    reference it.
+    """
+    if not row_cache.enabled:
+        return
+    if keys is None:
+        row_cache.invalidate([table.name])
+    else:
+        row_cache.discard(table.name, keys)
+    if cascade:
+        row_cache.invalidate([child.name for child in dependents(table, schema.all_tables()) if child is not table])
 
 
 @app.route("/")
 def index():
-    tables = sorted(metadata.tables.values(), key=lambda t: t.name)
-    counts: Dict[str, int] = {}
-    with engine.connect() as conn:
-        for table in tables:
-            counts[table.name] = conn.execute(
-                select(func.count()).select_from(table)
-            ).scalar_one()
-    return render_template("index.html", tables=tables, counts=counts)
+    tables = schema.all_tables()
+    read_engine = router.for_read()
+    etag = None
+    if not get_flashed_messages():
+        current = versions.current(read_engine, [table.name for table in tables])
+        etag = page_etag(CODE_FINGERPRINT, ("index", row_counter.mode, sorted(current.items())))
+        if request.if_none_match.contains(etag):
+            return conditional(Response(status=304), etag)
+    with read_engine.connect() as conn:
+        counts = row_counter.counts(conn, tables)
+    response = Response(render_template("index.html", tables=tables, counts=counts))
+    return conditional(response, etag) if etag else response
+
+
+@app.route("/stats/pool")
+def pool_stats():
+    return jsonify(pool_status(engine))
+
+
+@app.route("/stats/replicas")
+def replica_stats():
+    return jsonify(router.status())
+
+
+@app.route("/stats/row-cache")
+def row_cache_stats():
+    return jsonify(row_cache.stats())
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(
+        instrumentation.render_metrics(pool=pool_status(engine), replicas=router.status(), row_cache=row_cache.stats()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@app.route("/reports")
+def list_reports():
+    return jsonify({
+        name: {"title": report_title(name), "url": url_for("show_report", report_name=name)}
+        for name in REPORTS
+    })
+
+
+@app.route("/reports/<report_name>")
+def show_report(report_name: str):
+    if report_name not in REPORTS:
+        abort(404, description=f"Unknown report '{report_name}'")
+    with engine.begin() as conn:
+        data = reports.run(conn, report_name)
+    response = jsonify(report=report_name, title=report_title(report_name), data=data)
+    response.cache_control.public = True
+    response.cache_control.max_age = REPORT_MAX_AGE
+    return response
 
 
 @app.route("/table/<table_name>")
 def view_table(table_name: str):
     table = get_table_or_404(table_name)
-    with engine.connect() as conn:
-        result = conn.execute(select(table))
-        rows = rows_with_metadata(table, result)
-    return render_template(
-        "table.html",
-        table=table,
-        rows=rows,
+    page_size = clamp_page_size(request.args.get("page_size"))
+    try:
+        query = parse_table_query(table, request.args, engine.dialect.name)
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    key_columns = page_key_columns(table, query.sort_column)
+    after = request.args.get("after")
+    before = request.args.get("before")
+    after_values = cursor_values_or_400(key_columns, after) if after else None
+    before_values = cursor_values_or_400(key_columns, before) if before else None
+    links = RowLinks(table, url_for)
+    read_engine = router.for_read()
+    # Pop flashed messages now: session changes made while the body streams
+    # would never reach the cookie. The template reads them back from the
+    # request context. A page showing them is not cached.
+    cache_key = etag = None
+    if not get_flashed_messages(with_categories=True):
+        version = versions.current(read_engine, [table.name])[table.name]
+        cache_key = (table.name, tuple(sorted(request.args.items(multi=True))), version)
+        etag = page_etag(CODE_FINGERPRINT, cache_key)
+        if request.if_none_match.contains(etag):
+            return conditional(Response(status=304), etag)
+        cached = page_cache.get(cache_key)
+        if cached is not None:
+            return conditional(Response(cached, content_type="text/html; charset=utf-8"), etag)
+
+    @stream_with_context
+    def render() -> Iterator[str]:
+        # The connection stays checked out until the last row is rendered.
+        with read_engine.connect() as conn:
+            page = StreamedPage(
+                conn,
+                table,
+                page_size,
+                after=after_values,
+                before=before_values,
+                where=query.filters,
+                sort_column=query.sort_column,
+                descending=query.descending,
+            )
+            yield from buffered(stream_template(
+                "table.html",
+                table=table,
+                rows=page,
+                page=page,
+                links=links,
+                page_size=page_size,
+                query=query,
+                searchable=bool(text_columns(table)),
+                export_formats=EXPORT_FORMATS,
+            ))
+
+    body = render()
+    if cache_key is None:
+        return Response(body, content_type="text/html; charset=utf-8")
+    return conditional(Response(page_cache.filling(cache_key, body), content_type="text/html; charset=utf-8"), etag)
+
+
+@app.route("/table/<table_name>/export")
+def export_table(table_name: str):
+    table = get_table_or_404(table_name)
+    fmt = request.args.get("format", "csv")
+    columns = [name for name in request.args.get("columns", "").split(",") if name]
+    try:
+        start = parse_key(table, request.args["start"]) if request.args.get("start") else None
+        end = parse_key(table, request.args["end"]) if request.args.get("end") else None
+        chunks = export_chunks(router.for_read(), table, fmt, columns=columns or None, start=start, end=end)
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    return Response(
+        chunks,
+        content_type=EXPORT_MIMETYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{table.name}.{fmt}"'},
     )
 
 
 @app.route("/table/<table_name>/create", methods=["GET", "POST"])
 def create_record(table_name: str):
-    table = get_table_or_404(table_name)
+    plan = get_plan_or_404(table_name)
+    table = plan.table
     if request.method == "POST":
-        payload = build_payload(table, request.form)
+        payload = plan.payload(request.form)
         try:
             with engine.begin() as conn:
-                conn.execute(table.insert().values(**payload))
+                result = conn.execute(plan.insert, payload)
+                inserted = inserted_pk_filters(table, result.inserted_primary_key)
+                reports.refresh(conn, reports.capture(conn, table, inserted))
+                versions.bump(conn, table)
+            row_counter.invalidate(table)
+            router.wrote()
             flash(f"Created record in '{table_name}'.", "success")
         except SQLAlchemyError as exc:
             flash(f"Create failed: {exc}", "error")
@@ -150,45 +282,246 @@ def create_record(table_name: str):
         values={},
         action="Create",
         pk_fields=[],
+        lookups=lookup_urls(table),
     )
 
 
+def lookup_urls(table: Table) -> Dict[str, str]:
+    return {
+        name: url_for("api_lookup", table_name=table.name, column_name=name)
+        for name in lookup_columns(table)
+    }
+
+
+@app.route("/table/<table_name>/import", methods=["GET", "POST"])
+def import_records(table_name: str):
+    table = get_table_or_404(table_name)
+    report = None
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if upload is None or not upload.filename:
+            flash("Choose a CSV or JSONL file to import.", "error")
+            return redirect(url_for("import_records", table_name=table_name))
+        try:
+            fmt = detect_format(upload.filename, request.form.get("format") or None)
+        except ValueError as exc:
+            abort(400, description=str(exc))
+        batch_size = request.form.get("batch_size", type=int) or DEFAULT_BATCH_SIZE
+        stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+        report = import_rows(engine, table, read_rows(stream, fmt), batch_size=batch_size)
+        row_counter.invalidate(table)
+        router.wrote()
+        if report.rows_inserted:
+            with engine.begin() as conn:
+                reports.rebuild(conn)
+                versions.bump(conn, table)
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify(report.as_dict())
+
+    return render_template("import.html", table=table, report=report, formats=FORMATS)
+
+
 @app.route("/table/<table_name>/edit", methods=["GET", "POST"])
 def edit_record(table_name: str):
-    table = get_table_or_404(table_name)
-    pk_filters = build_pk_filters(table, request.values if request.method == "POST" else request.args)
+    plan = get_plan_or_404(table_name)
+    table = plan.table
+    pk_params = plan.pk_params(request.values if request.method == "POST" else request.args)
+    pk_filters = plan.pk_filters(pk_params)
 
     if request.method == "POST":
-        payload = build_payload(table, request.form)
+        payload = plan.payload(request.form)
         try:
             with engine.begin() as conn:
-                conn.execute(table.update().where(*pk_filters).values(**payload))
+                before = reports.capture(conn, table, pk_filters)
+                conn.execute(plan.update_by_pk, {**payload, **pk_params})
+                reports.refresh(conn, before, reports.capture(conn, table, pk_filters))
+                versions.bump(conn, table)
+            row_counter.invalidate(table)
+            rows_written(table, [plan.pk_key(pk_params)])
+            router.wrote()
             flash(f"Updated record in '{table_name}'.", "success")
         except SQLAlchemyError as exc:
             flash(f"Update failed: {exc}", "error")
         return redirect(url_for("view_table", table_name=table_name))
 
-    with engine.connect() as conn:
-        row = conn.execute(select(table).where(*pk_filters)).first()
-    if row is None:
+    def load():
+        with router.for_read().connect() as conn:
+            row = conn.execute(plan.select_by_pk, pk_params).first()
+        return row._mapping if row is not None else None
+
+    values = row_cache.get_or_load(table.name, plan.pk_key(pk_params), load)
+    if values is None:
         abort(404, description="Record not found")
 
     return render_template(
         "form.html",
         table=table,
-        values=dict(row._mapping),
+        values=values,
         action="Update",
-        pk_fields=[col.name for col in table.primary_key.columns],
+        pk_fields=plan.pk_names,
+        lookups=lookup_urls(table),
     )
 
 
+@app.route("/table/<table_name>/batch", methods=["POST"])
+def batch_records(table_name: str):
+    plan = get_plan_or_404(table_name)
+    action = request.form.get("action")
+    tokens = request.form.getlist("key")
+    if action not in ("delete", "update"):
+        abort(400, description=f"Unknown batch action '{action}'")
+    if not tokens:
+        flash("Select at least one row.", "error")
+        return redirect(url_for("view_table", table_name=table_name))
+    keys = [tuple(cursor_values_or_400(plan.pk_columns, token)) for token in tokens]
+    if action == "update":
+        column_name = request.form.get("set_column", "")
+        if column_name in plan.pk_names:
+            abort(400, description="Primary key columns cannot be batch updated")
+        try:
+            new_values = parse_values(plan, {column_name: request.form.get("set_value", "")})
+        except (TypeError, ValueError, ArithmeticError) as exc:
+            abort(400, description=str(exc))
+
+    try:
+        with engine.begin() as conn:
+            if action == "delete":
+                report = delete_keys(conn, plan, keys, reports)
+            else:
+                report = update_rows(conn, plan, [(key, new_values) for key in keys], reports)
+            versions.bump(conn, plan.table)
+        row_counter.invalidate(plan.table)
+        rows_written(plan.table, keys, cascade=action == "delete")
+        router.wrote()
+        verb = "Deleted" if action == "delete" else "Updated"
+        flash(
+            f"{verb} {report.rows_affected} of {report.keys} selected records in '{table_name}' "
+            f"({len(report.chunks)} statement{'s' if len(report.chunks) != 1 else ''}, {report.elapsed * 1000:.1f} ms).",
+            "success",
+        )
+    except SQLAlchemyError as exc:
+        flash(f"Batch {action} failed: {exc}", "error")
+    return redirect(url_for("view_table", table_name=table_name))
+
+
+def _run_batch(plan: AccessPlan, run: Callable[[Any], BatchReport]):
+    try:
+        with engine.begin() as conn:
+            report = run(conn)
+            versions.bump(conn, plan.table)
+    except SQLAlchemyError as exc:
+        return jsonify(error=str(getattr(exc, "orig", exc)).strip()), 409
+    row_counter.invalidate(plan.table)
+    rows_written(plan.table, cascade=report.operation == "delete")
+    router.wrote()
+    return jsonify(report.as_dict())
+
+
+@app.route("/api/table/<table_name>/batch-delete", methods=["POST"])
+def api_batch_delete(table_name: str):
+    """Body: ``{"keys": [{pk: value, ...}, ...], "chunk_size": 1000}``."""
+    plan = get_plan_or_404(table_name)
+    body = request.get_json(silent=True)
+    try:
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object")
+        keys = parse_keys(plan, body.get("keys") or [])
+        chunk_size = int(body.get("chunk_size", DEFAULT_CHUNK_SIZE))
+    except (TypeError, ValueError, ArithmeticError) as exc:
+        return jsonify(error=str(exc)), 400
+    return _run_batch(plan, lambda conn: delete_keys(conn, plan, keys, reports, chunk_size))
+
+
+@app.route("/api/table/<table_name>/batch-update", methods=["POST"])
+def api_batch_update(table_name: str):
+    """Body: ``{"rows": [{pk: value, column: value, ...}, ...]}`` for per-row
+    values, or ``{"keys": [...], "values": {column: value}}``; both accept
+    ``chunk_size``.
+    """
+    plan = get_plan_or_404(table_name)
+    body = request.get_json(silent=True)
+    try:
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object")
+        if "rows" in body:
+            rows = body["rows"] or []
+            keys = parse_keys(plan, rows)
+            pairs = list(zip(keys, [parse_values(plan, row) for row in rows]))
+        else:
+            shared = body.get("values")
+            if not isinstance(shared, dict):
+                raise ValueError("Expected 'rows', or 'keys' with a 'values' object")
+            new_values = parse_values(plan, shared)
+            pairs = [(key, new_values) for key in parse_keys(plan, body.get("keys") or [])]
+        chunk_size = int(body.get("chunk_size", DEFAULT_CHUNK_SIZE))
+    except (TypeError, ValueError, ArithmeticError) as exc:
+        return jsonify(error=str(exc)), 400
+    return _run_batch(plan, lambda conn: update_rows(conn, plan, pairs, reports, chunk_size))
+
+
+@app.route("/api/aggregate", methods=["POST"])
+def api_aggregate():
+    """Body: an aggregation spec (see aggregate.py). Results are cached
+    until one of the tables the query reads changes.
+    """
+    try:
+        query = parse_aggregate(request.get_json(silent=True), schema.get_table)
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+    read_engine = router.for_read()
+    cache_key = (query.normalized, tuple(sorted(versions.current(read_engine, query.tables).items())))
+    body = aggregate_cache.get(cache_key)
+    cache_status = "hit" if body is not None else "miss"
+    if body is None:
+        try:
+            with read_engine.connect() as conn:
+                body = dumps(run_aggregate(conn, query))
+        except AggregateTimeout as exc:
+            return jsonify(error=str(exc)), 504
+        except SQLAlchemyError as exc:
+            return jsonify(error=str(getattr(exc, "orig", exc)).strip()), 400
+        aggregate_cache.put(cache_key, body)
+    response = Response(body, content_type="application/json")
+    response.headers["X-Aggregate-Cache"] = cache_status if aggregate_cache.enabled else "off"
+    return response
+
+
+@app.route("/api/table/<table_name>/lookup/<column_name>")
+def api_lookup(table_name: str, column_name: str):
+    """Autocomplete suggestions for a foreign key column (see fk_lookup.py)."""
+    table = get_table_or_404(table_name)
+    lookup = build_lookup(table, column_name, schema.get_table)
+    if lookup is None:
+        abort(404, description=f"'{column_name}' is not a foreign key of '{table_name}'")
+    q = request.args.get("q", "").strip()
+    limit = clamp_limit(request.args.get("limit"))
+    read_engine = router.for_read()
+    cache_key = (table.name, column_name, q, limit, tuple(sorted(versions.current(read_engine, lookup.tables).items())))
+    etag = page_etag(CODE_FINGERPRINT, cache_key)
+    if request.if_none_match.contains(etag):
+        return conditional(Response(status=304), etag)
+    body = lookup_cache.get(cache_key)
+    if body is None:
+        with read_engine.connect() as conn:
+            body = json.dumps(search(conn, lookup, q, limit), default=str)
+        lookup_cache.put(cache_key, body)
+    return conditional(Response(body, content_type="application/json"), etag)
+
+
 @app.route("/table/<table_name>/delete", methods=["POST"])
 def delete_record(table_name: str):
-    table = get_table_or_404(table_name)
-    pk_filters = build_pk_filters(table, request.form)
+    plan = get_plan_or_404(table_name)
+    pk_params = plan.pk_params(request.form)
+    pk_filters = plan.pk_filters(pk_params)
     try:
         with engine.begin() as conn:
-            conn.execute(table.delete().where(*pk_filters))
+            touched = reports.capture(conn, plan.table, pk_filters)
+            conn.execute(plan.delete_by_pk, pk_params)
+            reports.refresh(conn, touched)
+            versions.bump(conn, plan.table)
+        row_counter.invalidate(plan.table)
+        rows_written(plan.table, [plan.pk_key(pk_params)], cascade=True)
+        router.wrote()
         flash(f"Deleted record from '{table_name}'.", "success")
     except SQLAlchemyError as exc:
         flash(f"Delete failed: {exc}", "error")
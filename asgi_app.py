@@ -0,0 +1,376 @@
+"""ASGI variant of the table browser on SQLAlchemy's AsyncEngine.
+
+    hypercorn asgi_app:app --workers 2 --bind 0.0.0.0:$PORT
+
+Needs the optional packages in requirements-asgi.txt: ``quart`` and
+``hypercorn``, plus ``asyncpg`` (PostgreSQL) or ``aiosqlite`` (SQLite);
+database.async_database_url() picks the driver from DATABASE_URL. The
+routes, templates, access plans, coercion (records.py), paging, filtering
+and report refreshes are the ones app.py uses: the existing sync
+helpers run against the async connection through ``run_sync``, so a slow
+query suspends one request instead of blocking a whole worker. The index
+page counts each table on its own connection, concurrently.
+
+Bulk import and export still use the blocking drivers (COPY through
+psycopg2); they run in a thread so the event loop stays free. The
+instrumentation, ETags, page and row caches, /metrics, /reports,
+/api/aggregate and foreign key lookup endpoints are only served by
+app.py; writes made here reach a shared row cache only through its TTL.
+"""
+import asyncio
+import io
+import os
+from typing import Any, AsyncIterator, Dict, Iterator, List
+
+from quart import Quart, Response, abort, flash, jsonify, redirect, render_template, request, url_for
+from sqlalchemy import Table
+from sqlalchemy.exc import SQLAlchemyError
+
+from access_plan import AccessPlan
+from batch_ops import DEFAULT_CHUNK_SIZE, delete_keys, parse_keys, parse_values, update_rows
+from bulk_import import DEFAULT_BATCH_SIZE, FORMATS, detect_format, import_rows, read_rows
+from database import make_async_engine, make_engine
+from export import FORMATS as EXPORT_FORMATS, MIMETYPES as EXPORT_MIMETYPES, export_chunks, parse_key
+from filters import parse_table_query, text_columns
+from init_db import init_database
+from pagination import clamp_page_size, fetch_page, page_key_columns
+from records import (
+    RowLinks,
+    cursor_values_or_400,
+    inserted_pk_filters,
+    python_type_for,
+)
+from reporting import ReportStore
+from row_counts import RowCount, counter_from_env, exact_counts
+from schema_cache import schema_cache_from_env
+from table_versions import TableVersions
+
+engine = make_async_engine()
+# Reflection, bulk import and export keep a small blocking engine; the
+# schema is reflected once before serving and then read from memory.
+sync_engine = make_engine()
+schema = schema_cache_from_env(sync_engine)
+metadata = schema.metadata
+
+row_counter = counter_from_env()
+reports = ReportStore(schema.get_table)
+# ETags and the page cache are app.py's; this app only counts its writes.
+versions = TableVersions(sync_engine, schema.all_tables)
+
+app = Quart(__name__)
+app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-key")
+app.jinja_env.globals["python_type_for"] = python_type_for
+
+
+@app.before_serving
+async def reflect_schema() -> None:
+    await asyncio.to_thread(init_database, sync_engine)
+    await asyncio.to_thread(schema.all_tables)
+
+
+@app.after_serving
+async def dispose_engines() -> None:
+    await engine.dispose()
+    sync_engine.dispose()
+
+
+def get_table_or_404(table_name: str) -> Table:
+    table = schema.get_table(table_name)
+    if table is None:
+        abort(404, description=f"Unknown table '{table_name}'")
+    return table
+
+
+def get_plan_or_404(table_name: str) -> AccessPlan:
+    plan = schema.plan(table_name)
+    if plan is None:
+        abort(404, description=f"Unknown table '{table_name}'")
+    return plan
+
+
+async def table_counts(tables: List[Table]) -> Dict[str, RowCount]:
+    if row_counter.mode != "exact":
+        async with engine.connect() as conn:
+            return await conn.run_sync(row_counter.counts, tables)
+
+    async def count(table: Table) -> Dict[str, int]:
+        async with engine.connect() as conn:
+            return await conn.run_sync(exact_counts, [table])
+
+    counts: Dict[str, RowCount] = {}
+    for partial in await asyncio.gather(*(count(table) for table in tables)):
+        counts.update({name: RowCount(value, "exact") for name, value in partial.items()})
+    return counts
+
+
+async def in_thread(chunks: Iterator[Any]) -> AsyncIterator[Any]:
+    """Relay a blocking iterator one item at a time from a worker thread."""
+    finished = object()
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, finished)
+        if chunk is finished:
+            return
+        yield chunk
+
+
+@app.route("/")
+async def index():
+    tables = schema.all_tables()
+    counts = await table_counts(tables)
+    return await render_template("index.html", tables=tables, counts=counts)
+
+
+@app.route("/table/<table_name>")
+async def view_table(table_name: str):
+    table = get_table_or_404(table_name)
+    page_size = clamp_page_size(request.args.get("page_size"))
+    try:
+        query = parse_table_query(table, request.args, engine.dialect.name)
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    key_columns = page_key_columns(table, query.sort_column)
+    after = request.args.get("after")
+    before = request.args.get("before")
+    async with engine.connect() as conn:
+        page = await conn.run_sync(
+            fetch_page,
+            table,
+            page_size,
+            after=cursor_values_or_400(key_columns, after) if after else None,
+            before=cursor_values_or_400(key_columns, before) if before else None,
+            where=query.filters,
+            sort_column=query.sort_column,
+            descending=query.descending,
+        )
+    return await render_template(
+        "table.html",
+        table=table,
+        rows=page.rows,
+        page=page,
+        links=RowLinks(table, url_for),
+        page_size=page_size,
+        query=query,
+        searchable=bool(text_columns(table)),
+        export_formats=EXPORT_FORMATS,
+    )
+
+
+@app.route("/table/<table_name>/export")
+async def export_table(table_name: str):
+    table = get_table_or_404(table_name)
+    fmt = request.args.get("format", "csv")
+    columns = [name for name in request.args.get("columns", "").split(",") if name]
+    try:
+        start = parse_key(table, request.args["start"]) if request.args.get("start") else None
+        end = parse_key(table, request.args["end"]) if request.args.get("end") else None
+        chunks = export_chunks(sync_engine, table, fmt, columns=columns or None, start=start, end=end)
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    return Response(
+        in_thread(iter(chunks)),
+        content_type=EXPORT_MIMETYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{table.name}.{fmt}"'},
+    )
+
+
+@app.route("/table/<table_name>/create", methods=["GET", "POST"])
+async def create_record(table_name: str):
+    plan = get_plan_or_404(table_name)
+    table = plan.table
+    if request.method == "POST":
+        payload = plan.payload(await request.form)
+        try:
+            async with engine.begin() as conn:
+                result = await conn.execute(plan.insert, payload)
+                inserted = inserted_pk_filters(table, result.inserted_primary_key)
+                touched = await conn.run_sync(reports.capture, table, inserted)
+                await conn.run_sync(reports.refresh, touched)
+                await conn.run_sync(versions.bump, table)
+            row_counter.invalidate(table)
+            await flash(f"Created record in '{table_name}'.", "success")
+        except SQLAlchemyError as exc:
+            await flash(f"Create failed: {exc}", "error")
+        return redirect(url_for("view_table", table_name=table_name))
+
+    return await render_template(
+        "form.html",
+        table=table,
+        values={},
+        action="Create",
+        pk_fields=[],
+    )
+
+
+@app.route("/table/<table_name>/import", methods=["GET", "POST"])
+async def import_records(table_name: str):
+    table = get_table_or_404(table_name)
+    report = None
+    if request.method == "POST":
+        upload = (await request.files).get("file")
+        if upload is None or not upload.filename:
+            await flash("Choose a CSV or JSONL file to import.", "error")
+            return redirect(url_for("import_records", table_name=table_name))
+        form = await request.form
+        try:
+            fmt = detect_format(upload.filename, form.get("format") or None)
+        except ValueError as exc:
+            abort(400, description=str(exc))
+        batch_size = form.get("batch_size", type=int) or DEFAULT_BATCH_SIZE
+        stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+        report = await asyncio.to_thread(import_rows, sync_engine, table, read_rows(stream, fmt), batch_size)
+        row_counter.invalidate(table)
+        if report.rows_inserted:
+            async with engine.begin() as conn:
+                await conn.run_sync(reports.rebuild)
+                await conn.run_sync(versions.bump, table)
+        if request.accept_mimetypes.best == "application/json":
+            return report.as_dict()
+
+    return await render_template("import.html", table=table, report=report, formats=FORMATS)
+
+
+@app.route("/table/<table_name>/edit", methods=["GET", "POST"])
+async def edit_record(table_name: str):
+    plan = get_plan_or_404(table_name)
+    table = plan.table
+    form = await request.form
+    pk_params = plan.pk_params(request.args if request.method == "GET" else {**request.args, **form})
+    pk_filters = plan.pk_filters(pk_params)
+
+    if request.method == "POST":
+        payload = plan.payload(form)
+        try:
+            async with engine.begin() as conn:
+                before = await conn.run_sync(reports.capture, table, pk_filters)
+                await conn.execute(plan.update_by_pk, {**payload, **pk_params})
+                after = await conn.run_sync(reports.capture, table, pk_filters)
+                await conn.run_sync(reports.refresh, before, after)
+                await conn.run_sync(versions.bump, table)
+            row_counter.invalidate(table)
+            await flash(f"Updated record in '{table_name}'.", "success")
+        except SQLAlchemyError as exc:
+            await flash(f"Update failed: {exc}", "error")
+        return redirect(url_for("view_table", table_name=table_name))
+
+    async with engine.connect() as conn:
+        row = (await conn.execute(plan.select_by_pk, pk_params)).first()
+    if row is None:
+        abort(404, description="Record not found")
+
+    return await render_template(
+        "form.html",
+        table=table,
+        values=dict(row._mapping),
+        action="Update",
+        pk_fields=plan.pk_names,
+    )
+
+
+@app.route("/table/<table_name>/batch", methods=["POST"])
+async def batch_records(table_name: str):
+    plan = get_plan_or_404(table_name)
+    form = await request.form
+    action = form.get("action")
+    tokens = form.getlist("key")
+    if action not in ("delete", "update"):
+        abort(400, description=f"Unknown batch action '{action}'")
+    if not tokens:
+        await flash("Select at least one row.", "error")
+        return redirect(url_for("view_table", table_name=table_name))
+    keys = [tuple(cursor_values_or_400(plan.pk_columns, token)) for token in tokens]
+    if action == "update":
+        column_name = form.get("set_column", "")
+        if column_name in plan.pk_names:
+            abort(400, description="Primary key columns cannot be batch updated")
+        try:
+            new_values = parse_values(plan, {column_name: form.get("set_value", "")})
+        except (TypeError, ValueError, ArithmeticError) as exc:
+            abort(400, description=str(exc))
+
+    try:
+        async with engine.begin() as conn:
+            if action == "delete":
+                report = await conn.run_sync(delete_keys, plan, keys, reports)
+            else:
+                report = await conn.run_sync(update_rows, plan, [(key, new_values) for key in keys], reports)
+            await conn.run_sync(versions.bump, plan.table)
+        row_counter.invalidate(plan.table)
+        verb = "Deleted" if action == "delete" else "Updated"
+        await flash(
+            f"{verb} {report.rows_affected} of {report.keys} selected records in '{table_name}' "
+            f"({len(report.chunks)} statement{'s' if len(report.chunks) != 1 else ''}, {report.elapsed * 1000:.1f} ms).",
+            "success",
+        )
+    except SQLAlchemyError as exc:
+        await flash(f"Batch {action} failed: {exc}", "error")
+    return redirect(url_for("view_table", table_name=table_name))
+
+
+async def _run_batch(plan: AccessPlan, operation, *args):
+    try:
+        async with engine.begin() as conn:
+            report = await conn.run_sync(operation, plan, *args)
+            await conn.run_sync(versions.bump, plan.table)
+    except SQLAlchemyError as exc:
+        return jsonify(error=str(getattr(exc, "orig", exc)).strip()), 409
+    row_counter.invalidate(plan.table)
+    return jsonify(report.as_dict())
+
+
+@app.route("/api/table/<table_name>/batch-delete", methods=["POST"])
+async def api_batch_delete(table_name: str):
+    plan = get_plan_or_404(table_name)
+    body = await request.get_json(silent=True)
+    try:
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object")
+        keys = parse_keys(plan, body.get("keys") or [])
+        chunk_size = int(body.get("chunk_size", DEFAULT_CHUNK_SIZE))
+    except (TypeError, ValueError, ArithmeticError) as exc:
+        return jsonify(error=str(exc)), 400
+    return await _run_batch(plan, delete_keys, keys, reports, chunk_size)
+
+
+@app.route("/api/table/<table_name>/batch-update", methods=["POST"])
+async def api_batch_update(table_name: str):
+    plan = get_plan_or_404(table_name)
+    body = await request.get_json(silent=True)
+    try:
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object")
+        if "rows" in body:
+            rows = body["rows"] or []
+            keys = parse_keys(plan, rows)
+            pairs = list(zip(keys, [parse_values(plan, row) for row in rows]))
+        else:
+            shared = body.get("values")
+            if not isinstance(shared, dict):
+                raise ValueError("Expected 'rows', or 'keys' with a 'values' object")
+            new_values = parse_values(plan, shared)
+            pairs = [(key, new_values) for key in parse_keys(plan, body.get("keys") or [])]
+        chunk_size = int(body.get("chunk_size", DEFAULT_CHUNK_SIZE))
+    except (TypeError, ValueError, ArithmeticError) as exc:
+        return jsonify(error=str(exc)), 400
+    return await _run_batch(plan, update_rows, pairs, reports, chunk_size)
+
+
+@app.route("/table/<table_name>/delete", methods=["POST"])
+async def delete_record(table_name: str):
+    plan = get_plan_or_404(table_name)
+    pk_params = plan.pk_params(await request.form)
+    pk_filters = plan.pk_filters(pk_params)
+    try:
+        async with engine.begin() as conn:
+            touched = await conn.run_sync(reports.capture, plan.table, pk_filters)
+            await conn.execute(plan.delete_by_pk, pk_params)
+            await conn.run_sync(reports.refresh, touched)
+            await conn.run_sync(versions.bump, plan.table)
+        row_counter.invalidate(plan.table)
+        await flash(f"Deleted record from '{table_name}'.", "success")
+    except SQLAlchemyError as exc:
+        await flash(f"Delete failed: {exc}", "error")
+    return redirect(url_for("view_table", table_name=table_name))
+
+
+if __name__ == "__main__":
+    app.run(debug=True)
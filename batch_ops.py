@@ -0,0 +1,197 @@
+"""Batch delete and update of rows selected by primary key.
+
+N keys become one statement per chunk instead of one request and one
+transaction per row:
+
+* delete: ``DELETE FROM t WHERE (pk1, pk2) IN ((...), ...)``, or a plain
+  ``pk IN (...)`` for single-column keys.
+* update with the same values for every row:
+  ``UPDATE t SET ... WHERE (pk) IN (...)``.
+* update with per-row values: ``UPDATE t SET c = CAST(v.c AS ...) FROM
+  (VALUES ...) AS v WHERE t.pk = CAST(v.pk AS ...)`` on PostgreSQL (VALUES
+  columns are untyped, hence the casts); other databases run the access
+  plan's UPDATE by primary key as one executemany.
+
+Every chunk runs in the caller's transaction, so a batch commits or rolls
+back as a whole. ``chunk_size`` (BATCH_CHUNK_SIZE, default 1000 keys)
+bounds the bind parameters per statement; 0 sends everything at once.
+Report summaries are captured and refreshed once for the whole batch, as
+the single-row routes do per row.
+"""
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import cast, column, tuple_, update, values
+from sqlalchemy.engine import Connection
+
+from access_plan import PK_PARAM_PREFIX, AccessPlan
+from reporting import ReportStore, Touched
+
+DEFAULT_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "1000"))
+
+Key = Tuple[Any, ...]
+
+
+class ChunkTiming(NamedTuple):
+    keys: int
+    rows: int
+    elapsed_ms: float
+
+
+class BatchReport:
+    def __init__(self, table_name: str, operation: str, method: str) -> None:
+        self.table_name = table_name
+        self.operation = operation
+        self.method = method
+        self.chunks: List[ChunkTiming] = []
+        self.elapsed = 0.0
+
+    @property
+    def keys(self) -> int:
+        return sum(chunk.keys for chunk in self.chunks)
+
+    @property
+    def rows_affected(self) -> int:
+        return sum(chunk.rows for chunk in self.chunks)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "table": self.table_name,
+            "operation": self.operation,
+            "method": self.method,
+            "keys": self.keys,
+            "rows_affected": self.rows_affected,
+            "statements": len(self.chunks),
+            "elapsed_ms": round(self.elapsed * 1000, 3),
+            "chunks": [chunk._asdict() for chunk in self.chunks],
+        }
+
+
+def _chunked(items: Sequence[Any], chunk_size: int) -> Iterator[Sequence[Any]]:
+    if chunk_size <= 0:
+        chunk_size = len(items) or 1
+    for start in range(0, len(items), chunk_size):
+        yield items[start:start + chunk_size]
+
+
+def key_filter(plan: AccessPlan, keys: Sequence[Key]):
+    """``pk IN (...)``, or a row-value IN for composite keys."""
+    if len(plan.pk_columns) == 1:
+        return plan.pk_columns[0].in_([key[0] for key in keys])
+    return tuple_(*plan.pk_columns).in_([tuple(key) for key in keys])
+
+
+def parse_keys(plan: AccessPlan, items: Iterable[Mapping[str, Any]]) -> List[Key]:
+    """Coerce JSON objects holding primary key fields into key tuples."""
+    if not plan.pk_columns:
+        raise ValueError(f"Table '{plan.table.name}' has no primary key")
+    keys = []
+    for position, item in enumerate(items):
+        if not isinstance(item, Mapping):
+            raise ValueError(f"Key {position} is not an object")
+        missing = [name for name in plan.pk_names if name not in item]
+        if missing:
+            raise ValueError(f"Key {position} is missing primary key field '{missing[0]}'")
+        keys.append(tuple(plan.coerce(name, str(item[name])) for name in plan.pk_names))
+    return keys
+
+
+def parse_values(plan: AccessPlan, item: Mapping[str, Any]) -> Dict[str, Any]:
+    """Coerce the non-key fields of ``item``; JSON null and "" become NULL."""
+    parsed = {}
+    for name, value in item.items():
+        if name in plan.pk_names:
+            continue
+        if name not in plan.converters:
+            raise ValueError(f"Unknown column '{name}'")
+        parsed[name] = plan.coerce(name, "" if value is None else str(value))
+    return parsed
+
+
+def _time(report: BatchReport, keys: int, run: Callable[[], int]) -> None:
+    started = time.perf_counter()
+    rows = run()
+    report.chunks.append(ChunkTiming(keys, max(rows, 0), round((time.perf_counter() - started) * 1000, 3)))
+
+
+def delete_keys(conn: Connection, plan: AccessPlan, keys: Sequence[Key], reports: Optional[ReportStore] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> BatchReport:
+    report = BatchReport(plan.table.name, "delete", "in" if len(plan.pk_columns) == 1 else "tuple-in")
+    started = time.perf_counter()
+    touched: List[Touched] = []
+    for chunk in _chunked(list(dict.fromkeys(keys)), chunk_size):
+        where = key_filter(plan, chunk)
+        if reports is not None:
+            touched.append(reports.capture(conn, plan.table, [where]))
+        _time(report, len(chunk), lambda: conn.execute(plan.table.delete().where(where)).rowcount)
+    if reports is not None:
+        reports.refresh(conn, *touched)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def _update_from_values(conn: Connection, plan: AccessPlan, names: Tuple[str, ...],
+                        chunk: Sequence[Tuple[Key, Dict[str, Any]]]) -> int:
+    table = plan.table
+    source = values(*[column(name, table.c[name].type) for name in plan.pk_names + list(names)], name="v").data(
+        [key + tuple(row[name] for name in names) for key, row in chunk]
+    )
+    statement = (
+        update(table)
+        .values({name: cast(source.c[name], table.c[name].type) for name in names})
+        .where(*[pk == cast(source.c[pk.name], pk.type) for pk in plan.pk_columns])
+    )
+    return conn.execute(statement).rowcount
+
+
+def _update_executemany(conn: Connection, plan: AccessPlan, chunk: Sequence[Tuple[Key, Dict[str, Any]]]) -> int:
+    parameters = [
+        {**row, **{PK_PARAM_PREFIX + name: value for name, value in zip(plan.pk_names, key)}}
+        for key, row in chunk
+    ]
+    return conn.execute(plan.update_by_pk, parameters).rowcount
+
+
+def _execute_update(conn: Connection, plan: AccessPlan, method: str, names: Tuple[str, ...],
+                    chunk: Sequence[Tuple[Key, Dict[str, Any]]], where) -> int:
+    if method == "update-in":
+        return conn.execute(plan.table.update().where(where).values(**chunk[0][1])).rowcount
+    if method == "update-from-values":
+        return _update_from_values(conn, plan, names, chunk)
+    return _update_executemany(conn, plan, chunk)
+
+
+def update_rows(conn: Connection, plan: AccessPlan, rows: Sequence[Tuple[Key, Dict[str, Any]]],
+                reports: Optional[ReportStore] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> BatchReport:
+    """Apply ``(key, values)`` pairs; rows sharing identical values use one ``IN``."""
+    # A key listed twice keeps its last values.
+    rows = [(key, row) for key, row in dict(rows).items() if row]
+    distinct = {tuple(sorted(row.items(), key=lambda item: item[0])) for _, row in rows}
+    if len(distinct) <= 1:
+        method = "update-in"
+    elif conn.dialect.name == "postgresql":
+        method = "update-from-values"
+    else:
+        method = "executemany"
+    report = BatchReport(plan.table.name, "update", method)
+    started = time.perf_counter()
+
+    # VALUES lists and executemany need the same columns in every row.
+    groups: Dict[Tuple[str, ...], List[Tuple[Key, Dict[str, Any]]]] = {}
+    for key, row in rows:
+        groups.setdefault(tuple(row), []).append((key, row))
+
+    touched: List[Touched] = []
+    for names, group in groups.items():
+        for chunk in _chunked(group, chunk_size):
+            where = key_filter(plan, [key for key, _ in chunk])
+            if reports is not None:
+                touched.append(reports.capture(conn, plan.table, [where]))
+            _time(report, len(chunk), lambda: _execute_update(conn, plan, method, names, chunk, where))
+            if reports is not None:
+                touched.append(reports.capture(conn, plan.table, [where]))
+    if reports is not None:
+        reports.refresh(conn, *touched)
+    report.elapsed = time.perf_counter() - started
+    return report
@@ -0,0 +1,111 @@
+"""Per-request CPU of the record routes with and without access plans.
+
+Run from the repository root:
+
+    python -m benchmarks.access_plan --iterations 5000 [--json plan.json]
+
+An edit request (coerce the primary key and form, load the row, update it)
+is replayed against a throwaway SQLite database, once with the per-request
+records.py helpers and freshly built statements and once with a cached
+AccessPlan. "prepare" times coercion and statement construction alone;
+"execute" includes the round trips, with each update rolled back. Times are
+process CPU time per request.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Callable, Dict
+
+from sqlalchemy import create_engine, select
+
+import datagen
+from access_plan import AccessPlan
+from records import build_payload, build_pk_filters
+from schema_cache import SchemaCache
+
+TABLE = "users"
+KEY = {"user_id": "42"}
+FORM = {
+    "user_id": "42",
+    "email": "arman.42@example.com",
+    "given_name": "Arman",
+    "surname": "Nurgaliyev",
+    "city": "Astana",
+    "phone_number": "+77001112233",
+    "profile_description": "Friendly caregiver",
+    "password": "pass123",
+}
+
+
+def cpu_per_call_us(call: Callable[[], None], iterations: int) -> float:
+    for _ in range(min(iterations, 200)):
+        call()
+    started = time.process_time()
+    for _ in range(iterations):
+        call()
+    return (time.process_time() - started) / iterations * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "plan.db")
+    engine = create_engine(f"sqlite:///{path}")
+    datagen.create_schema(engine)
+    datagen.load(engine, datagen.Scale.for_users(100))
+    table = SchemaCache(engine).get_table(TABLE)
+    plan = AccessPlan(table)
+
+    def prepare_legacy() -> None:
+        filters = build_pk_filters(table, KEY)
+        payload = build_payload(table, FORM)
+        select(table).where(*filters)
+        table.update().where(*filters).values(**payload)
+
+    def prepare_plan() -> None:
+        plan.pk_params(KEY)
+        plan.payload(FORM)
+
+    conn = engine.connect()
+
+    def execute_legacy() -> None:
+        filters = build_pk_filters(table, KEY)
+        payload = build_payload(table, FORM)
+        conn.execute(select(table).where(*filters)).first()
+        conn.execute(table.update().where(*filters).values(**payload))
+        conn.rollback()
+
+    def execute_plan() -> None:
+        pk_params = plan.pk_params(KEY)
+        payload = plan.payload(FORM)
+        conn.execute(plan.select_by_pk, pk_params).first()
+        conn.execute(plan.update_by_pk, {**payload, **pk_params})
+        conn.rollback()
+
+    results: Dict[str, Dict[str, float]] = {}
+    for name, legacy, planned in (("prepare", prepare_legacy, prepare_plan), ("execute", execute_legacy, execute_plan)):
+        before = cpu_per_call_us(legacy, args.iterations)
+        after = cpu_per_call_us(planned, args.iterations)
+        results[name] = {
+            "per_request_us": round(before, 2),
+            "with_plan_us": round(after, 2),
+            "saved_us": round(before - after, 2),
+            "saved_percent": round((before - after) / before * 100, 1) if before else 0.0,
+        }
+        print(f"{name:<8} {before:9.2f} us -> {after:9.2f} us  (saved {before - after:8.2f} us, "
+              f"{results[name]['saved_percent']:5.1f}%)")
+    conn.close()
+    engine.dispose()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump({"table": TABLE, "iterations": args.iterations, "results": results}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
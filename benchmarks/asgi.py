@@ -0,0 +1,175 @@
+"""Compare sync gunicorn workers with the ASGI app at equal memory.
+
+Run from the repository root (Linux; memory is read from /proc):
+
+    DATABASE_URL=... python -m benchmarks.asgi --memory-mb 512 --requests 2000 \\
+        --concurrency 32 --json asgi.json
+
+Each server is first started with one worker to measure its resident
+memory, then restarted with as many workers as fit into ``--memory-mb``
+(gunicorn ``app:app`` versus hypercorn ``asgi_app:app``). The same mix of
+index and table pages is then requested from ``--concurrency`` client
+threads, and requests per second, median and p99 latency, and the total
+memory of the process tree are reported.
+"""
+import argparse
+import glob
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATHS = ["/", "/table/appointment", "/table/job?q=patient", "/table/users?sort=surname"]
+SERVERS = {
+    "sync": lambda workers, bind: ["gunicorn", "--workers", str(workers), "--bind", bind, "app:app"],
+    "asgi": lambda workers, bind: ["hypercorn", "--workers", str(workers), "--bind", bind, "asgi_app:app"],
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _tree(pid: int) -> List[int]:
+    pids = [pid]
+    for path in glob.glob(f"/proc/{pid}/task/*/children"):
+        with open(path, encoding="ascii") as handle:
+            for child in handle.read().split():
+                pids.extend(_tree(int(child)))
+    return pids
+
+
+def tree_rss_mb(pid: int) -> float:
+    return sum(_rss_kb(member) for member in _tree(pid)) / 1024
+
+
+class Server:
+    def __init__(self, kind: str, workers: int) -> None:
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.process = subprocess.Popen(
+            SERVERS[kind](workers, f"127.0.0.1:{self.port}"),
+            cwd=REPO_ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self._wait_ready()
+
+    def _wait_ready(self, timeout: float = 60) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited with status {self.process.returncode}")
+            try:
+                with urllib.request.urlopen(self.base_url + "/", timeout=5) as response:
+                    response.read()
+                return
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        raise RuntimeError("server did not become ready")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def drive(base_url: str, paths: List[str], requests: int, concurrency: int) -> Dict[str, Any]:
+    def fetch(position: int) -> float:
+        started = time.perf_counter()
+        with urllib.request.urlopen(base_url + paths[position % len(paths)], timeout=60) as response:
+            response.read()
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(fetch, range(concurrency * 2)))
+        started = time.perf_counter()
+        timings = sorted(executor.map(fetch, range(requests)))
+        elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "requests_per_second": round(requests / elapsed, 1),
+        "median_ms": round(statistics.median(timings), 3),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def measure(kind: str, memory_mb: float, paths: List[str], requests: int, concurrency: int) -> Dict[str, Any]:
+    probe = Server(kind, 1)
+    try:
+        drive(probe.base_url, paths, min(requests, 200), concurrency)
+        master_mb = _rss_kb(probe.process.pid) / 1024
+        worker_mb = max(1.0, tree_rss_mb(probe.process.pid) - master_mb)
+    finally:
+        probe.stop()
+
+    workers = max(1, int((memory_mb - master_mb) // worker_mb))
+    server = Server(kind, workers)
+    try:
+        result = drive(server.base_url, paths, requests, concurrency)
+        result.update(
+            workers=workers,
+            worker_rss_mb=round(worker_mb, 1),
+            total_rss_mb=round(tree_rss_mb(server.process.pid), 1),
+        )
+    finally:
+        server.stop()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--memory-mb", type=float, default=512, help="memory budget for each server")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--path", action="append", dest="paths", help="URL path to request; repeatable")
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args()
+
+    paths = args.paths or DEFAULT_PATHS
+    results = {}
+    for kind in SERVERS:
+        results[kind] = measure(kind, args.memory_mb, paths, args.requests, args.concurrency)
+        summary = results[kind]
+        print(f"{kind:<5} {summary['workers']:>3} workers  {summary['total_rss_mb']:8.1f} MB  "
+              f"{summary['requests_per_second']:8.1f} req/s  median {summary['median_ms']:8.2f} ms  "
+              f"p99 {summary['p99_ms']:8.2f} ms")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump({
+                "database": os.getenv("DATABASE_URL", "sqlite:///local.db").split("@")[-1],
+                "python": sys.version.split()[0],
+                "memory_mb": args.memory_mb,
+                "concurrency": args.concurrency,
+                "paths": paths,
+                "results": results,
+            }, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Time the Flask routes and the report queries against a synthetic dataset.
+
+Run from the repository root:
+
+    python -m benchmarks.load --database-url sqlite:///bench.db \\
+        --database-url postgresql://localhost/bench --users 120000 --generate \\
+        --server --json results/$(git rev-parse --short HEAD).json
+
+Each database is measured in its own subprocess, because app.py binds its
+engine to DATABASE_URL at import time. ``--generate`` (re)loads the tables
+with datagen.py first. Per database the results cover:
+
+* every alchemy.part2.py query and every summary-backed /reports entry,
+  executed directly on a connection;
+* the main routes (index, first and middle table pages, a search, the edit
+  form and the reports) through the Flask test client, with the query count
+  of the last call taken from the ``http_request_queries`` metric (streamed
+  pages record it when their body is closed);
+* with ``--server``, the same routes over HTTP against a local threaded WSGI
+  server, driven by ``--concurrency`` client threads.
+
+The JSON output records the commit, scale and seed next to the timings so
+two files can be diffed to spot regressions.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from typing import Any, Callable, Dict, List, Optional
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from sqlalchemy import func, select
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    ordered = sorted(timings)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "min_ms": round(ordered[0], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def time_calls(call: Callable[[], Any], repeat: int, warmup: int = 1) -> List[float]:
+    for _ in range(warmup):
+        call()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def route_paths(app_module) -> Dict[str, str]:
+    """Representative URLs, with cursors and keys taken from the loaded data."""
+    from pagination import encode_cursor
+
+    schema, engine = app_module.schema, app_module.engine
+    paths = {"index": "/"}
+    with engine.connect() as conn, app_module.app.test_request_context():
+        for table in schema.all_tables():
+            pk_columns = list(table.primary_key.columns)
+            paths[f"table {table.name}"] = f"/table/{table.name}"
+            total = conn.execute(select(func.count()).select_from(table)).scalar()
+            if not pk_columns or not total:
+                continue
+            middle = conn.execute(select(*pk_columns).order_by(*pk_columns).offset(total // 2).limit(1)).first()
+            cursor = encode_cursor(list(middle))
+            paths[f"table {table.name} middle page"] = f"/table/{table.name}?after={cursor}"
+            paths[f"edit {table.name}"] = app_module.url_for(
+                "edit_record", table_name=table.name, **dict(zip([c.name for c in pk_columns], middle))
+            )
+    paths["search job"] = "/table/job?q=patient"
+    paths["sorted appointment"] = "/table/appointment?sort=-work_hours"
+    for name in app_module.REPORTS:
+        paths[f"report {name}"] = f"/reports/{name}"
+    return paths
+
+
+def bench_queries(app_module, repeat: int) -> Dict[str, Any]:
+    from reporting import REPORTS, source_queries
+
+    results = {}
+    with app_module.engine.connect() as conn:
+        for number, (title, stmt) in source_queries(app_module.schema.get_table).items():
+            timings = time_calls(lambda: conn.execute(stmt).all(), repeat)
+            results[f"{number} {title}"] = summarize(timings)
+        conn.rollback()
+    with app_module.engine.begin() as conn:
+        for name in REPORTS:
+            timings = time_calls(lambda: app_module.reports.run(conn, name), repeat)
+            results[f"summary {name}"] = summarize(timings)
+    return results
+
+
+def bench_test_client(app_module, paths: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    client = app_module.app.test_client()
+    queries = app_module.instrumentation.request_queries
+    results = {}
+    for label, path in paths.items():
+        endpoint = app_module.app.url_map.bind("localhost").match(path.split("?", 1)[0])[0]
+        last = []
+
+        def fetch() -> None:
+            _, before = queries.totals(endpoint)
+            response = client.get(path)
+            response.get_data()
+            response.close()
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {path} returned {response.status_code}")
+            last[:] = [queries.totals(endpoint)[1] - before]
+
+        summary = summarize(time_calls(fetch, repeat))
+        if last:
+            summary["queries"] = int(last[0])
+        results[label] = summary
+    return results
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def bench_server(app_module, paths: Dict[str, str], repeat: int, concurrency: int) -> Dict[str, Any]:
+    server = make_server("127.0.0.1", 0, app_module.app, server_class=_ThreadingWSGIServer,
+                         handler_class=_QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    def fetch(path: str) -> float:
+        started = time.perf_counter()
+        with urllib.request.urlopen(base_url + path) as response:
+            response.read()
+        return (time.perf_counter() - started) * 1000
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for label, path in paths.items():
+                fetch(path)
+                started = time.perf_counter()
+                timings = list(executor.map(fetch, [path] * repeat))
+                elapsed = time.perf_counter() - started
+                summary = summarize(timings)
+                summary["requests_per_second"] = round(repeat / elapsed, 1)
+                results[label] = summary
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def run_worker(args: argparse.Namespace) -> Dict[str, Any]:
+    """Benchmark DATABASE_URL in this process and return the results."""
+    from database import make_engine
+
+    if args.generate:
+        import datagen
+        from sqlalchemy import MetaData
+
+        engine = make_engine()
+        datagen.create_schema(engine)
+        metadata = MetaData()
+        metadata.reflect(bind=engine, only=list(datagen.TABLE_ORDER))
+        datagen.reset(engine, metadata)
+        datagen.load(engine, datagen.Scale.for_users(args.users), args.seed)
+        engine.dispose()
+
+    import app as app_module
+
+    with app_module.engine.begin() as conn:
+        app_module.reports.rebuild(conn)
+    paths = route_paths(app_module)
+    results: Dict[str, Any] = {
+        "dialect": app_module.engine.dialect.name,
+        "row_counts": {},
+        "queries": bench_queries(app_module, args.repeat),
+        "test_client": bench_test_client(app_module, paths, args.repeat),
+    }
+    with app_module.engine.connect() as conn:
+        for table in app_module.schema.all_tables():
+            results["row_counts"][table.name] = conn.execute(select(func.count()).select_from(table)).scalar()
+    if args.server:
+        results["wsgi_server"] = bench_server(app_module, paths, args.repeat, args.concurrency)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", action="append", dest="database_urls",
+                        help="database to measure; repeat to compare several (default: DATABASE_URL)")
+    parser.add_argument("--users", type=int, default=12000, help="datagen scale used with --generate")
+    parser.add_argument("--seed", type=int, default=341)
+    parser.add_argument("--generate", action="store_true", help="reload the tables with datagen.py first")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--server", action="store_true", help="also measure over HTTP with a local WSGI server")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        json.dump(run_worker(args), sys.stdout)
+        return
+
+    from database import configured_database_url
+
+    runs = {}
+    for url in args.database_urls or [configured_database_url()]:
+        command = [sys.executable, "-m", "benchmarks.load", "--worker", *sys.argv[1:]]
+        completed = subprocess.run(
+            command, cwd=REPO_ROOT, env={**os.environ, "DATABASE_URL": url},
+            stdout=subprocess.PIPE, check=True, text=True,
+        )
+        # The app prints start-up notes; the results are the last line.
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        runs[url.split("@")[-1]] = result
+        print(f"== {url.split('@')[-1]} ({result['dialect']})")
+        for section in ("queries", "test_client", "wsgi_server"):
+            for label, summary in result.get(section, {}).items():
+                print(f"{section:<12} {label:<48} median {summary['median_ms']:9.2f} ms  p95 {summary['p95_ms']:9.2f} ms")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump({
+                "commit": git_commit(),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "users": args.users if args.generate else None,
+                "seed": args.seed if args.generate else None,
+                "repeat": args.repeat,
+                "runs": runs,
+            }, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
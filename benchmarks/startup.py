@@ -0,0 +1,82 @@
+"""Compare worker startup cost of eager reflection with the schema cache.
+
+Run from the repository root:
+
+    DATABASE_URL=... python -m benchmarks.startup --repeat 20
+
+Each trial uses a fresh engine so connection setup is included, the same
+way a newly booted gunicorn worker pays for it.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from sqlalchemy import MetaData, create_engine
+
+from database import configured_database_url
+from schema_cache import SchemaCache
+
+
+def eager(url: str, table_name: str, snapshot_path: str) -> None:
+    engine = create_engine(url)
+    MetaData().reflect(bind=engine)
+    engine.dispose()
+
+
+def lazy(url: str, table_name: str, snapshot_path: str) -> None:
+    engine = create_engine(url)
+    SchemaCache(engine).get_table(table_name)
+    engine.dispose()
+
+
+def snapshot(url: str, table_name: str, snapshot_path: str) -> None:
+    engine = create_engine(url)
+    SchemaCache(engine, snapshot_path=snapshot_path).get_table(table_name)
+    engine.dispose()
+
+
+def time_trials(strategy: Callable[[str, str, str], None], url: str, table_name: str,
+                snapshot_path: str, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        strategy(url, table_name, snapshot_path)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--table", default="appointment", help="table the first request touches")
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args()
+
+    url = configured_database_url()
+    snapshot_path = os.path.join(tempfile.mkdtemp(), "schema.pkl")
+    warm_engine = create_engine(url)
+    SchemaCache(warm_engine, snapshot_path=snapshot_path).all_tables()
+    warm_engine.dispose()
+
+    results: Dict[str, Dict[str, float]] = {}
+    for name, strategy in (("eager reflect", eager), ("lazy table", lazy), ("snapshot", snapshot)):
+        timings = time_trials(strategy, url, args.table, snapshot_path, args.repeat)
+        results[name] = {
+            "median_ms": statistics.median(timings),
+            "min_ms": min(timings),
+            "max_ms": max(timings),
+        }
+        print(f"{name:<14} median {results[name]['median_ms']:8.2f} ms  "
+              f"min {results[name]['min_ms']:8.2f} ms  max {results[name]['max_ms']:8.2f} ms")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump({"database": url.split("@")[-1], "table": args.table, "results": results}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
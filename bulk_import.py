@@ -0,0 +1,281 @@
+"""Bulk CSV/JSONL import into a reflected table.
+
+Rows are coerced with the same ``build_payload`` rules as the create form,
+then written in batches: through ``COPY ... FROM STDIN`` on PostgreSQL and
+a batched ``executemany`` insert everywhere else. A batch the database
+rejects is retried row by row inside savepoints, so one bad row is reported
+without losing the rest of its batch. load_rows() is the all-or-nothing
+variant init_db.py seeds with, inside the caller's transaction.
+
+Command line usage:
+
+    python bulk_import.py caregiver caregivers.csv --batch-size 10000
+"""
+import argparse
+import csv
+import json
+import time
+from typing import Any, Dict, IO, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import MetaData, Table, func, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from records import build_payload
+
+FORMATS = ("csv", "jsonl")
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(NamedTuple):
+    line: int
+    message: str
+
+
+class ImportReport:
+    """Outcome of one import: counts, per-row errors and throughput."""
+
+    def __init__(self, table_name: str, method: str) -> None:
+        self.table_name = table_name
+        self.method = method
+        self.rows_read = 0
+        self.rows_inserted = 0
+        self.error_count = 0
+        self.errors: List[RowError] = []
+        self.batches = 0
+        self.elapsed = 0.0
+
+    def add_error(self, line: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(line, message))
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_inserted / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "table": self.table_name,
+            "method": self.method,
+            "rows_read": self.rows_read,
+            "rows_inserted": self.rows_inserted,
+            "error_count": self.error_count,
+            "errors": [error._asdict() for error in self.errors],
+            "batches": self.batches,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+def detect_format(filename: str, requested: Optional[str] = None) -> str:
+    if requested:
+        if requested not in FORMATS:
+            raise ValueError(f"Unsupported format '{requested}', expected one of {', '.join(FORMATS)}")
+        return requested
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def read_rows(stream: IO[str], fmt: str) -> Iterator[Tuple[int, Any]]:
+    """Yield ``(line_number, record)`` pairs; malformed JSON lines yield the error."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_number, exc
+            continue
+        if not isinstance(record, dict):
+            yield line_number, ValueError("expected a JSON object")
+            continue
+        yield line_number, record
+
+
+def _as_form_values(record: Dict[str, Any]) -> Dict[str, str]:
+    # build_payload expects form-style strings; JSON null maps to an empty field.
+    return {key: "" if value is None else str(value) for key, value in record.items() if key is not None}
+
+
+def _copy_literal(value: Any) -> str:
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class _CopyReader:
+    """File-like source for copy_expert that renders CSV lines as they are read."""
+
+    def __init__(self, lines: Iterator[str]) -> None:
+        self._lines = lines
+        self._pending = ""
+
+    def read(self, size: int = -1) -> str:
+        chunks = [self._pending]
+        length = len(self._pending)
+        while size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+        data = "".join(chunks)
+        if size < 0:
+            self._pending = ""
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+
+def _copy_batch(conn: Connection, table: Table, columns: List[str], payloads: List[Dict[str, Any]]) -> None:
+    # The payloads are kept for the row-by-row retry; their CSV is not.
+    lines = (",".join(_copy_literal(payload[name]) for name in columns) + "\n" for payload in payloads)
+    preparer = conn.dialect.identifier_preparer
+    column_list = ", ".join(preparer.quote(name) for name in columns)
+    statement = f"COPY {preparer.format_table(table)} ({column_list}) FROM STDIN WITH (FORMAT csv)"
+    with conn.connection.driver_connection.cursor() as cursor:
+        cursor.copy_expert(statement, _CopyReader(lines))
+
+
+def _insert_batch(conn: Connection, table: Table, columns: Tuple[str, ...], payloads: List[Dict[str, Any]],
+                  use_copy: bool) -> None:
+    if use_copy:
+        _copy_batch(conn, table, list(columns), payloads)
+    else:
+        conn.execute(table.insert(), payloads)
+
+
+def _write_batch(engine: Engine, table: Table, batch: List[Tuple[int, Dict[str, Any]]], use_copy: bool,
+                 report: ImportReport) -> None:
+    # COPY and executemany need a uniform column list, so group by key set.
+    groups: Dict[Tuple[str, ...], List[Tuple[int, Dict[str, Any]]]] = {}
+    for line, payload in batch:
+        groups.setdefault(tuple(payload), []).append((line, payload))
+
+    report.batches += 1
+    database_errors = (SQLAlchemyError, engine.dialect.dbapi.Error)
+    for columns, rows in groups.items():
+        try:
+            with engine.begin() as conn:
+                _insert_batch(conn, table, columns, [payload for _, payload in rows], use_copy)
+            report.rows_inserted += len(rows)
+            continue
+        except database_errors:
+            pass
+
+        with engine.begin() as conn:
+            for line, payload in rows:
+                savepoint = conn.begin_nested()
+                try:
+                    conn.execute(table.insert(), [payload])
+                    savepoint.commit()
+                    report.rows_inserted += 1
+                except SQLAlchemyError as exc:
+                    savepoint.rollback()
+                    report.add_error(line, str(getattr(exc, "orig", exc)).strip())
+
+
+def _sync_sequences(conn: Connection, table: Table) -> None:
+    """Move SERIAL sequences past explicitly imported ids (PostgreSQL)."""
+    for column in table.primary_key.columns:
+        sequence = conn.execute(
+            text("SELECT pg_get_serial_sequence(:table, :column)"),
+            {"table": table.name, "column": column.name},
+        ).scalar()
+        if sequence is None:
+            continue
+        highest = conn.execute(select(func.max(column))).scalar()
+        if highest is not None:
+            conn.execute(text("SELECT setval(:sequence, :value)"), {"sequence": sequence, "value": highest})
+
+
+def import_rows(engine: Engine, table: Table, records: Iterable[Tuple[int, Any]],
+                batch_size: int = DEFAULT_BATCH_SIZE) -> ImportReport:
+    """Coerce and insert ``records`` (as produced by read_rows) into ``table``."""
+    use_copy = engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2"
+    report = ImportReport(table.name, "copy" if use_copy else "executemany")
+    started = time.perf_counter()
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    for line, record in records:
+        report.rows_read += 1
+        if isinstance(record, Exception):
+            report.add_error(line, str(record))
+            continue
+        try:
+            payload = build_payload(table, _as_form_values(record))
+        except (TypeError, ValueError, ArithmeticError) as exc:
+            report.add_error(line, f"{type(exc).__name__}: {exc}")
+            continue
+        batch.append((line, payload))
+        if len(batch) >= batch_size:
+            _write_batch(engine, table, batch, use_copy, report)
+            batch = []
+    if batch:
+        _write_batch(engine, table, batch, use_copy, report)
+    if engine.dialect.name == "postgresql" and report.rows_inserted:
+        with engine.begin() as conn:
+            _sync_sequences(conn, table)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def load_rows(conn: Connection, table: Table, records: Iterable[Tuple[int, Any]],
+              batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Insert ``records`` in the caller's transaction, failing on the first bad row.
+
+    The all-or-nothing counterpart of import_rows, used for seed data: a row
+    that cannot be coerced raises ValueError with its line number, and a
+    database error propagates. Returns the number of rows inserted.
+    """
+    use_copy = conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2"
+    inserted = 0
+    groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    pending = 0
+    for line, record in records:
+        if isinstance(record, Exception):
+            raise ValueError(f"{table.name} line {line}: {record}")
+        try:
+            payload = build_payload(table, _as_form_values(record))
+        except (TypeError, ValueError, ArithmeticError) as exc:
+            raise ValueError(f"{table.name} line {line}: {type(exc).__name__}: {exc}") from exc
+        groups.setdefault(tuple(payload), []).append(payload)
+        pending += 1
+        if pending >= batch_size:
+            for columns, payloads in groups.items():
+                _insert_batch(conn, table, columns, payloads, use_copy)
+            inserted += pending
+            groups, pending = {}, 0
+    for columns, payloads in groups.items():
+        _insert_batch(conn, table, columns, payloads, use_copy)
+    inserted += pending
+    if conn.dialect.name == "postgresql" and inserted:
+        _sync_sequences(conn, table)
+    return inserted
+
+
+def main() -> None:
+    from database import make_engine
+
+    parser = argparse.ArgumentParser(description="Bulk import CSV or JSONL rows into a table.")
+    parser.add_argument("table")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    table = Table(args.table, MetaData(), autoload_with=engine)
+    fmt = detect_format(args.path, args.format)
+    with open(args.path, "r", encoding="utf-8-sig", newline="") as stream:
+        report = import_rows(engine, table, read_rows(stream, fmt), batch_size=args.batch_size)
+    print(json.dumps(report.as_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Engine construction and connection pool configuration.
+
+The pool is configured from the environment:
+
+* DB_POOL_MODE         - ``queue`` (default), ``null`` or ``pgbouncer``. The
+  last two open a fresh connection per checkout (NullPool) and leave the
+  pooling to PgBouncer. ``pgbouncer`` also keeps asyncpg from reusing
+  prepared statements, which transaction pooling breaks ("prepared
+  statement ... already exists"): its caches are off and every statement
+  gets a unique name. psycopg2 prepares nothing, so the sync engine is the
+  same as with ``null``.
+* DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE - passed to
+  QueuePool; unset values keep SQLAlchemy's defaults.
+* DB_POOL_PRE_PING     - ``1`` to test connections on checkout.
+
+Engines register an ``os.register_at_fork`` hook so a process forked after
+the engine was created (gunicorn workers, ``--preload``) starts with an
+empty pool instead of sharing the parent's sockets. make_async_engine()
+builds the asyncpg/aiosqlite counterpart used by asgi_app.py with the same
+settings.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+POOL_MODES = ("queue", "null", "pgbouncer")
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# A server connection behind PgBouncer changes between transactions, so
+# asyncpg must neither cache prepared statements nor reuse their names.
+PGBOUNCER_ASYNCPG_ARGS = {
+    "statement_cache_size": 0,
+    "prepared_statement_cache_size": 0,
+    "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+}
+
+
+def normalize_database_url(database_url: str) -> str:
+    """Ensure SQLAlchemy understands URLs from managed hosts like Render."""
+    database_url = database_url.strip()
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql+psycopg2://", 1)
+    if "sslmode=" not in database_url:
+        separator = "&" if "?" in database_url else "?"
+        database_url = f"{database_url}{separator}sslmode=require"
+    return database_url
+
+
+def configured_database_url() -> str:
+    """Return DATABASE_URL (or the local SQLite default), normalized."""
+    return normalize_database_url(os.getenv("DATABASE_URL") or "sqlite:///local.db")
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in {"1", "true", "yes", "on"}
+
+
+class PoolStats:
+    """Checkout wait times for one engine, shared across pool recreation."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.buckets = [0] * len(WAIT_BUCKETS_MS)
+
+    def record(self, wait_ms: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            for position, bound in enumerate(WAIT_BUCKETS_MS):
+                if wait_ms <= bound:
+                    self.buckets[position] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "total_wait_ms": round(self.total_wait_ms, 3),
+                "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+                "wait_buckets_ms": {str(bound): count for bound, count in zip(WAIT_BUCKETS_MS, self.buckets)},
+            }
+
+
+class _TimedCheckout:
+    """Pool mixin timing how long a caller waits for a connection."""
+
+    stats: PoolStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeout:
+            # Only an exhausted pool counts; refused connections and bad
+            # credentials say nothing about its size.
+            self.stats.record((time.perf_counter() - started) * 1000, timed_out=True)
+            raise
+        self.stats.record((time.perf_counter() - started) * 1000)
+        return connection
+
+
+def _timed_pool_class(base: type, stats: PoolStats) -> type:
+    # Pool.recreate() (used by Engine.dispose) instantiates self.__class__,
+    # so binding the stats on the class keeps them across recreation.
+    return type(f"Timed{base.__name__}", (_TimedCheckout, base), {"stats": stats})
+
+
+def pool_options_from_env(database_url: str, stats: PoolStats, queue_class: type = QueuePool) -> Dict[str, Any]:
+    """Translate DB_POOL_* variables into create_engine keyword arguments."""
+    mode = os.getenv("DB_POOL_MODE", "queue").lower()
+    if mode not in POOL_MODES:
+        raise ValueError(f"Unknown DB_POOL_MODE '{mode}', expected one of {', '.join(POOL_MODES)}")
+
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite relies on SQLAlchemy's per-thread singleton pool.
+        return {}
+
+    options: Dict[str, Any] = {"pool_pre_ping": _env_flag("DB_POOL_PRE_PING")}
+    if mode in ("null", "pgbouncer"):
+        options["poolclass"] = _timed_pool_class(NullPool, stats)
+        if mode == "pgbouncer" and url.get_driver_name() == "asyncpg":
+            options["connect_args"] = dict(PGBOUNCER_ASYNCPG_ARGS)
+        return options
+
+    options["poolclass"] = _timed_pool_class(queue_class, stats)
+    for env_name, option, cast in (
+        ("DB_POOL_SIZE", "pool_size", int),
+        ("DB_MAX_OVERFLOW", "max_overflow", int),
+        ("DB_POOL_TIMEOUT", "pool_timeout", float),
+        ("DB_POOL_RECYCLE", "pool_recycle", int),
+    ):
+        value = os.getenv(env_name)
+        if value:
+            options[option] = cast(value)
+    return options
+
+
+def dispose_after_fork(engine: Engine) -> None:
+    """Give forked children a fresh pool without closing the parent's sockets."""
+
+    def reset_in_child() -> None:
+        engine.dispose(close=False)
+        stats = getattr(engine.pool, "stats", None)
+        if stats is not None:
+            stats.reset()
+
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=reset_in_child)
+
+
+def pool_status(engine: Engine) -> Dict[str, Any]:
+    """Current pool occupancy plus the accumulated checkout wait statistics."""
+    pool = engine.pool
+    status: Dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
+
+
+def make_engine(database_url: Optional[str] = None) -> Engine:
+    """Create a SQLAlchemy engine using DATABASE_URL or the local default."""
+    database_url = normalize_database_url(database_url) if database_url else configured_database_url()
+    engine = create_engine(database_url, future=True, **pool_options_from_env(database_url, PoolStats()))
+    dispose_after_fork(engine)
+    return engine
+
+
+def async_database_url(database_url: str) -> str:
+    """Swap the driver for its asyncio counterpart (asyncpg or aiosqlite)."""
+    url = make_url(database_url)
+    query = dict(url.query)
+    sslmode = query.pop("sslmode", None)
+    if url.get_backend_name() == "postgresql":
+        # asyncpg takes ``ssl`` with the same values libpq uses for ``sslmode``.
+        if sslmode is not None:
+            query["ssl"] = sslmode
+        url = url.set(drivername="postgresql+asyncpg", query=query)
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite", query=query)
+    return url.render_as_string(hide_password=False)
+
+
+def make_async_engine(database_url: Optional[str] = None) -> AsyncEngine:
+    """Create an AsyncEngine for the same database and pool settings as make_engine."""
+    database_url = normalize_database_url(database_url) if database_url else configured_database_url()
+    async_url = async_database_url(database_url)
+    options = pool_options_from_env(async_url, PoolStats(), queue_class=AsyncAdaptedQueuePool)
+    engine = create_async_engine(async_url, **options)
+    dispose_after_fork(engine.sync_engine)
+    return engine
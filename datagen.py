@@ -0,0 +1,261 @@
+"""Deterministic synthetic data for the seven assignment tables.
+
+    python datagen.py --users 100000 [--seed 341] [--reset] [--create-schema]
+
+The number of users drives everything else, at about 8.4 rows in total per
+user: ``--users 1200`` gives roughly 10^4 rows and ``--users 1200000``
+roughly 10^7.
+
+* 40% of users are caregivers and 70% are members (some are both, as in
+  the fixture); every member has one address.
+* Members post 1.5 jobs on average; the number of applications per job is
+  geometric (most jobs get a few, some get dozens).
+* Appointments are 2 per member on average and go disproportionately to
+  a small set of popular caregivers; 60% are confirmed, 25% pending and
+  15% declined.
+* Cities, streets, caregiving types and hourly rates follow the fixture's
+  values with skewed weights and a log-normal rate.
+
+Each table has its own random stream seeded from ``--seed`` and the table
+name, so the same arguments always produce the same rows. Rows are written
+with bulk_import.import_rows (COPY on PostgreSQL) and generated lazily, so
+memory use does not grow with the row count.
+"""
+import argparse
+import datetime
+import json
+import random
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Tuple
+
+from sqlalchemy import MetaData, Table
+from sqlalchemy.engine import Engine
+
+from bulk_import import DEFAULT_BATCH_SIZE, import_rows
+from init_db import BASELINE_VERSION, apply_migrations
+
+DEFAULT_SEED = 341
+# Parents before children; deleting runs in reverse.
+TABLE_ORDER = ("users", "caregiver", "member", "address", "job", "job_application", "appointment")
+
+CITIES = (("Almaty", 45), ("Astana", 35), ("Shymkent", 12), ("Karaganda", 5), ("Aktobe", 3))
+STREETS = ("Abay", "Dostyk", "Kabanbay Batyr", "Panfilov", "Pushkin", "Seifullin", "Tole Bi", "Zhibek Zholy")
+GIVEN_NAMES = (
+    "Aigerim", "Aliya", "Amina", "Arman", "Aslan", "Bekzat", "Daniyar", "Dinara", "Erlan", "Gulnar",
+    "Madina", "Malika", "Murat", "Nursultan", "Saniya", "Timur", "Yerlan", "Zhanar", "Zhanibek", "Zarina",
+)
+SURNAMES = (
+    "Abdullin", "Akhmetov", "Beketov", "Ibrayev", "Kairatov", "Karimov", "Kassymov", "Nurgaliyev",
+    "Omarov", "Orazbayev", "Sarsembayev", "Seitkali", "Tulegenov", "Yergaliyev", "Zhakslykov",
+)
+CAREGIVING_TYPES = (("babysitter", 50), ("caregiver for elderly", 30), ("playmate for children", 20))
+APPOINTMENT_STATUSES = (("confirmed", 60), ("pending", 25), ("declined", 15))
+REQUIREMENTS = (
+    "Soft-spoken", "patient", "energetic", "creative", "gentle", "experienced", "trustworthy",
+    "playful", "calm", "attentive", "punctual", "non-smoker",
+)
+HOUSE_RULES = ("No pets", "No smoking", "Quiet after 9pm", "Shoes off indoors", "No guests")
+DEPENDENTS = (
+    "{age}-year-old son, likes painting", "{age}-year-old daughter, enjoys music",
+    "Grandmother, requires daily care", "Elderly father, needs supervision", "Grandfather, mild dementia",
+)
+START_DATE = datetime.date(2024, 1, 1)
+
+
+class Scale(NamedTuple):
+    users: int
+    caregivers: int
+    first_member: int
+    members: int
+    jobs: int
+    appointments: int
+
+    @classmethod
+    def for_users(cls, users: int) -> "Scale":
+        caregivers = max(1, users * 4 // 10)
+        members = max(1, users * 7 // 10)
+        return cls(
+            users=users,
+            caregivers=caregivers,
+            first_member=users - members + 1,
+            members=members,
+            jobs=members * 3 // 2,
+            appointments=members * 2,
+        )
+
+
+def _rng(seed: int, table_name: str) -> random.Random:
+    return random.Random(f"{seed}:{table_name}")
+
+
+def _weighted(rng: random.Random, choices: Tuple[Tuple[str, int], ...]) -> str:
+    return rng.choices([value for value, _ in choices], [weight for _, weight in choices])[0]
+
+
+def _skewed(rng: random.Random, count: int) -> int:
+    # Cubing a uniform draw puts ~46% of picks in the first 10% of ids.
+    return min(count - 1, int(count * rng.random() ** 3))
+
+
+def _timestamp(rng: random.Random, days: int = 700) -> datetime.datetime:
+    return datetime.datetime.combine(START_DATE, datetime.time()) + datetime.timedelta(
+        days=rng.randrange(days), seconds=rng.randrange(86400)
+    )
+
+
+def users(scale: Scale, rng: random.Random) -> Iterator[Dict[str, Any]]:
+    for user_id in range(1, scale.users + 1):
+        given_name, surname = rng.choice(GIVEN_NAMES), rng.choice(SURNAMES)
+        yield {
+            "user_id": user_id,
+            "email": f"{given_name.lower()}.{surname.lower()}.{user_id}@example.com",
+            "given_name": given_name,
+            "surname": surname,
+            "city": _weighted(rng, CITIES),
+            "phone_number": f"+7700{rng.randrange(10 ** 7):07d}" if rng.random() < 0.9 else None,
+            "profile_description": rng.choice(("Friendly", "Experienced", "Reliable", "Caring")) + " " + rng.choice(
+                ("caregiver", "babysitter", "nanny", "companion")
+            ),
+            "password": "pass123",
+        }
+
+
+def caregivers(scale: Scale, rng: random.Random) -> Iterator[Dict[str, Any]]:
+    for user_id in range(1, scale.caregivers + 1):
+        rate = min(60.0, max(5.0, rng.lognormvariate(2.4, 0.3)))
+        yield {
+            "caregiver_user_id": user_id,
+            "photo": f"photo{user_id}.jpg",
+            "gender": rng.choice(("Male", "Female")),
+            "caregiving_type": _weighted(rng, CAREGIVING_TYPES),
+            "hourly_rate": Decimal(f"{rate:.2f}"),
+        }
+
+
+def members(scale: Scale, rng: random.Random) -> Iterator[Dict[str, Any]]:
+    for offset in range(scale.members):
+        yield {
+            "member_user_id": scale.first_member + offset,
+            "house_rules": ", ".join(rng.sample(HOUSE_RULES, rng.randint(1, 2))),
+            "dependent_description": rng.choice(DEPENDENTS).format(age=rng.randint(1, 12)),
+        }
+
+
+def addresses(scale: Scale, rng: random.Random) -> Iterator[Dict[str, Any]]:
+    for offset in range(scale.members):
+        yield {
+            "member_user_id": scale.first_member + offset,
+            "house_number": str(rng.randint(1, 300)),
+            "street": rng.choice(STREETS),
+            "town": _weighted(rng, CITIES),
+        }
+
+
+def jobs(scale: Scale, rng: random.Random) -> Iterator[Dict[str, Any]]:
+    for job_id in range(1, scale.jobs + 1):
+        yield {
+            "job_id": job_id,
+            "member_user_id": scale.first_member + rng.randrange(scale.members),
+            "required_caregiving_type": _weighted(rng, CAREGIVING_TYPES),
+            "other_requirements": ", ".join(rng.sample(REQUIREMENTS, rng.randint(1, 3))).capitalize(),
+            "date_posted": _timestamp(rng),
+        }
+
+
+def job_applications(scale: Scale, rng: random.Random) -> Iterator[Dict[str, Any]]:
+    for job_id in range(1, scale.jobs + 1):
+        # Geometric with mean ~3, capped by the number of caregivers.
+        applicants = 0
+        while rng.random() < 0.75 and applicants < min(200, scale.caregivers):
+            applicants += 1
+        for caregiver_index in rng.sample(range(scale.caregivers), applicants):
+            yield {
+                "caregiver_user_id": caregiver_index + 1,
+                "job_id": job_id,
+                "date_applied": _timestamp(rng),
+            }
+
+
+def appointments(scale: Scale, rng: random.Random) -> Iterator[Dict[str, Any]]:
+    for appointment_id in range(1, scale.appointments + 1):
+        yield {
+            "appointment_id": appointment_id,
+            "caregiver_user_id": _skewed(rng, scale.caregivers) + 1,
+            "member_user_id": scale.first_member + rng.randrange(scale.members),
+            "appointment_date": START_DATE + datetime.timedelta(days=rng.randrange(730)),
+            "appointment_time": datetime.time(rng.randint(7, 20), rng.choice((0, 30))),
+            "work_hours": Decimal(rng.choice(("1", "1.5", "2", "2.5", "3", "4", "5", "6", "8"))),
+            "status": _weighted(rng, APPOINTMENT_STATUSES),
+        }
+
+
+GENERATORS: Dict[str, Callable[[Scale, random.Random], Iterator[Dict[str, Any]]]] = {
+    "users": users,
+    "caregiver": caregivers,
+    "member": members,
+    "address": addresses,
+    "job": jobs,
+    "job_application": job_applications,
+    "appointment": appointments,
+}
+
+
+def generate(table_name: str, scale: Scale, seed: int = DEFAULT_SEED) -> Iterator[Dict[str, Any]]:
+    return GENERATORS[table_name](scale, _rng(seed, table_name))
+
+
+def create_schema(engine: Engine) -> None:
+    """Apply the baseline migration (the tables of assigm3.sql) if it is missing."""
+    apply_migrations(engine, up_to=BASELINE_VERSION)
+
+
+def reset(engine: Engine, metadata: MetaData) -> None:
+    with engine.begin() as conn:
+        for table_name in reversed(TABLE_ORDER):
+            conn.execute(metadata.tables[table_name].delete())
+
+
+def load(engine: Engine, scale: Scale, seed: int = DEFAULT_SEED,
+         batch_size: int = DEFAULT_BATCH_SIZE) -> List[Dict[str, Any]]:
+    """Generate and insert every table in FK order; returns the import reports."""
+    metadata = MetaData()
+    metadata.reflect(bind=engine, only=list(TABLE_ORDER))
+    reports = []
+    for table_name in TABLE_ORDER:
+        table: Table = metadata.tables[table_name]
+        records = enumerate(generate(table_name, scale, seed), start=1)
+        report = import_rows(engine, table, records, batch_size=batch_size)
+        reports.append(report.as_dict())
+        print(f"{table_name:<16} {report.rows_inserted:>10} rows  {report.rows_per_second:>10.0f} rows/s")
+        if report.errors:
+            raise SystemExit(f"{table_name}: {report.errors[0]}")
+    return reports
+
+
+def main() -> None:
+    from database import make_engine
+
+    parser = argparse.ArgumentParser(description="Load deterministic synthetic data.")
+    parser.add_argument("--users", type=int, default=10000, help="number of users; other tables scale with it")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--reset", action="store_true", help="delete existing rows first")
+    parser.add_argument("--create-schema", action="store_true", help="create missing tables from assigm3.sql")
+    parser.add_argument("--json", dest="json_path", help="write the import reports to this file")
+    args = parser.parse_args()
+
+    engine = make_engine()
+    if args.create_schema:
+        create_schema(engine)
+    if args.reset:
+        metadata = MetaData()
+        metadata.reflect(bind=engine, only=list(TABLE_ORDER))
+        reset(engine, metadata)
+    reports = load(engine, Scale.for_users(args.users), args.seed, args.batch_size)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump({"users": args.users, "seed": args.seed, "tables": reports}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Streaming CSV/JSONL/Parquet export of a reflected table.
+
+Rows are read from a server-side cursor in fixed-size partitions and
+encoded one partition at a time, so memory use does not grow with the
+table. On PostgreSQL with psycopg2, CSV is produced by the server with
+``COPY (SELECT ...) TO STDOUT`` and relayed through a small bounded queue.
+Parquet output needs the optional ``pyarrow`` package (requirements-parquet.txt).
+
+Command line usage:
+
+    python export.py appointment --format csv --columns appointment_id,status > appointment.csv
+"""
+import argparse
+import csv
+import datetime
+import decimal
+import io
+import json
+import queue
+import sys
+import threading
+from typing import Any, Iterator, List, Optional, Sequence
+
+from sqlalchemy import MetaData, Table, select, tuple_
+from sqlalchemy.engine import Engine
+
+from aggregate import json_value
+from filters import coerce_param
+from records import python_type_for
+
+FORMATS = ("csv", "jsonl", "parquet")
+MIMETYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+PARTITION_ROWS = 5000
+COPY_CHUNK_BYTES = 64 * 1024
+COPY_QUEUE_CHUNKS = 16
+
+
+def parse_key(table: Table, raw: str) -> List[Any]:
+    """Turn ``"3"`` or ``"3,17"`` into coerced primary key values; raises ValueError."""
+    pk_columns = list(table.primary_key.columns)
+    parts = raw.split(",")
+    if not pk_columns or len(parts) != len(pk_columns):
+        raise ValueError(f"Key '{raw}' does not match the primary key of '{table.name}'")
+    return [coerce_param(column, part.strip()) for column, part in zip(pk_columns, parts)]
+
+
+def export_statement(table: Table, columns: Optional[Sequence[str]] = None,
+                     start: Optional[Sequence[Any]] = None, end: Optional[Sequence[Any]] = None):
+    """Select ``columns`` of ``table`` in primary key order, within an inclusive key range."""
+    if columns:
+        unknown = [name for name in columns if name not in table.c]
+        if unknown:
+            raise ValueError(f"Unknown column(s) for '{table.name}': {', '.join(unknown)}")
+        stmt = select(*[table.c[name] for name in columns])
+    else:
+        stmt = select(table)
+    pk_columns = list(table.primary_key.columns)
+    if not pk_columns:
+        if start is not None or end is not None:
+            raise ValueError(f"Table '{table.name}' has no primary key to filter on")
+        return stmt
+    key = pk_columns[0] if len(pk_columns) == 1 else tuple_(*pk_columns)
+    if start is not None:
+        stmt = stmt.where(key >= (start[0] if len(pk_columns) == 1 else tuple_(*start)))
+    if end is not None:
+        stmt = stmt.where(key <= (end[0] if len(pk_columns) == 1 else tuple_(*end)))
+    return stmt.order_by(*pk_columns)
+
+
+def stream_partitions(engine: Engine, stmt, partition_rows: int = PARTITION_ROWS) -> Iterator[List[Any]]:
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=partition_rows).execute(stmt)
+        for partition in result.partitions():
+            yield partition
+
+
+def csv_chunks(column_names: Sequence[str], partitions: Iterator[List[Any]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(column_names)
+    for partition in partitions:
+        writer.writerows(partition)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def jsonl_chunks(column_names: Sequence[str], partitions: Iterator[List[Any]]) -> Iterator[bytes]:
+    for partition in partitions:
+        lines = [json.dumps(dict(zip(column_names, row)), default=json_value) for row in partition]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _arrow_type(pa, column):
+    python_type = python_type_for(column)
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is decimal.Decimal:
+        precision = getattr(column.type, "precision", None) or 38
+        scale = getattr(column.type, "scale", None) or 0
+        return pa.decimal128(precision, scale)
+    if python_type is datetime.datetime:
+        return pa.timestamp("us")
+    if python_type is datetime.date:
+        return pa.date32()
+    if python_type is datetime.time:
+        return pa.time64("us")
+    return pa.string()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands back whatever was written so far."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parquet_chunks(columns: Sequence[Any], partitions: Iterator[List[Any]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([pa.field(column.name, _arrow_type(pa, column)) for column in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for partition in partitions:
+            arrays = [
+                pa.array([row[position] for row in partition], type=field.type)
+                for position, field in enumerate(schema)
+            ]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+class _QueueWriter:
+    """File-like target for copy_expert that forwards data in large chunks."""
+
+    def __init__(self, chunks: "queue.Queue", cancelled: threading.Event) -> None:
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self._pending: List[bytes] = []
+        self._pending_size = 0
+
+    def write(self, data) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= COPY_CHUNK_BYTES:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        self.put(b"".join(self._pending))
+        self._pending.clear()
+        self._pending_size = 0
+
+    def put(self, item: Any) -> None:
+        while True:
+            if self._cancelled.is_set():
+                raise RuntimeError("export cancelled by the client")
+            try:
+                self._chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+
+def copy_csv_chunks(engine: Engine, stmt) -> Iterator[bytes]:
+    """Stream ``COPY (stmt) TO STDOUT`` output through a bounded queue."""
+    compiled = stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    sql = f"COPY ({compiled}) TO STDOUT WITH (FORMAT csv, HEADER)"
+    chunks: "queue.Queue" = queue.Queue(maxsize=COPY_QUEUE_CHUNKS)
+    cancelled = threading.Event()
+    writer = _QueueWriter(chunks, cancelled)
+
+    def run() -> None:
+        try:
+            with engine.connect() as conn:
+                with conn.connection.driver_connection.cursor() as cursor:
+                    cursor.copy_expert(sql, writer)
+            writer.flush()
+            writer.put(None)
+        except Exception as exc:
+            if not cancelled.is_set():
+                chunks.put(exc)
+
+    worker = threading.Thread(target=run, name="copy-export", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        worker.join(timeout=5)
+
+
+def export_chunks(engine: Engine, table: Table, fmt: str, columns: Optional[Sequence[str]] = None,
+                  start: Optional[Sequence[Any]] = None, end: Optional[Sequence[Any]] = None) -> Iterator[bytes]:
+    """Validate the request and return an iterator of encoded output chunks."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}")
+    if fmt == "parquet" and not parquet_available():
+        raise ValueError("Parquet export requires the optional 'pyarrow' package")
+    stmt = export_statement(table, columns, start, end)
+    selected = [table.c[name] for name in columns] if columns else list(table.columns)
+    names = [column.name for column in selected]
+    if fmt == "csv" and engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2":
+        return copy_csv_chunks(engine, stmt)
+    partitions = stream_partitions(engine, stmt)
+    if fmt == "csv":
+        return csv_chunks(names, partitions)
+    if fmt == "jsonl":
+        return jsonl_chunks(names, partitions)
+    return parquet_chunks(selected, partitions)
+
+
+def main() -> None:
+    from database import make_engine
+
+    parser = argparse.ArgumentParser(description="Stream a table to CSV, JSONL or Parquet.")
+    parser.add_argument("table")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--columns", help="comma-separated column names")
+    parser.add_argument("--start", help="first primary key to include, comma-separated for composite keys")
+    parser.add_argument("--end", help="last primary key to include")
+    parser.add_argument("-o", "--output", help="file to write instead of stdout")
+    args = parser.parse_args()
+
+    engine = make_engine()
+    table = Table(args.table, MetaData(), autoload_with=engine)
+    chunks = export_chunks(
+        engine,
+        table,
+        args.format,
+        columns=args.columns.split(",") if args.columns else None,
+        start=parse_key(table, args.start) if args.start else None,
+        end=parse_key(table, args.end) if args.end else None,
+    )
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
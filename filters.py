@@ -0,0 +1,108 @@
+"""Translate table browser query parameters into SQL filters.
+
+Supported parameters on ``/table/<name>``:
+
+* ``<column>=value``                 - equality; repeat the parameter for IN.
+* ``<column>__gte``/``__lte``/``__gt``/``__lt`` - ranges.
+* ``sort=<column>`` or ``sort=-<column>`` - order, ties broken by the key.
+* ``q=text``                         - search over the table's TEXT columns.
+
+On PostgreSQL the search is a full-text match against the same
+``to_tsvector`` expression that migration 0002 indexes with GIN; elsewhere
+it falls back to a case-insensitive LIKE over the same columns.
+"""
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional
+
+from sqlalchemy import Table, Text, and_, func, literal, or_
+
+from records import coerce_value
+
+RESERVED_PARAMS = {"page_size", "after", "before", "sort", "q"}
+RANGE_OPERATORS = {
+    "gte": lambda column, value: column >= value,
+    "lte": lambda column, value: column <= value,
+    "gt": lambda column, value: column > value,
+    "lt": lambda column, value: column < value,
+}
+SEARCH_CONFIG = "simple"
+
+
+class TableQuery(NamedTuple):
+    filters: List[Any]
+    sort_column: Optional[Any]
+    descending: bool
+    search: Optional[str]
+    params: Dict[str, List[str]]
+
+
+def text_columns(table: Table) -> List[Any]:
+    return [column for column in table.columns if isinstance(column.type, Text)]
+
+
+def search_vector(table: Table):
+    """The tsvector expression searched on PostgreSQL (and indexed by migration 0002)."""
+    columns = text_columns(table)
+    document = func.coalesce(columns[0], literal(""))
+    for column in columns[1:]:
+        document = document.op("||")(literal(" ")).op("||")(func.coalesce(column, literal("")))
+    return func.to_tsvector(literal(SEARCH_CONFIG), document)
+
+
+def search_clause(table: Table, dialect_name: str, text: str):
+    columns = text_columns(table)
+    if not columns:
+        raise ValueError(f"Table '{table.name}' has no text columns to search")
+    if dialect_name == "postgresql":
+        return search_vector(table).op("@@")(func.plainto_tsquery(literal(SEARCH_CONFIG), text))
+    pattern = "%" + text.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return or_(*[func.lower(column).like(pattern, escape="\\") for column in columns])
+
+
+def coerce_param(column, raw: str) -> Any:
+    try:
+        return coerce_value(column, raw)
+    except (TypeError, ValueError, ArithmeticError) as exc:
+        raise ValueError(f"Invalid value '{raw}' for column '{column.name}': {exc}")
+
+
+def column_filter(column, operator: str, values: List[str]):
+    """``column = v``, ``column IN (...)`` or a range; raises ValueError."""
+    if operator:
+        if operator not in RANGE_OPERATORS:
+            raise ValueError(f"Unknown filter operator '{operator}'")
+        return and_(*[RANGE_OPERATORS[operator](column, coerce_param(column, value)) for value in values])
+    if len(values) == 1:
+        return column == coerce_param(column, values[0])
+    return column.in_([coerce_param(column, value) for value in values])
+
+
+def parse_table_query(table: Table, args: Mapping[str, Any], dialect_name: str) -> TableQuery:
+    """Build filters from request arguments; raises ValueError for bad input."""
+    filters: List[Any] = []
+    params: Dict[str, List[str]] = {}
+    for name in args:
+        values = [value for value in args.getlist(name) if value != ""]
+        if name in RESERVED_PARAMS or not values:
+            continue
+        column_name, _, operator = name.partition("__")
+        if column_name not in table.c:
+            raise ValueError(f"Unknown column '{column_name}' for '{table.name}'")
+        filters.append(column_filter(table.c[column_name], operator, values))
+        params[name] = values
+
+    sort_column, descending = None, False
+    sort = args.get("sort", "")
+    if sort:
+        descending = sort.startswith("-")
+        sort_name = sort.lstrip("-")
+        if sort_name not in table.c:
+            raise ValueError(f"Cannot sort by unknown column '{sort_name}'")
+        sort_column = table.c[sort_name]
+        params["sort"] = [sort]
+
+    search = args.get("q", "").strip() or None
+    if search:
+        filters.append(search_clause(table, dialect_name, search))
+        params["q"] = [search]
+
+    return TableQuery(filters, sort_column, descending, search, params)
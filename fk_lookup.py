@@ -0,0 +1,175 @@
+"""Autocomplete for foreign key inputs in the create/edit form.
+
+Every single-column foreign key of a reflected table, such as
+``appointment.caregiver_user_id`` or ``job.member_user_id``, is served by
+``GET /api/table/<table>/lookup/<column>?q=...&limit=...``. It returns up
+to ``limit`` referenced keys as ``[{"value": 12, "label": "12: Amina
+Akhmetova"}, ...]``, so the form itself runs no queries and only loads
+the few rows a user is typing towards.
+
+Labels come from ``users``: the referenced row is followed along
+single-column foreign keys (caregiver -> users, job -> member -> users)
+to the first table holding given_name and surname. Tables that never reach
+it are labelled with the key alone.
+
+``q`` matches by prefix only, so every branch can use an index:
+
+* integer keys as ranges (``12`` is 12, 120-129, 1200-1299, ...) over the
+  primary key;
+* each word of ``q`` against given_name or surname, case-insensitively:
+  ``lower(col) LIKE 'word%'`` on PostgreSQL and a range under
+  ``COLLATE NOCASE`` elsewhere, served by the indexes of migration 0004.
+
+* FK_LOOKUP_LIMIT         - suggestions per request when ``limit`` is not
+  given (default 20, at most 100).
+* FK_LOOKUP_CACHE_ENTRIES - responses kept per process (default 512, 0 for
+  none), keyed on the query and the change versions of the tables read.
+"""
+import os
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import BigInteger, Integer, SmallInteger, Table, and_, func, or_, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import ForeignKeyConstraint
+
+from records import python_type_for
+
+LABEL_TABLE = "users"
+LABEL_COLUMNS = ("given_name", "surname")
+MAX_LABEL_DEPTH = 3
+DEFAULT_LIMIT = int(os.getenv("FK_LOOKUP_LIMIT", "20"))
+MAX_LIMIT = 100
+CACHE_ENTRIES = int(os.getenv("FK_LOOKUP_CACHE_ENTRIES", "512"))
+
+
+class Lookup(NamedTuple):
+    key: Any
+    source: Any
+    labels: List[Any]
+    tables: List[str]
+
+
+def _single_column_keys(table: Table) -> Dict[str, ForeignKeyConstraint]:
+    return {
+        constraint.elements[0].parent.name: constraint
+        for constraint in table.foreign_key_constraints
+        if len(constraint.elements) == 1
+    }
+
+
+def lookup_columns(table: Table) -> List[str]:
+    """Columns of ``table`` that get an autocomplete lookup."""
+    return list(_single_column_keys(table))
+
+
+def _label_path(start: Table, get_table: Callable[[str], Optional[Table]]) -> Optional[List[Table]]:
+    """Tables from ``start`` to the label table, joined by single-column keys."""
+    pending = [[start]]
+    seen = {start.name}
+    while pending:
+        path = pending.pop(0)
+        table = path[-1]
+        if table.name == LABEL_TABLE and all(name in table.c for name in LABEL_COLUMNS):
+            return path
+        if len(path) > MAX_LABEL_DEPTH:
+            continue
+        for constraint in _single_column_keys(table).values():
+            parent = get_table(constraint.referred_table.name)
+            if parent is not None and parent.name not in seen:
+                seen.add(parent.name)
+                pending.append(path + [parent])
+    return None
+
+
+def build_lookup(table: Table, column_name: str, get_table: Callable[[str], Optional[Table]]) -> Optional[Lookup]:
+    constraint = _single_column_keys(table).get(column_name)
+    if constraint is None:
+        return None
+    target = get_table(constraint.referred_table.name)
+    if target is None:
+        return None
+    key = target.c[constraint.elements[0].column.name]
+    path = _label_path(target, get_table)
+    if path is None:
+        return Lookup(key, target, [], [target.name])
+    source = target
+    for child, parent in zip(path, path[1:]):
+        link = next(
+            constraint for constraint in _single_column_keys(child).values()
+            if constraint.referred_table.name == parent.name
+        )
+        element = link.elements[0]
+        source = source.join(parent, child.c[element.parent.name] == parent.c[element.column.name], isouter=True)
+    return Lookup(key, source, [path[-1].c[name] for name in LABEL_COLUMNS], [step.name for step in path])
+
+
+def clamp_limit(raw: Optional[str]) -> int:
+    try:
+        limit = int(raw) if raw else DEFAULT_LIMIT
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _integer_prefix(column, prefix: str):
+    if not prefix.isdigit():
+        return None
+    if prefix.startswith("0"):
+        return column == 0 if prefix == "0" else None
+    # Reflected types are dialect subclasses (INTEGER, BIGINT, ...); SmallInteger
+    # and BigInteger are themselves Integer subclasses, so test them first.
+    if isinstance(column.type, SmallInteger):
+        digits = 5
+    elif isinstance(column.type, BigInteger):
+        digits = 19
+    elif isinstance(column.type, Integer):
+        digits = 10
+    else:
+        digits = 19
+    value = int(prefix)
+    return or_(*[
+        column.between(value * 10 ** extra, (value + 1) * 10 ** extra - 1)
+        for extra in range(max(digits - len(prefix), 0) + 1)
+    ])
+
+
+def _text_prefix(expr, prefix: str, dialect_name: str):
+    if dialect_name == "postgresql":
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return expr.like(pattern, escape="\\")
+    # Under a binary or NOCASE collation the range holds exactly the strings
+    # starting with prefix.
+    return and_(expr >= prefix, expr < prefix + "\U0010ffff")
+
+
+def _name_prefix(column, word: str, dialect_name: str):
+    if dialect_name == "postgresql":
+        return _text_prefix(func.lower(column), word, dialect_name)
+    return _text_prefix(column.collate("NOCASE"), word, dialect_name)
+
+
+def search(conn: Connection, lookup: Lookup, q: str, limit: int) -> List[Dict[str, Any]]:
+    statement = select(lookup.key, *lookup.labels).select_from(lookup.source).order_by(lookup.key).limit(limit)
+    q = q.strip()
+    if q:
+        dialect_name = conn.dialect.name
+        python_type = python_type_for(lookup.key)
+        clauses = []
+        if python_type is int:
+            clauses.append(_integer_prefix(lookup.key, q))
+        elif python_type is str:
+            clauses.append(_text_prefix(lookup.key, q, dialect_name))
+        if lookup.labels:
+            clauses.append(and_(*[
+                or_(*[_name_prefix(label, word, dialect_name) for label in lookup.labels])
+                for word in q.lower().split()
+            ]))
+        clauses = [clause for clause in clauses if clause is not None]
+        if not clauses:
+            return []
+        statement = statement.where(or_(*clauses))
+    suggestions = []
+    for key, *names in conn.execute(statement):
+        name = " ".join(str(part) for part in names if part)
+        suggestions.append({"value": key, "label": f"{key}: {name}" if name else str(key)})
+    return suggestions
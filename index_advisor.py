@@ -0,0 +1,142 @@
+"""Apply the pending migrations and look for sequential scans in report plans.
+
+    python index_advisor.py migrate [--concurrently]
+    python index_advisor.py explain [--min-rows 10000] [--json]
+
+``explain`` runs EXPLAIN on every alchemy.part2.py query and on the report
+refresh statements, and lists each full table scan that remains. On
+PostgreSQL, ``--min-rows`` ignores tables the planner estimates to be
+smaller than the given size, since a sequential scan is the right plan
+for them. The command exits with status 1 when findings remain.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection
+
+from reporting import ReportStore, source_queries
+
+RELATION_SIZES = text(
+    """
+    SELECT c.relname, c.reltuples
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = current_schema() AND c.relname IN :names
+    """
+).bindparams(bindparam("names", expanding=True))
+
+
+class Finding(NamedTuple):
+    query: str
+    relation: str
+    detail: str
+    estimated_rows: Optional[float]
+
+
+def _execute_prefixed(conn: Connection, prefix: str, stmt) -> List[Any]:
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    return conn.exec_driver_sql(f"{prefix} {compiled}", params).all()
+
+
+def _walk(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def postgres_findings(conn: Connection, label: str, stmt) -> List[Finding]:
+    (document,) = _execute_prefixed(conn, "EXPLAIN (FORMAT JSON)", stmt)[0]
+    if isinstance(document, str):
+        document = json.loads(document)
+    findings = []
+    for node in _walk(document[0]["Plan"]):
+        if node.get("Node Type") == "Seq Scan":
+            detail = f"Seq Scan on {node['Relation Name']}"
+            if node.get("Filter"):
+                detail += f" filter {node['Filter']}"
+            findings.append(Finding(label, node["Relation Name"], detail, None))
+    return findings
+
+
+def sqlite_findings(conn: Connection, label: str, stmt) -> List[Finding]:
+    findings = []
+    for row in _execute_prefixed(conn, "EXPLAIN QUERY PLAN", stmt):
+        detail = row[-1]
+        # "SCAN job" is a full scan; "SEARCH ... USING INDEX" and covering
+        # index scans are not.
+        if detail.startswith("SCAN ") and " USING " not in detail:
+            findings.append(Finding(label, detail.split()[1], detail, None))
+    return findings
+
+
+def advise(conn: Connection, get_table, min_rows: float = 0) -> List[Finding]:
+    statements = {f"{number} {title}": stmt for number, (title, stmt) in source_queries(get_table).items()}
+    statements.update(ReportStore(get_table).refresh_queries())
+
+    inspect_plan = postgres_findings if conn.dialect.name == "postgresql" else sqlite_findings
+    if conn.dialect.name not in ("postgresql", "sqlite"):
+        raise SystemExit(f"EXPLAIN inspection is not implemented for {conn.dialect.name}")
+    findings = [
+        finding
+        for label, stmt in statements.items()
+        for finding in inspect_plan(conn, label, stmt)
+        # Scans of CTEs and other intermediate results are not table scans.
+        if get_table(finding.relation) is not None
+    ]
+
+    if conn.dialect.name == "postgresql" and findings:
+        sizes = dict(conn.execute(RELATION_SIZES, {"names": sorted({f.relation for f in findings})}).all())
+        findings = [
+            finding._replace(estimated_rows=sizes.get(finding.relation))
+            for finding in findings
+            if sizes.get(finding.relation, 0) >= min_rows
+        ]
+    return findings
+
+
+def migrate(engine, concurrently: bool) -> None:
+    from init_db import apply_migrations
+
+    if not apply_migrations(engine, concurrently=concurrently, echo=True):
+        print("No pending migrations.")
+
+
+def main() -> None:
+    from database import make_engine
+    from schema_cache import SchemaCache
+
+    parser = argparse.ArgumentParser(description="Report index migration and plan checks.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subcommands.add_parser("migrate", help="create the report and search indexes")
+    migrate_parser.add_argument("--concurrently", action="store_true", help="PostgreSQL: build without locking writes")
+    explain_parser = subcommands.add_parser("explain", help="flag sequential scans in the report plans")
+    explain_parser.add_argument("--min-rows", type=float, default=0)
+    explain_parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    engine = make_engine()
+    if args.command == "migrate":
+        migrate(engine, args.concurrently)
+        return
+
+    with engine.connect() as conn:
+        findings = advise(conn, SchemaCache(engine).get_table, args.min_rows)
+    if args.json:
+        print(json.dumps([finding._asdict() for finding in findings], indent=2))
+    elif not findings:
+        print("No sequential scans found.")
+    else:
+        for finding in findings:
+            size = f" (~{finding.estimated_rows:.0f} rows)" if finding.estimated_rows is not None else ""
+            print(f"{finding.query}: {finding.detail}{size}")
+    sys.exit(1 if findings else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,377 @@
-"""Initialize database from SQL file."""
+"""Apply the schema migrations and seed empty tables.
+
+    python init_db.py [--seed-sql assigm3.sql | --seed-dir DIR | --no-seed]
+                      [--jobs 4] [--dry-run] [--json]
+    python init_db.py --status
+
+Schema changes are the versioned modules in migrations/, starting with
+0000, the CREATE TABLE part of assigm3.sql. Every applied version is
+recorded in ``app_schema_migrations`` so it runs once; on PostgreSQL an
+advisory lock keeps workers that start together from migrating at the same
+time.
+
+Seeding fills the tables that are still empty, in foreign key order.
+Tables at the same depth of the dependency graph (caregiver and member
+both only reference users) do not depend on each other, and with ``--jobs``
+above 1 they are loaded concurrently, each in its own transaction. Seed
+rows come from the multi-row INSERT statements of ``--seed-sql``, or from
+``<table>.csv``/``<table>.jsonl`` files in ``--seed-dir``, which go through
+bulk_import.load_rows (COPY on PostgreSQL). SQLite has a single writer, so
+it always seeds one table at a time.
+
+``--dry-run`` performs every step and prints how long each took, then
+rolls back: on PostgreSQL everything runs in one transaction, and SQLite
+(whose DDL pysqlite does not roll back reliably) works on an in-memory copy
+of the database.
+
+app.py calls init_database() at startup, which migrates and seeds from
+assigm3.sql only when it has just created the baseline schema.
+"""
+import argparse
+import json
 import os
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import OperationalError
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Mapping, NamedTuple, Optional
+
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, create_engine, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.pool import StaticPool
+
+from bulk_import import FORMATS, load_rows, read_rows
+from migrations import Migration, available_migrations
+from sql_script import insert_target, split_statements, translate
+
+DEFAULT_SQL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assigm3.sql")
+MIGRATIONS_TABLE = "app_schema_migrations"
+BASELINE_VERSION = 0
+# Any constant works, as long as every process migrating the database uses it.
+ADVISORY_LOCK_KEY = 3410003
+NO_PARAMETERS = {"no_parameters": True}
+
+migrations_metadata = MetaData()
+schema_migrations = Table(
+    MIGRATIONS_TABLE,
+    migrations_metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+    Column("duration_ms", Float, nullable=False),
+)
+
+Transaction = Callable[[], ContextManager[Connection]]
+SeedLoader = Callable[[Connection, Table], int]
+
+
+class Step(NamedTuple):
+    phase: str
+    name: str
+    rows: Optional[int]
+    elapsed_ms: float
+    note: str = ""
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def applied_versions(conn: Connection) -> Dict[int, Any]:
+    if not inspect(conn).has_table(MIGRATIONS_TABLE):
+        return {}
+    return {row.version: row for row in conn.execute(select(schema_migrations))}
+
+
+@contextmanager
+def migration_lock(engine: Engine) -> Iterator[None]:
+    """Hold a PostgreSQL session advisory lock; a no-op elsewhere."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            conn.commit()
+
+
+def _record(conn: Connection, migration: Migration, elapsed_ms: float) -> None:
+    conn.execute(
+        schema_migrations.insert(),
+        {
+            "version": migration.version,
+            "name": migration.name,
+            "applied_at": datetime.now(timezone.utc).replace(tzinfo=None),
+            "duration_ms": elapsed_ms,
+        },
+    )
+
+
+def run_migrations(engine: Engine, transaction: Transaction, concurrently: bool = False,
+                   up_to: Optional[int] = None, echo: bool = False) -> List[Step]:
+    """Apply and record each pending migration, each in its own transaction."""
+    with transaction() as conn:
+        migrations_metadata.create_all(conn)
+        applied = applied_versions(conn)
+
+    steps = []
+    for migration in available_migrations():
+        if migration.version in applied or (up_to is not None and migration.version > up_to):
+            continue
+        module = migration.load()
+        started = time.perf_counter()
+        if concurrently and engine.dialect.name == "postgresql":
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                for statement in module.statements(conn, concurrently=True):
+                    if echo:
+                        print(statement)
+                    conn.exec_driver_sql(statement, execution_options=NO_PARAMETERS)
+            with transaction() as conn:
+                _record(conn, migration, _elapsed_ms(started))
+        else:
+            with transaction() as conn:
+                if echo:
+                    for statement in module.statements(conn):
+                        print(statement)
+                module.upgrade(conn)
+                _record(conn, migration, _elapsed_ms(started))
+        steps.append(Step("migrate", f"{migration.version:04d} {migration.name}", None, _elapsed_ms(started)))
+    return steps
+
+
+def apply_migrations(engine: Engine, concurrently: bool = False, up_to: Optional[int] = None,
+                     echo: bool = False) -> List[Step]:
+    with migration_lock(engine):
+        return run_migrations(engine, engine.begin, concurrently=concurrently, up_to=up_to, echo=echo)
+
+
+def _sql_loader(statements: List[str]) -> SeedLoader:
+    def load(conn: Connection, table: Table) -> int:
+        rows = 0
+        for statement in statements:
+            result = conn.exec_driver_sql(translate(statement, conn.dialect.name), execution_options=NO_PARAMETERS)
+            rows += max(result.rowcount, 0)
+        return rows
+
+    return load
+
 
+def sql_seeds(path: str) -> Dict[str, SeedLoader]:
+    """One loader per table for the INSERT statements of a SQL script."""
+    with open(path, "r", encoding="utf-8") as handle:
+        script = handle.read()
+    grouped: Dict[str, List[str]] = {}
+    for statement in split_statements(script):
+        target = insert_target(statement)
+        if target is not None:
+            grouped.setdefault(target, []).append(statement)
+    return {name: _sql_loader(statements) for name, statements in grouped.items()}
 
-def normalize_database_url(database_url: str) -> str:
-    """Normalize database URL for SQLAlchemy."""
-    database_url = database_url.strip()
-    if database_url.startswith("postgres://"):
-        database_url = database_url.replace("postgres://", "postgresql+psycopg2://", 1)
-    if "sslmode=" not in database_url:
-        database_url += ("&" if "?" in database_url else "?") + "sslmode=require"
-    return database_url
 
+def _file_loader(path: str, fmt: str) -> SeedLoader:
+    def load(conn: Connection, table: Table) -> int:
+        with open(path, "r", encoding="utf-8-sig", newline="") as stream:
+            return load_rows(conn, table, read_rows(stream, fmt))
 
-def init_database():
-    """Initialize database from assigm3.sql file."""
-    database_url = os.getenv("DATABASE_URL")
-    if not database_url:
-        print("No DATABASE_URL found, skipping initialization")
+    return load
+
+
+def file_seeds(directory: str) -> Dict[str, SeedLoader]:
+    """One loader per ``<table>.csv`` or ``<table>.jsonl`` file in ``directory``."""
+    loaders = {}
+    for filename in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(filename)
+        if extension[1:] in FORMATS:
+            loaders[name.lower()] = _file_loader(os.path.join(directory, filename), extension[1:])
+    return loaders
+
+
+def seed_levels(tables: Mapping[str, Table]) -> List[List[str]]:
+    """Group ``tables`` by foreign key depth; a table only references earlier levels."""
+    depths: Dict[str, int] = {}
+
+    def depth(name: str, trail: frozenset) -> int:
+        if name in depths:
+            return depths[name]
+        if name in trail:
+            raise ValueError(f"Foreign key cycle through '{name}'; seed these tables by hand")
+        parents = {
+            key.column.table.name
+            for key in tables[name].foreign_keys
+            if key.column.table.name in tables and key.column.table.name != name
+        }
+        depths[name] = 1 + max((depth(parent, trail | {name}) for parent in parents), default=-1)
+        return depths[name]
+
+    levels: List[List[str]] = []
+    for name in sorted(tables):
+        level = depth(name, frozenset())
+        levels.extend([] for _ in range(level + 1 - len(levels)))
+        levels[level].append(name)
+    return levels
+
+
+def run_seeds(engine: Engine, transaction: Transaction, loaders: Mapping[str, SeedLoader],
+              jobs: int = 1) -> List[Step]:
+    """Seed every empty table that has a loader, one foreign key level at a time."""
+    with transaction() as conn:
+        missing = sorted(set(loaders) - set(inspect(conn).get_table_names()))
+        if missing:
+            raise ValueError(f"Seed data for unknown tables: {', '.join(missing)}")
+        metadata = MetaData()
+        metadata.reflect(bind=conn, only=sorted(loaders))
+    tables = {name: metadata.tables[name] for name in loaders}
+    if engine.dialect.name == "sqlite":
+        jobs = 1
+
+    def seed(phase: str, name: str) -> Step:
+        table = tables[name]
+        started = time.perf_counter()
+        with transaction() as conn:
+            if conn.execute(select(text("1")).select_from(table).limit(1)).first() is not None:
+                return Step(phase, name, None, _elapsed_ms(started), "not empty, skipped")
+            rows = loaders[name](conn, table)
+        return Step(phase, name, rows, _elapsed_ms(started))
+
+    steps = []
+    for depth, level in enumerate(seed_levels(tables)):
+        phase = f"seed {depth}"
+        started = time.perf_counter()
+        if jobs > 1 and len(level) > 1:
+            with ThreadPoolExecutor(max_workers=min(jobs, len(level))) as executor:
+                level_steps = list(executor.map(lambda name: seed(phase, name), level))
+        else:
+            level_steps = [seed(phase, name) for name in level]
+        steps.extend(level_steps)
+        rows = sum(step.rows or 0 for step in level_steps)
+        workers = min(jobs, len(level))
+        steps.append(Step(phase, "level", rows, _elapsed_ms(started), f"tables={len(level)} workers={workers}"))
+    return steps
+
+
+def _initialize(engine: Engine, transaction: Transaction, loaders: Mapping[str, SeedLoader],
+                jobs: int, fresh_only: bool) -> List[Step]:
+    with transaction() as conn:
+        had_baseline = BASELINE_VERSION in applied_versions(conn)
+    steps = run_migrations(engine, transaction)
+    if loaders and not (fresh_only and had_baseline):
+        steps.extend(run_seeds(engine, transaction, loaders, jobs))
+    return steps
+
+
+def initialize(engine: Engine, loaders: Mapping[str, SeedLoader], jobs: int = 1, dry_run: bool = False,
+               fresh_only: bool = False) -> List[Step]:
+    """Migrate, then seed; with ``fresh_only`` seeding needs a newly created baseline."""
+    if not dry_run:
+        with migration_lock(engine):
+            return _initialize(engine, engine.begin, loaders, jobs, fresh_only)
+
+    if engine.dialect.name == "sqlite":
+        scratch = create_engine("sqlite://", poolclass=StaticPool)
+        try:
+            with engine.connect() as source, scratch.connect() as target:
+                source.connection.driver_connection.backup(target.connection.driver_connection)
+            return _initialize(scratch, scratch.begin, loaders, 1, fresh_only)
+        finally:
+            scratch.dispose()
+
+    with engine.connect() as conn:
+        outer = conn.begin()
+        try:
+            if engine.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            return _initialize(engine, lambda: nullcontext(conn), loaders, 1, fresh_only)
+        finally:
+            outer.rollback()
+
+
+def format_report(steps: List[Step], total_ms: float, dry_run: bool = False) -> str:
+    lines = [f"{'phase':<10} {'step':<28} {'rows':>10} {'ms':>10}"]
+    for step in steps:
+        rows = "" if step.rows is None else str(step.rows)
+        note = f"  ({step.note})" if step.note else ""
+        lines.append(f"{step.phase:<10} {step.name:<28} {rows:>10} {step.elapsed_ms:>10.1f}{note}")
+    suffix = "  (dry run, rolled back)" if dry_run else ""
+    lines.append(f"{'total':<10} {'':<28} {'':>10} {total_ms:>10.1f}{suffix}")
+    return "\n".join(lines)
+
+
+def init_database(engine: Optional[Engine] = None) -> List[Step]:
+    """Apply pending migrations; seed from assigm3.sql if the schema is new."""
+    if engine is None:
+        from database import make_engine
+
+        engine = make_engine()
+    started = time.perf_counter()
+    steps = initialize(engine, sql_seeds(DEFAULT_SQL_PATH), fresh_only=True)
+    if steps:
+        print(format_report(steps, _elapsed_ms(started)))
+    else:
+        print("Database schema is up to date.")
+    return steps
+
+
+def print_status(engine: Engine, as_json: bool) -> None:
+    with engine.connect() as conn:
+        applied = applied_versions(conn)
+    status = [
+        {
+            "version": migration.version,
+            "name": migration.name,
+            "applied_at": applied[migration.version].applied_at.isoformat() if migration.version in applied else None,
+        }
+        for migration in available_migrations()
+    ]
+    if as_json:
+        print(json.dumps(status, indent=2))
         return
-    
-    database_url = normalize_database_url(database_url)
-    engine = create_engine(database_url)
-    
-    # Read SQL file
-    sql_file = "assigm3.sql"
-    if not os.path.exists(sql_file):
-        print(f"SQL file {sql_file} not found, skipping initialization")
+    for entry in status:
+        print(f"{entry['version']:04d} {entry['name']:<28} {entry['applied_at'] or 'pending'}")
+
+
+def main() -> None:
+    from database import make_engine
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations and seed empty tables.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--seed-sql", default=DEFAULT_SQL_PATH, help="SQL file whose INSERT statements seed the tables")
+    source.add_argument("--seed-dir", help="directory of <table>.csv / <table>.jsonl seed files")
+    source.add_argument("--no-seed", action="store_true", help="only apply migrations")
+    parser.add_argument("--jobs", type=int, default=1, help="seed up to this many independent tables at once")
+    parser.add_argument("--dry-run", action="store_true", help="time every step, then roll back")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    engine = make_engine()
+    if args.status:
+        print_status(engine, args.json)
         return
-    
-    with open(sql_file, "r", encoding="utf-8") as f:
-        sql_content = f.read()
-    
-    # Split by semicolons and execute each statement
-    statements = [s.strip() for s in sql_content.split(";") if s.strip() and not s.strip().startswith("--")]
-    
-    try:
-        with engine.begin() as conn:
-            # Check if tables already exist
-            result = conn.execute(text("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'users'
-                );
-            """))
-            if result.scalar():
-                print("Database already initialized, skipping...")
-                return
-            
-            print("Initializing database from SQL file...")
-            for statement in statements:
-                if statement:
-                    try:
-                        conn.execute(text(statement))
-                    except Exception as e:
-                        # Ignore errors for CREATE TABLE IF NOT EXISTS, etc.
-                        if "already exists" not in str(e).lower() and "duplicate" not in str(e).lower():
-                            print(f"Warning: {e}")
-            print("Database initialized successfully!")
-    except OperationalError as e:
-        print(f"Database connection error: {e}")
-    except Exception as e:
-        print(f"Error initializing database: {e}")
 
+    started = time.perf_counter()
+    loaders: Dict[str, SeedLoader] = {}
+    steps = []
+    if not args.no_seed:
+        loaders = file_seeds(args.seed_dir) if args.seed_dir else sql_seeds(args.seed_sql)
+        steps.append(Step("parse", os.path.basename(args.seed_dir or args.seed_sql), len(loaders),
+                          _elapsed_ms(started), "tables with seed data"))
+    steps.extend(initialize(engine, loaders, jobs=max(1, args.jobs), dry_run=args.dry_run))
+    total_ms = _elapsed_ms(started)
+
+    if args.json:
+        print(json.dumps({
+            "dry_run": args.dry_run,
+            "total_ms": total_ms,
+            "steps": [step._asdict() for step in steps],
+        }, indent=2))
+    else:
+        print(format_report(steps, total_ms, args.dry_run))
 
-if __name__ == "__main__":
-    init_database()
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""Per-request SQL timing, a slow-query log and Prometheus metrics.
+
+Every statement the engine sends is timed with SQLAlchemy's cursor events.
+Inside a Flask request the query count, database time, rows reported by the
+driver and template render time are collected and returned in a
+``Server-Timing`` header, which browser dev tools show next to the request.
+
+* SLOW_QUERY_MS       - statements slower than this (default 500) are logged
+  with their parameters to the ``sql.slow`` logger. Values bound to names
+  like password, secret or token are replaced by ``<redacted>``.
+* SLOW_QUERY_LOG_PATH - also append that log to the given file.
+* SERVER_TIMING       - ``0`` to leave the header off.
+
+Streamed responses (table pages, exports) send their headers before the
+body runs its queries, so they get no ``Server-Timing`` header; their
+metrics are recorded when the body is closed.
+
+The aggregated histograms are rendered in the Prometheus text format by
+``Instrumentation.render_metrics``; they are per process, so scrape each
+gunicorn worker or run a single worker per container. Rows are only counted
+where the driver reports ``cursor.rowcount`` (psycopg2 does for a buffered
+SELECT; SQLite and server-side cursors only for writes). When a query in the
+request returned rows the driver did not count, the header says so instead
+of giving a row count.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import Flask, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MS_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+MAX_LOGGED_PARAMETER_LENGTH = 200
+SENSITIVE_PARAMETER = re.compile(r"passw|secret|token|api_?key", re.IGNORECASE)
+REDACTED = "<redacted>"
+
+slow_query_log = logging.getLogger("sql.slow")
+
+
+class Histogram:
+    """A Prometheus histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            # Per-bucket counts, then sum and count.
+            series = self._series.setdefault(labels, [0.0] * (len(self.buckets) + 2))
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[position] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def totals(self, *labels: str) -> Tuple[float, float]:
+        """The count and sum observed so far for ``labels``."""
+        with self._lock:
+            series = self._series.get(labels)
+            return (series[-1], series[-2]) if series else (0.0, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for labels, values in series:
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)]
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{_labels(pairs + [_le(f'{bound:g}')])} {count:g}")
+            lines.append(f"{self.name}_bucket{_labels(pairs + [_le('+Inf')])} {values[-1]:g}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {values[-2]:g}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {values[-1]:g}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _le(bound: str) -> str:
+    return f'le="{bound}"'
+
+
+def _labels(pairs: Iterable[str]) -> str:
+    pairs = list(pairs)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _statement_kind(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else "UNKNOWN"
+
+
+def _format_parameters(parameters: Any, executemany: bool, context: Any = None) -> str:
+    if executemany:
+        return f"<{len(parameters)} parameter sets>"
+    # The compiled parameters are keyed by bind name, which SQLAlchemy derives
+    # from the column, even where the driver itself takes a positional tuple.
+    compiled = getattr(context, "compiled_parameters", None)
+    if compiled:
+        parameters = compiled[0]
+    if isinstance(parameters, dict):
+        parameters = {
+            name: REDACTED if SENSITIVE_PARAMETER.search(str(name)) else value
+            for name, value in parameters.items()
+        }
+    text = repr(parameters)
+    if len(text) > MAX_LOGGED_PARAMETER_LENGTH:
+        text = text[:MAX_LOGGED_PARAMETER_LENGTH] + "..."
+    return text
+
+
+class Instrumentation:
+    def __init__(self, slow_query_ms: float = 500, server_timing: bool = True) -> None:
+        self.slow_query_ms = slow_query_ms
+        self.server_timing = server_timing
+        self.query_duration = Histogram(
+            "db_query_duration_ms", "Statement execution time in milliseconds.", MS_BUCKETS, ("kind",)
+        )
+        self.request_duration = Histogram(
+            "http_request_duration_ms", "Request handling time in milliseconds.", MS_BUCKETS, ("endpoint", "status")
+        )
+        self.request_db_time = Histogram(
+            "http_request_db_time_ms", "Database time per request in milliseconds.", MS_BUCKETS, ("endpoint",)
+        )
+        self.request_queries = Histogram(
+            "http_request_queries", "Statements executed per request.", COUNT_BUCKETS, ("endpoint",)
+        )
+        self.template_duration = Histogram(
+            "template_render_duration_ms", "Template render time in milliseconds.", MS_BUCKETS, ("template",)
+        )
+        self._histograms = [
+            self.query_duration,
+            self.request_duration,
+            self.request_db_time,
+            self.request_queries,
+            self.template_duration,
+        ]
+
+    def install(self, app: Flask, engine: Engine) -> None:
+        self.instrument_engine(engine)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    # SQLAlchemy events
+
+    def instrument_engine(self, engine: Engine) -> None:
+        """Time statements on ``engine``; install() does this for the primary."""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        self.query_duration.observe(elapsed_ms, _statement_kind(statement))
+        if has_request_context() and "sql_queries" in g:
+            g.sql_queries += 1
+            g.sql_time_ms += elapsed_ms
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                g.sql_rows += cursor.rowcount
+            elif cursor.description is not None:
+                g.sql_rows_unknown = True
+        if elapsed_ms >= self.slow_query_ms:
+            where = f" [{request.method} {request.path}]" if has_request_context() else ""
+            slow_query_log.warning(
+                "%.1f ms%s: %s -- parameters: %s",
+                elapsed_ms,
+                where,
+                " ".join(statement.split()),
+                _format_parameters(parameters, executemany, context),
+            )
+
+    def _handle_error(self, context) -> None:
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    # Flask hooks
+
+    def _before_render(self, sender, template, context, **extra) -> None:
+        if has_request_context():
+            g.setdefault("render_starts", []).append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra) -> None:
+        if not has_request_context() or not g.get("render_starts"):
+            return
+        elapsed_ms = (time.perf_counter() - g.render_starts.pop()) * 1000
+        g.render_time_ms += elapsed_ms
+        self.template_duration.observe(elapsed_ms, template.name or "<string>")
+
+    def _before_request(self) -> None:
+        g.request_start = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_time_ms = 0.0
+        g.sql_rows = 0
+        g.sql_rows_unknown = False
+        g.render_time_ms = 0.0
+
+    def _after_request(self, response):
+        if "request_start" not in g:
+            return response
+        endpoint = request.endpoint or "<unmatched>"
+        if response.is_streamed:
+            # The body (the page query, the template) has not run yet. Record
+            # the request once it is closed; its headers are already gone.
+            state = g._get_current_object()
+            response.call_on_close(lambda: self._record(state, endpoint, response.status_code))
+            return response
+        total_ms = self._record(g, endpoint, response.status_code)
+        if self.server_timing:
+            rows = "rows not reported by the driver" if g.sql_rows_unknown else f"{g.sql_rows} rows"
+            response.headers["Server-Timing"] = ", ".join([
+                f'db;dur={g.sql_time_ms:.2f};desc="{g.sql_queries} queries, {rows}"',
+                f"render;dur={g.render_time_ms:.2f}",
+                f"total;dur={total_ms:.2f}",
+            ])
+        return response
+
+    def _record(self, state, endpoint: str, status_code: int) -> float:
+        total_ms = (time.perf_counter() - state.request_start) * 1000
+        self.request_duration.observe(total_ms, endpoint, str(status_code))
+        self.request_db_time.observe(state.sql_time_ms, endpoint)
+        self.request_queries.observe(state.sql_queries, endpoint)
+        return total_ms
+
+    # Exposition
+
+    def render_metrics(self, pool: Optional[Dict[str, Any]] = None,
+                       replicas: Optional[List[Dict[str, Any]]] = None,
+                       row_cache: Optional[Dict[str, Any]] = None) -> str:
+        lines: List[str] = []
+        for histogram in self._histograms:
+            lines.extend(histogram.render())
+        if pool:
+            lines.extend(_pool_metrics(pool))
+        if replicas:
+            lines.extend(_replica_metrics(replicas))
+        if row_cache and row_cache.get("backend") != "off":
+            lines.extend(_row_cache_metrics(row_cache))
+        return "\n".join(lines) + "\n"
+
+
+def _pool_metrics(pool: Dict[str, Any]) -> List[str]:
+    lines = []
+    for key in ("size", "checked_in", "checked_out", "overflow"):
+        if key in pool:
+            lines += [f"# TYPE db_pool_{key} gauge", f"db_pool_{key} {pool[key]}"]
+    if "timeouts" in pool:
+        lines += ["# TYPE db_pool_checkout_timeouts_total counter", f"db_pool_checkout_timeouts_total {pool['timeouts']}"]
+    if "wait_buckets_ms" in pool:
+        # PoolStats buckets are already cumulative.
+        name = "db_pool_checkout_wait_ms"
+        lines += [f"# HELP {name} Time spent waiting for a pooled connection.", f"# TYPE {name} histogram"]
+        for bound, count in pool["wait_buckets_ms"].items():
+            lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {pool["checkouts"]}')
+        lines.append(f"{name}_sum {pool['total_wait_ms']}")
+        lines.append(f"{name}_count {pool['checkouts']}")
+    return lines
+
+
+def _replica_metrics(replicas: List[Dict[str, Any]]) -> List[str]:
+    lines = ["# TYPE db_replica_usable gauge"]
+    for replica in replicas:
+        lines.append(f'db_replica_usable{{replica="{_escape(replica["replica"])}"}} {int(replica["usable"])}')
+    lines.append("# TYPE db_replica_lag_seconds gauge")
+    for replica in replicas:
+        if replica["lag_seconds"] is not None:
+            lines.append(f'db_replica_lag_seconds{{replica="{_escape(replica["replica"])}"}} {replica["lag_seconds"]}')
+    return lines
+
+
+def _row_cache_metrics(row_cache: Dict[str, Any]) -> List[str]:
+    lines = []
+    for key in ("hits", "misses", "errors", "evictions"):
+        if key in row_cache:
+            lines += [f"# TYPE db_row_cache_{key}_total counter", f"db_row_cache_{key}_total {row_cache[key]}"]
+    for key in ("entries", "bytes"):
+        if key in row_cache:
+            lines += [f"# TYPE db_row_cache_{key} gauge", f"db_row_cache_{key} {row_cache[key]}"]
+    return lines
+
+
+def instrumentation_from_env() -> Instrumentation:
+    log_path = os.getenv("SLOW_QUERY_LOG_PATH")
+    if log_path and not slow_query_log.handlers:
+        handler = logging.FileHandler(log_path)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_query_log.addHandler(handler)
+    return Instrumentation(
+        slow_query_ms=float(os.getenv("SLOW_QUERY_MS", "500")),
+        server_timing=os.getenv("SERVER_TIMING", "1").lower() not in {"0", "false", "no", "off"},
+    )
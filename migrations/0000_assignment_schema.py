@@ -0,0 +1,29 @@
+"""Baseline: the CREATE TABLE statements of assigm3.sql.
+
+The INSERT statements in the same file are seed data, which init_db.py
+loads after the migrations have run. On SQLite the statements go through
+sql_script.translate() first.
+"""
+import os
+from typing import List
+
+from sqlalchemy.engine import Connection
+
+from sql_script import if_not_exists, insert_target, split_statements, translate
+
+SQL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assigm3.sql")
+
+
+def statements(conn: Connection, concurrently: bool = False) -> List[str]:
+    with open(SQL_PATH, "r", encoding="utf-8") as handle:
+        script = handle.read()
+    return [
+        translate(if_not_exists(statement), conn.dialect.name)
+        for statement in split_statements(script)
+        if insert_target(statement) is None
+    ]
+
+
+def upgrade(conn: Connection) -> None:
+    for statement in statements(conn):
+        conn.exec_driver_sql(statement, execution_options={"no_parameters": True})
@@ -0,0 +1,38 @@
+"""Indexes for the filters and joins used by the alchemy.part2.py reports.
+
+assigm3.sql only creates primary keys, and PostgreSQL does not index the
+referencing side of a foreign key, so every report join and filter was a
+sequential scan.
+"""
+
+from migrations.index_specs import IndexSpec, index_migration
+
+INDEXES = [
+    # 5.1, 6.2-6.4, 7 and the report refresh: confirmed appointments per caregiver.
+    IndexSpec(
+        "ix_appointment_confirmed_caregiver",
+        "appointment",
+        "(caregiver_user_id, work_hours) WHERE status = 'confirmed'",
+    ),
+    IndexSpec("ix_appointment_caregiver_user_id", "appointment", "(caregiver_user_id)"),
+    IndexSpec("ix_appointment_member_user_id", "appointment", "(member_user_id)"),
+    IndexSpec("ix_job_member_user_id", "job", "(member_user_id)"),
+    IndexSpec("ix_job_required_caregiving_type", "job", "(required_caregiving_type)"),
+    # The primary key (caregiver_user_id, job_id) cannot serve lookups by job.
+    IndexSpec("ix_job_application_job_id", "job_application", "(job_id)"),
+    IndexSpec("ix_caregiver_caregiving_type", "caregiver", "(caregiving_type)"),
+    IndexSpec("ix_users_given_name_surname", "users", "(given_name, surname)"),
+    IndexSpec("ix_address_street", "address", "(street)"),
+    IndexSpec("ix_address_town", "address", "(town)"),
+    # 5.2: lower(other_requirements) LIKE '%soft-spoken%' needs trigrams.
+    IndexSpec(
+        "ix_job_other_requirements_trgm",
+        "job",
+        "USING gin (lower(other_requirements) gin_trgm_ops)",
+        ("postgresql",),
+    ),
+]
+
+EXTENSIONS = {"postgresql": ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]}
+
+statements, upgrade = index_migration(INDEXES, EXTENSIONS)
@@ -0,0 +1,46 @@
+"""GIN indexes for the table browser's full-text search (``?q=``).
+
+Each index covers the same ``to_tsvector`` expression that
+filters.search_clause() matches against, so PostgreSQL can answer a search
+without reading the whole table. Other databases fall back to LIKE, which
+no ordinary index can serve, so nothing is created for them. Indexes left
+INVALID by a failed concurrent build are dropped first (see index_specs).
+"""
+from typing import List
+
+from sqlalchemy import Index, MetaData, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateIndex
+
+from filters import search_vector, text_columns
+from migrations.index_specs import drop_statements
+from schema_cache import INTERNAL_TABLE_PREFIX
+
+
+def indexes(conn: Connection) -> List[Index]:
+    metadata = MetaData()
+    metadata.reflect(bind=conn, only=lambda name, _: not name.startswith(INTERNAL_TABLE_PREFIX))
+    return [
+        Index(f"ix_{table.name}_search", search_vector(table), postgresql_using="gin")
+        for table in metadata.sorted_tables
+        if text_columns(table)
+    ]
+
+
+def statements(conn: Connection, concurrently: bool = False) -> List[str]:
+    if conn.dialect.name != "postgresql":
+        return []
+    search_indexes = indexes(conn)
+    ddl = drop_statements(conn, [index.name for index in search_indexes], concurrently)
+    for index in search_indexes:
+        index.dialect_options["postgresql"]["concurrently"] = concurrently
+        compiled = CreateIndex(index, if_not_exists=True).compile(
+            dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+        )
+        ddl.append(str(compiled))
+    return ddl
+
+
+def upgrade(conn: Connection) -> None:
+    for statement in statements(conn):
+        conn.execute(text(statement))
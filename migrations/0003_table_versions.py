@@ -0,0 +1,51 @@
+"""Change counters per table (see table_versions.py).
+
+Creates ``app_table_versions`` everywhere. On PostgreSQL every user table
+also gets a statement-level trigger that bumps its counter and sends a
+NOTIFY, so writes from any client are counted. One counter row per table
+means concurrent writers to the same table queue on that row until commit.
+"""
+from typing import List
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateTable
+
+from schema_cache import INTERNAL_TABLE_PREFIX
+from table_versions import CHANNEL, VERSIONS_TABLE, table_versions
+
+BUMP_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION app_bump_table_version() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    new_version bigint;
+BEGIN
+    INSERT INTO {VERSIONS_TABLE} (table_name, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = {VERSIONS_TABLE}.version + 1
+    RETURNING version INTO new_version;
+    PERFORM pg_notify('{CHANNEL}', TG_TABLE_NAME || ':' || new_version);
+    RETURN NULL;
+END
+$$
+"""
+
+
+def statements(conn: Connection, concurrently: bool = False) -> List[str]:
+    ddl = [str(CreateTable(table_versions, if_not_exists=True).compile(dialect=conn.dialect)).strip()]
+    if conn.dialect.name != "postgresql":
+        return ddl
+    ddl.append(BUMP_FUNCTION.strip())
+    for name in sorted(inspect(conn).get_table_names()):
+        if name.startswith(INTERNAL_TABLE_PREFIX):
+            continue
+        quoted = conn.dialect.identifier_preparer.quote(name)
+        ddl.append(f"DROP TRIGGER IF EXISTS app_table_version ON {quoted}")
+        ddl.append(
+            f"CREATE TRIGGER app_table_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {quoted} "
+            "FOR EACH STATEMENT EXECUTE FUNCTION app_bump_table_version()"
+        )
+    return ddl
+
+
+def upgrade(conn: Connection) -> None:
+    for statement in statements(conn):
+        conn.exec_driver_sql(statement, execution_options={"no_parameters": True})
@@ -0,0 +1,20 @@
+"""Prefix indexes for the foreign key autocomplete (see fk_lookup.py).
+
+Lookups match given_name and surname by case-insensitive prefix. On
+PostgreSQL that is ``lower(col) LIKE 'prefix%'``, which only a
+``text_pattern_ops`` index serves under a non-C collation. SQLite compares
+a range under NOCASE, served by a NOCASE column index (expression indexes
+would work too, but SQLAlchemy warns on every reflection of them). Keys
+are matched on primary keys, which are already indexed.
+"""
+
+from migrations.index_specs import IndexSpec, index_migration
+
+INDEXES = [
+    IndexSpec("ix_users_given_name_prefix", "users", "(lower(given_name) text_pattern_ops)", ("postgresql",)),
+    IndexSpec("ix_users_surname_prefix", "users", "(lower(surname) text_pattern_ops)", ("postgresql",)),
+    IndexSpec("ix_users_given_name_prefix", "users", "(given_name COLLATE NOCASE)", ("sqlite",)),
+    IndexSpec("ix_users_surname_prefix", "users", "(surname COLLATE NOCASE)", ("sqlite",)),
+]
+
+statements, upgrade = index_migration(INDEXES)
@@ -0,0 +1,38 @@
+"""Schema migrations, one module per version.
+
+Each ``NNNN_description.py`` module defines ``upgrade(conn)``, which must
+be safe to run against a database that already has the change (``IF NOT
+EXISTS`` and friends), and ``statements(conn, concurrently=False)``
+returning the DDL it runs; migrations that only create indexes get both
+from index_specs.index_migration(). init_db.py records applied versions in
+``app_schema_migrations``.
+"""
+import importlib.util
+import os
+import re
+from types import ModuleType
+from typing import List, NamedTuple
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: str
+
+    def load(self) -> ModuleType:
+        spec = importlib.util.spec_from_file_location(f"migrations.m{self.version:04d}", self.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+
+def available_migrations() -> List[Migration]:
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
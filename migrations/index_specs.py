@@ -0,0 +1,67 @@
+"""Shared parts of the migrations that only create plain indexes.
+
+Such a migration declares its ``INDEXES`` (and any extensions they need)
+and takes ``statements`` and ``upgrade`` from index_migration().
+
+A ``CREATE INDEX CONCURRENTLY`` that fails (deadlock, cancel, unique
+violation) leaves an INVALID index behind, which ``IF NOT EXISTS`` would
+then skip for good. On PostgreSQL the statements therefore drop such
+leftovers first, so rerunning the migration builds them again.
+"""
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection
+
+
+class IndexSpec(NamedTuple):
+    name: str
+    table: str
+    definition: str
+    dialects: Tuple[str, ...] = ("postgresql", "sqlite")
+
+
+INVALID_INDEXES = text(
+    "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid"
+    " WHERE NOT i.indisvalid AND c.relname IN :names AND pg_table_is_visible(c.oid)"
+).bindparams(bindparam("names", expanding=True))
+
+
+def invalid_indexes(conn: Connection, names: Iterable[str]) -> Set[str]:
+    """Which of ``names`` are INVALID leftovers of a failed concurrent build (PostgreSQL)."""
+    names = sorted(set(names))
+    if conn.dialect.name != "postgresql" or not names:
+        return set()
+    return set(conn.execute(INVALID_INDEXES, {"names": names}).scalars())
+
+
+def drop_statements(conn: Connection, names: Iterable[str], concurrently: bool = False) -> List[str]:
+    """``DROP INDEX`` for the INVALID ones among ``names``."""
+    keyword = " CONCURRENTLY" if concurrently else ""
+    return [f"DROP INDEX{keyword} IF EXISTS {name}" for name in sorted(invalid_indexes(conn, names))]
+
+
+def index_statements(conn: Connection, indexes: Sequence[IndexSpec], concurrently: bool = False,
+                     extensions: Optional[Dict[str, List[str]]] = None) -> List[str]:
+    """DDL for the connection's dialect; CONCURRENTLY only applies to PostgreSQL."""
+    dialect_name = conn.dialect.name
+    indexes = [index for index in indexes if dialect_name in index.dialects]
+    ddl = list((extensions or {}).get(dialect_name, []))
+    ddl.extend(drop_statements(conn, [index.name for index in indexes], concurrently))
+    keyword = " CONCURRENTLY" if concurrently and dialect_name == "postgresql" else ""
+    for index in indexes:
+        ddl.append(f"CREATE INDEX{keyword} IF NOT EXISTS {index.name} ON {index.table} {index.definition}")
+    return ddl
+
+
+def index_migration(indexes: Sequence[IndexSpec], extensions: Optional[Dict[str, List[str]]] = None
+                    ) -> Tuple[Callable[..., List[str]], Callable[[Connection], None]]:
+    """The ``statements`` and ``upgrade`` functions of a migration creating ``indexes``."""
+    def statements(conn: Connection, concurrently: bool = False) -> List[str]:
+        return index_statements(conn, indexes, concurrently, extensions)
+
+    def upgrade(conn: Connection) -> None:
+        for statement in statements(conn):
+            conn.execute(text(statement))
+
+    return statements, upgrade
@@ -0,0 +1,192 @@
+"""Keyset pagination over a table's primary key and optional sort column."""
+import base64
+import binascii
+import json
+import os
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import Table, and_, or_, select, tuple_
+from sqlalchemy.engine import Connection, Row
+
+DEFAULT_PAGE_SIZE = int(os.getenv("TABLE_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("TABLE_MAX_PAGE_SIZE", "500"))
+# Rows per server-side fetch when streaming, so large pages start rendering early.
+STREAM_BATCH_ROWS = 1000
+
+
+class Page(NamedTuple):
+    rows: List[Row]
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+
+def clamp_page_size(value: Optional[str]) -> int:
+    """Parse a requested page size, falling back to the configured default."""
+    try:
+        size = int(value) if value else DEFAULT_PAGE_SIZE
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Pack primary key values into an opaque, URL-safe token."""
+    raw = json.dumps([None if value is None else str(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> List[Optional[str]]:
+    """Unpack a token made by encode_cursor into its raw string values."""
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error):
+        raise ValueError(f"Malformed cursor '{token}'")
+    if not isinstance(values, list):
+        raise ValueError(f"Malformed cursor '{token}'")
+    return values
+
+
+def _key_of(row: Row, key_columns: Sequence[Any]) -> str:
+    mapping = row._mapping
+    return encode_cursor([mapping[column.name] for column in key_columns])
+
+
+def page_key_columns(table: Table, sort_column: Optional[Any] = None) -> List[Any]:
+    """Columns a cursor holds: the sort column (if any) then the primary key."""
+    pk_columns = list(table.primary_key.columns)
+    if sort_column is None or not pk_columns:
+        return pk_columns
+    return [sort_column] + [column for column in pk_columns if column is not sort_column]
+
+
+def keyset_after(key_columns: Sequence[Any], values: Sequence[Any], descending: bool = False,
+                 backward: bool = False):
+    """Build the WHERE clause selecting rows strictly after a key in page order.
+
+    With ``backward`` it selects the rows strictly before the key instead.
+    A nullable leading column sorts its NULLs after every value, which row
+    value comparison cannot express, so that case is spelled out.
+    """
+    greater = descending == backward
+
+    def beyond(columns: Sequence[Any], bounds: Sequence[Any]):
+        if len(columns) == 1:
+            return columns[0] > bounds[0] if greater else columns[0] < bounds[0]
+        key, bound = tuple_(*columns), tuple_(*bounds)
+        return key > bound if greater else key < bound
+
+    lead, value = key_columns[0], values[0]
+    if not lead.nullable or len(key_columns) == 1:
+        return beyond(key_columns, values)
+    tail = beyond(key_columns[1:], values[1:])
+    if value is None:
+        if backward:
+            return or_(lead.is_not(None), and_(lead.is_(None), tail))
+        return and_(lead.is_(None), tail)
+    clause = or_(beyond([lead], [value]), and_(lead == value, tail))
+    return clause if backward else or_(clause, lead.is_(None))
+
+
+def _ordering(key_columns: Sequence[Any], descending: bool, backward: bool) -> List[Any]:
+    ordering = []
+    for column in key_columns:
+        term = column.desc() if descending != backward else column.asc()
+        if column.nullable:
+            term = term.nulls_first() if backward else term.nulls_last()
+        ordering.append(term)
+    return ordering
+
+
+class StreamedPage:
+    """Rows of one page, read from the cursor while they are being consumed.
+
+    ``next_cursor`` and ``prev_cursor`` are only final once the rows have been
+    iterated, so a template must render its pager after the rows. Backward
+    pages are fetched in reverse order and buffered to be flipped back.
+    """
+
+    def __init__(self, conn: Connection, table: Table, page_size: int, after: Optional[Sequence[Any]] = None,
+                 before: Optional[Sequence[Any]] = None, where: Sequence[Any] = (),
+                 sort_column: Optional[Any] = None, descending: bool = False) -> None:
+        self.page_size = page_size
+        self.next_cursor: Optional[str] = None
+        self.prev_cursor: Optional[str] = None
+        self._key_columns = page_key_columns(table, sort_column)
+        self._after = after
+        self._backward = before is not None
+
+        stmt = select(table).where(*where)
+        if self._key_columns:
+            if self._backward:
+                stmt = stmt.where(keyset_after(self._key_columns, before, descending, backward=True))
+            elif after is not None:
+                stmt = stmt.where(keyset_after(self._key_columns, after, descending))
+            stmt = stmt.order_by(*_ordering(self._key_columns, descending, self._backward))
+            # One extra row tells whether there is a page beyond this one.
+            stmt = stmt.limit(page_size + 1)
+        else:
+            stmt = stmt.limit(page_size)
+        batch = min(page_size + 1, STREAM_BATCH_ROWS)
+        self._result = conn.execution_options(yield_per=batch).execute(stmt)
+
+    def __iter__(self) -> Iterator[Row]:
+        if not self._key_columns:
+            yield from self._result
+            return
+        if self._backward:
+            rows = self._result.fetchmany(self.page_size + 1)
+            has_more = len(rows) > self.page_size
+            rows = rows[:self.page_size][::-1]
+            if rows:
+                self.next_cursor = _key_of(rows[-1], self._key_columns)
+                self.prev_cursor = _key_of(rows[0], self._key_columns) if has_more else None
+            yield from rows
+            return
+
+        last = None
+        for position, row in enumerate(self._result):
+            if position == self.page_size:
+                self.next_cursor = _key_of(last, self._key_columns)
+                break
+            if position == 0 and self._after is not None:
+                self.prev_cursor = _key_of(row, self._key_columns)
+            last = row
+            yield row
+        self._result.close()
+
+
+def fetch_page(
+    conn: Connection,
+    table: Table,
+    page_size: int,
+    after: Optional[Sequence[Any]] = None,
+    before: Optional[Sequence[Any]] = None,
+    where: Sequence[Any] = (),
+    sort_column: Optional[Any] = None,
+    descending: bool = False,
+) -> Page:
+    """Fetch one page of ``table`` matching ``where``.
+
+    Rows are ordered by ``sort_column`` (if given) and then the primary key;
+    ``after``/``before`` are coerced values of page_key_columns() taken from
+    a cursor. Rows are read through a server-side cursor, so memory use is
+    bounded by ``page_size`` regardless of the table size.
+    """
+    page = StreamedPage(conn, table, page_size, after, before, where, sort_column, descending)
+    rows = list(page)
+    return Page(rows=rows, next_cursor=page.next_cursor, prev_cursor=page.prev_cursor)
+
+
+def buffered(chunks: Iterable[str], size: int = 16384) -> Iterator[str]:
+    """Join small streamed template chunks into writes of about ``size`` bytes."""
+    pending: List[str] = []
+    length = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(pending)
+            pending, length = [], 0
+    if pending:
+        yield "".join(pending)
@@ -0,0 +1,111 @@
+"""Column-aware coercion of submitted record values.
+
+Shared by the web routes in app.py and asgi_app.py and the command-line
+tools, which all receive values as strings (form fields, CSV cells) and
+need them in the column's Python type before they reach the database.
+"""
+import datetime
+from typing import Any, Callable, Dict, List, Mapping, Sequence
+from urllib.parse import quote
+
+from flask import abort
+from sqlalchemy import Table
+
+from pagination import decode_cursor, encode_cursor
+
+
+def python_type_for(column) -> Any:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return str
+
+
+TRUE_STRINGS = {"1", "true", "yes", "on"}
+
+
+def converter_for(python_type: Any) -> Callable[[str], Any]:
+    """The function turning a non-empty submitted string into ``python_type``."""
+    if python_type is bool:
+        return lambda value: value.lower() in TRUE_STRINGS
+    if python_type in (datetime.date, datetime.datetime, datetime.time):
+        return python_type.fromisoformat
+    return python_type
+
+
+def coerce_value(column, value: str) -> Any:
+    if value == "":
+        return None
+    return converter_for(python_type_for(column))(value)
+
+
+def build_payload(table: Table, form_data: Mapping[str, str]) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {}
+    for column in table.columns:
+        python_type = python_type_for(column)
+        if column.name not in form_data:
+            if python_type is bool:
+                payload[column.name] = False
+            continue
+        raw_value = form_data.get(column.name, "")
+        if raw_value == "" and column.autoincrement:
+            continue
+        payload[column.name] = coerce_value(column, raw_value)
+    return payload
+
+
+def build_pk_filters(table: Table, source: Mapping[str, str]) -> List[Any]:
+    filters = []
+    for column in table.primary_key.columns:
+        if column.name not in source:
+            abort(400, description=f"Missing primary key field '{column.name}'")
+        filters.append(column == coerce_value(column, source[column.name]))
+    return filters
+
+
+def cursor_values_or_400(key_columns: List[Any], token: str) -> List[Any]:
+    """Decode a pagination cursor into values coerced for ``key_columns``."""
+    try:
+        raw_values = decode_cursor(token)
+        if len(raw_values) != len(key_columns):
+            raise ValueError("Cursor does not match the current sort order")
+        return [
+            None if value is None else coerce_value(column, value)
+            for column, value in zip(key_columns, raw_values)
+        ]
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    except (TypeError, ArithmeticError):
+        # A tampered cursor: a value of the wrong type, or not a number for a Numeric key.
+        abort(400, description=f"Malformed cursor '{token}'")
+
+
+def inserted_pk_filters(table: Table, inserted_primary_key) -> List[Any]:
+    pk_columns = list(table.primary_key.columns)
+    if inserted_primary_key is None or any(value is None for value in inserted_primary_key):
+        return []
+    return [column == value for column, value in zip(pk_columns, inserted_primary_key)]
+
+
+class RowLinks:
+    """Edit links, delete-form keys and batch selection tokens for tuple rows of ``select(table)``.
+
+    The edit URL is built once per page with ``url_for`` and completed per
+    row with the quoted primary key values, which is much cheaper than a
+    ``url_for`` call for every row.
+    """
+
+    def __init__(self, table: Table, url_for: Callable[..., str]) -> None:
+        names = [column.name for column in table.columns]
+        self.pk_fields = [(column.name, names.index(column.name)) for column in table.primary_key.columns]
+        self._base = url_for("edit_record", table_name=table.name)
+        self._query = [(quote(name, safe=""), index) for name, index in self.pk_fields]
+
+    def edit_url(self, row: Sequence[Any]) -> str:
+        if not self._query:
+            return self._base
+        return self._base + "?" + "&".join(f"{name}={quote(str(row[index]), safe='')}" for name, index in self._query)
+
+    def key_token(self, row: Sequence[Any]) -> str:
+        """The row's primary key in the pagination cursor format."""
+        return encode_cursor([row[index] for _, index in self.pk_fields])
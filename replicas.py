@@ -0,0 +1,151 @@
+"""Read-replica routing for the read-only routes.
+
+Configured from the environment:
+
+* DATABASE_REPLICA_URLS   - comma-separated replica URLs. Unset or empty
+  sends every query to the primary.
+* REPLICA_MAX_LAG_SECONDS - replicas further behind the primary than this
+  (default 5) are not read from.
+* REPLICA_CHECK_INTERVAL  - seconds between health and lag checks of a
+  replica (default 5).
+* REPLICA_STICKY_SECONDS  - how long after a write the writer's session
+  keeps reading from the primary (default 10), so the page they are
+  redirected to shows their change.
+
+Reads rotate over the replicas that passed their last check. A check runs
+on the request that finds a replica's result stale; the other threads keep
+using the previous result meanwhile. A replica that fails a check, lags too
+far or drops a connection is skipped until a later check passes, and with
+no usable replica reads go to the primary. Replica engines come from
+make_engine and share its DB_POOL_* settings.
+"""
+import itertools
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from flask import session
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+PRIMARY_UNTIL = "primary_until"
+
+# pg_last_xact_replay_timestamp() stops advancing while the primary is
+# idle, so a replica that has replayed everything it received reports 0.
+POSTGRES_LAG = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+class Replica:
+    def __init__(self, engine: Engine) -> None:
+        self.engine = engine
+        self.name = engine.url.render_as_string(hide_password=True)
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.checked_at = float("-inf")
+        self._lock = threading.Lock()
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def _handle_error(self, context) -> None:
+        if context.is_disconnect:
+            self.healthy = False
+            self.error = str(context.original_exception).strip()
+            self.checked_at = time.monotonic()
+
+    def check(self) -> None:
+        try:
+            with self.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    lag = conn.execute(POSTGRES_LAG).scalar()
+                else:
+                    lag = conn.execute(text("SELECT 0")).scalar()
+            self.lag_seconds = float(lag or 0)
+            self.healthy = True
+            self.error = None
+        except SQLAlchemyError as exc:
+            self.healthy = False
+            self.lag_seconds = None
+            self.error = str(getattr(exc, "orig", exc)).strip()
+        self.checked_at = time.monotonic()
+
+    def refresh(self, interval: float) -> None:
+        if time.monotonic() - self.checked_at < interval or not self._lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self.checked_at >= interval:
+                self.check()
+        finally:
+            self._lock.release()
+
+
+class ReplicaRouter:
+    def __init__(self, primary: Engine, replicas: List[Replica], max_lag_seconds: float = 5.0,
+                 check_interval: float = 5.0, sticky_seconds: float = 10.0) -> None:
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self._turn = itertools.count()
+
+    def usable(self) -> List[Replica]:
+        for replica in self.replicas:
+            replica.refresh(self.check_interval)
+        return [
+            replica
+            for replica in self.replicas
+            if replica.healthy and replica.lag_seconds is not None and replica.lag_seconds <= self.max_lag_seconds
+        ]
+
+    def reader(self, primary_until: Optional[float] = None) -> Engine:
+        if not self.replicas or (primary_until is not None and primary_until > time.time()):
+            return self.primary
+        usable = self.usable()
+        if not usable:
+            return self.primary
+        return usable[next(self._turn) % len(usable)].engine
+
+    def for_read(self) -> Engine:
+        """The engine for a read-only request, honouring the session's stickiness."""
+        return self.reader(session.get(PRIMARY_UNTIL))
+
+    def wrote(self) -> None:
+        """Keep the current session on the primary for the next few seconds."""
+        if self.replicas:
+            session[PRIMARY_UNTIL] = time.time() + self.sticky_seconds
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "replica": replica.name,
+                "healthy": replica.healthy,
+                "lag_seconds": replica.lag_seconds,
+                "usable": replica.healthy and replica.lag_seconds is not None
+                and replica.lag_seconds <= self.max_lag_seconds,
+                "error": replica.error,
+            }
+            for replica in self.replicas
+        ]
+
+
+def router_from_env(primary: Engine) -> ReplicaRouter:
+    from database import make_engine
+
+    urls = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+    return ReplicaRouter(
+        primary,
+        [Replica(make_engine(url)) for url in urls],
+        max_lag_seconds=float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5")),
+        check_interval=float(os.getenv("REPLICA_CHECK_INTERVAL", "5")),
+        sticky_seconds=float(os.getenv("REPLICA_STICKY_SECONDS", "10")),
+    )
@@ -0,0 +1,338 @@
+"""Run the alchemy.part2.py assignment scenarios and report timings.
+
+The queries (5.x, 6.x and 7) come from reporting.source_queries. They are
+independent and read-only, so they run in parallel on a thread pool, each
+on its own connection at REPEATABLE READ (SERIALIZABLE on SQLite, which
+has no weaker snapshot level). The
+mutations (3.x, 4.x and the view in 8) run in order on one connection.
+Each runs in a savepoint together with the query that shows its effect, so
+a failing step is rolled back alone and the next one still runs. The
+transaction around them is rolled back at the end unless ``--commit`` is
+given. The queries see the committed database, not the mutations'
+uncommitted changes.
+
+    python report_runner.py                  # everything, JSON on stdout
+    python report_runner.py --format csv     # one summary line per scenario
+    python report_runner.py --only 6.2,6.4 --jobs 2
+    python report_runner.py --no-mutations --no-rows -o report.json
+
+The database comes from DATABASE_URL through configured_database_url(), as
+in app.py; ``--database-url`` overrides it and is normalized the same way.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+from sqlalchemy import MetaData, Table, case, delete, event, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from aggregate import json_value
+from reporting import source_queries
+
+SCENARIO_TABLES = ("users", "caregiver", "member", "address", "job", "job_application", "appointment")
+DEFAULT_JOBS = int(os.getenv("REPORT_JOBS", "8"))
+FORMATS = ("json", "csv", "text")
+SUMMARY_FIELDS = ("id", "kind", "title", "row_count", "rows_affected", "elapsed_ms", "error")
+
+Tables = Mapping[str, Table]
+
+
+class Scenario(NamedTuple):
+    id: str
+    title: str
+    kind: str
+    # query: tables -> statement; mutation: (tables, dialect name) -> statements
+    build: Callable[..., Any]
+    # Mutations only: the query showing the change.
+    check: Optional[Callable[[Tables], Any]] = None
+
+
+class Outcome(NamedTuple):
+    id: str
+    title: str
+    kind: str
+    columns: List[str]
+    rows: List[List[Any]]
+    rows_affected: Optional[int]
+    elapsed_ms: float
+    error: Optional[str]
+
+    def as_dict(self, include_rows: bool = True) -> Dict[str, Any]:
+        result = {
+            "id": self.id,
+            "title": self.title,
+            "kind": self.kind,
+            "row_count": len(self.rows),
+            "rows_affected": self.rows_affected,
+            "elapsed_ms": self.elapsed_ms,
+            "error": self.error,
+        }
+        if include_rows:
+            result["columns"] = self.columns
+            result["rows"] = self.rows
+        return result
+
+
+# -- mutations (3.x, 4.x, 8) ------------------------------------------------
+
+def _arman_phone(t: Tables, dialect_name: str):
+    users = t["users"]
+    return [
+        update(users)
+        .where(users.c.given_name == "Arman", users.c.surname == "Nurgaliyev")
+        .values(phone_number="+77773414141")
+    ]
+
+
+def _commission(t: Tables, dialect_name: str):
+    caregiver = t["caregiver"]
+    return [
+        update(caregiver).values(
+            hourly_rate=case(
+                (caregiver.c.hourly_rate < 10, caregiver.c.hourly_rate + 0.3),
+                else_=caregiver.c.hourly_rate * 1.10,
+            )
+        )
+    ]
+
+
+def _amina_jobs(t: Tables, dialect_name: str):
+    users, job = t["users"], t["job"]
+    amina = select(users.c.user_id).where(users.c.given_name == "Amina", users.c.surname == "Akhmetova")
+    return [delete(job).where(job.c.member_user_id == amina.scalar_subquery())]
+
+
+def _kabanbay_members(t: Tables, dialect_name: str):
+    address, member = t["address"], t["member"]
+    on_street = select(address.c.member_user_id).where(address.c.street == "Kabanbay Batyr")
+    return [delete(member).where(member.c.member_user_id.in_(on_street))]
+
+
+VIEW_BODY = """
+    SELECT ja.job_id, ja.caregiver_user_id, u.given_name, u.surname,
+           j.required_caregiving_type, j.other_requirements, ja.date_applied
+    FROM job_application ja
+    JOIN users u ON ja.caregiver_user_id = u.user_id
+    JOIN job j ON ja.job_id = j.job_id
+"""
+
+
+def _applications_view(t: Tables, dialect_name: str):
+    if dialect_name == "postgresql":
+        return [text(f"CREATE OR REPLACE VIEW view_job_applications AS {VIEW_BODY}")]
+    return [
+        text("DROP VIEW IF EXISTS view_job_applications"),
+        text(f"CREATE VIEW view_job_applications AS {VIEW_BODY}"),
+    ]
+
+
+MUTATIONS = [
+    Scenario(
+        "3.1", "Update phone number of Arman Nurgaliyev", "mutation", _arman_phone,
+        lambda t: select(t["users"]).where(t["users"].c.given_name == "Arman", t["users"].c.surname == "Nurgaliyev"),
+    ),
+    Scenario("3.2", "Add commission to caregiver hourly rates", "mutation", _commission,
+             lambda t: select(t["caregiver"])),
+    Scenario("4.1", "Delete jobs posted by Amina Akhmetova", "mutation", _amina_jobs, lambda t: select(t["job"])),
+    Scenario("4.2", "Delete members living on Kabanbay Batyr", "mutation", _kabanbay_members,
+             lambda t: select(t["member"])),
+    Scenario("8", "Create view_job_applications", "mutation", _applications_view,
+             lambda t: text("SELECT * FROM view_job_applications")),
+]
+
+
+def reflect_tables(engine: Engine) -> Tables:
+    metadata = MetaData()
+    metadata.reflect(bind=engine, only=list(SCENARIO_TABLES))
+    return metadata.tables
+
+
+def scenarios_for(tables: Tables) -> List[Scenario]:
+    """The mutations, then the queries (5.x, 6.x, 7) of reporting.source_queries."""
+    queries = [
+        Scenario(number, title, "query", lambda t, statement=statement: statement)
+        for number, (title, statement) in source_queries(tables.get).items()
+    ]
+    return MUTATIONS + queries
+
+
+def read_isolation(dialect_name: str) -> str:
+    return "SERIALIZABLE" if dialect_name == "sqlite" else "REPEATABLE READ"
+
+
+def _sqlite_connect(dbapi_connection, connection_record) -> None:
+    dbapi_connection.isolation_level = None
+
+
+def _sqlite_begin(conn) -> None:
+    conn.exec_driver_sql("BEGIN")
+
+
+def explicit_sqlite_transactions(engine: Engine) -> None:
+    """pysqlite only opens a transaction before DML, so a RELEASE SAVEPOINT
+    outside one commits and DDL escapes the rollback. Emit BEGIN ourselves,
+    as the SQLAlchemy SQLite dialect documentation recommends.
+    """
+    if engine.dialect.name != "sqlite" or event.contains(engine, "begin", _sqlite_begin):
+        return
+    event.listen(engine, "connect", _sqlite_connect)
+    event.listen(engine, "begin", _sqlite_begin)
+    # Pooled connections were opened without the connect hook.
+    engine.dispose()
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def _error(exc: SQLAlchemyError) -> str:
+    return str(getattr(exc, "orig", exc)).strip()
+
+
+def run_query(engine: Engine, scenario: Scenario, tables: Tables, isolation: str) -> Outcome:
+    started = time.perf_counter()
+    try:
+        with engine.connect().execution_options(isolation_level=isolation) as conn:
+            result = conn.execute(scenario.build(tables))
+            columns, rows = list(result.keys()), [list(row) for row in result]
+    except SQLAlchemyError as exc:
+        return Outcome(scenario.id, scenario.title, scenario.kind, [], [], None, _elapsed_ms(started), _error(exc))
+    return Outcome(scenario.id, scenario.title, scenario.kind, columns, rows, None, _elapsed_ms(started), None)
+
+
+def run_mutations(engine: Engine, scenarios: Sequence[Scenario], tables: Tables, commit: bool = False) -> List[Outcome]:
+    outcomes = []
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            for scenario in scenarios:
+                started = time.perf_counter()
+                savepoint = conn.begin_nested()
+                try:
+                    affected = 0
+                    for statement in scenario.build(tables, conn.dialect.name):
+                        affected += max(conn.execute(statement).rowcount, 0)
+                    result = conn.execute(scenario.check(tables))
+                    columns, rows = list(result.keys()), [list(row) for row in result]
+                    savepoint.commit()
+                except SQLAlchemyError as exc:
+                    savepoint.rollback()
+                    outcomes.append(Outcome(scenario.id, scenario.title, scenario.kind, [], [], None,
+                                            _elapsed_ms(started), _error(exc)))
+                    continue
+                outcomes.append(Outcome(scenario.id, scenario.title, scenario.kind, columns, rows, affected,
+                                        _elapsed_ms(started), None))
+        finally:
+            if commit:
+                transaction.commit()
+            else:
+                transaction.rollback()
+    return outcomes
+
+
+def run_scenarios(engine: Engine, scenarios: Sequence[Scenario], tables: Tables, jobs: int = DEFAULT_JOBS,
+                  commit: bool = False) -> Dict[str, Any]:
+    """Run ``scenarios`` over ``tables``: queries on the pool, mutations as one more task."""
+    started = time.perf_counter()
+    explicit_sqlite_transactions(engine)
+    isolation = read_isolation(engine.dialect.name)
+    queries = [scenario for scenario in scenarios if scenario.kind == "query"]
+    mutations = [scenario for scenario in scenarios if scenario.kind == "mutation"]
+
+    workers = max(1, min(jobs, len(queries) + bool(mutations)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report") as pool:
+        mutation_future = pool.submit(run_mutations, engine, mutations, tables, commit) if mutations else None
+        query_futures = [pool.submit(run_query, engine, scenario, tables, isolation) for scenario in queries]
+        by_id = {outcome.id: outcome for outcome in (future.result() for future in query_futures)}
+        if mutation_future is not None:
+            by_id.update({outcome.id: outcome for outcome in mutation_future.result()})
+
+    return {
+        "database": engine.url.render_as_string(hide_password=True),
+        "read_isolation": isolation,
+        "workers": workers,
+        "mutations": "committed" if commit else "rolled back",
+        "elapsed_ms": _elapsed_ms(started),
+        "outcomes": [by_id[scenario.id] for scenario in scenarios],
+    }
+
+
+def select_scenarios(available: Sequence[Scenario], only: Optional[str] = None,
+                     mutations: bool = True) -> List[Scenario]:
+    scenarios = [scenario for scenario in available if mutations or scenario.kind != "mutation"]
+    if not only:
+        return scenarios
+    wanted = [item.strip() for item in only.split(",") if item.strip()]
+    known = {scenario.id for scenario in available}
+    unknown = [item for item in wanted if item not in known]
+    if unknown:
+        raise ValueError(f"Unknown scenario(s): {', '.join(unknown)}")
+    return [scenario for scenario in scenarios if scenario.id in wanted]
+
+
+def format_report(report: Dict[str, Any], fmt: str = "json", include_rows: bool = True) -> str:
+    outcomes = report["outcomes"]
+    if fmt == "json":
+        document = {**report, "outcomes": [outcome.as_dict(include_rows) for outcome in outcomes]}
+        return json.dumps(document, default=json_value, indent=2) + "\n"
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=SUMMARY_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for outcome in outcomes:
+            writer.writerow(outcome.as_dict(include_rows=False))
+        return buffer.getvalue()
+    lines = []
+    for outcome in outcomes:
+        detail = f"error: {outcome.error}" if outcome.error else f"{len(outcome.rows)} rows"
+        if outcome.rows_affected is not None:
+            detail += f", {outcome.rows_affected} affected"
+        lines.append(f"===== {outcome.id} {outcome.title} ({detail}, {outcome.elapsed_ms:.1f} ms) =====")
+        if include_rows and outcome.rows:
+            lines.append(", ".join(outcome.columns))
+            lines.extend(", ".join(str(value) for value in row) for row in outcome.rows)
+    lines.append(f"total {report['elapsed_ms']:.1f} ms on {report['workers']} worker(s), "
+                 f"mutations {report['mutations']}")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from database import make_engine
+
+    parser = argparse.ArgumentParser(description="Run the assignment's report scenarios with timings.")
+    parser.add_argument("--format", choices=FORMATS, default="json")
+    parser.add_argument("--only", help="comma-separated scenario ids, e.g. 5.1,6.2")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="parallel query connections")
+    parser.add_argument("--no-mutations", action="store_true", help="skip 3.x, 4.x and 8")
+    parser.add_argument("--commit", action="store_true", help="keep the mutations instead of rolling them back")
+    parser.add_argument("--no-rows", action="store_true", help="report counts and timings only")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL, as for app.py")
+    parser.add_argument("-o", "--output", help="file to write instead of stdout")
+    args = parser.parse_args(argv)
+
+    engine = make_engine(args.database_url)
+    tables = reflect_tables(engine)
+    try:
+        scenarios = select_scenarios(scenarios_for(tables), args.only, mutations=not args.no_mutations)
+    except ValueError as exc:
+        parser.error(str(exc))
+    report = run_scenarios(engine, scenarios, tables, jobs=args.jobs, commit=args.commit)
+    output = format_report(report, args.format, include_rows=not args.no_rows)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as handle:
+            handle.write(output)
+    else:
+        sys.stdout.write(output)
+    if any(outcome.error for outcome in report["outcomes"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
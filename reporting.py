@@ -0,0 +1,459 @@
+"""Precomputed reports behind the alchemy.part2.py analytics queries.
+
+Two summary tables hold the per-key aggregates the reports need:
+
+* ``app_report_caregiver_hours`` - confirmed appointments, hours and
+  earnings (hourly_rate * work_hours) per caregiver, for queries 6.2-6.4
+  and 7.
+* ``app_report_job_applicants`` - applicants per job, for query 6.1.
+
+The web routes keep them current incrementally: ``ReportStore.capture``
+collects the caregiver and job keys a write can affect (before and after
+the statement, inside the same transaction) and ``ReportStore.refresh``
+recomputes only those rows. Plain summary tables are used instead of
+PostgreSQL materialized views because a materialized view can only be
+refreshed as a whole, and they work the same on SQLite.
+
+``python reporting.py rebuild`` recomputes everything, e.g. after writes
+made outside the web app.
+"""
+import argparse
+import os
+import threading
+import weakref
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, Numeric, Table, and_, delete, event, func, insert, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+REFRESH_CHUNK = 500
+REPORT_MAX_AGE = int(os.getenv("REPORT_CACHE_SECONDS", "60"))
+
+summary_metadata = MetaData()
+
+CAREGIVER_SUMMARY = Table(
+    "app_report_caregiver_hours",
+    summary_metadata,
+    Column("caregiver_user_id", Integer, primary_key=True, autoincrement=False),
+    Column("confirmed_appointments", Integer, nullable=False),
+    Column("total_hours", Numeric(14, 2), nullable=False),
+    Column("total_earnings", Numeric(16, 2), nullable=False),
+)
+
+JOB_SUMMARY = Table(
+    "app_report_job_applicants",
+    summary_metadata,
+    Column("job_id", Integer, primary_key=True, autoincrement=False),
+    Column("applicants", Integer, nullable=False),
+)
+
+CAREGIVERS = "caregivers"
+JOBS = "jobs"
+BASE_TABLES = ("users", "member", "caregiver", "job", "job_application", "appointment")
+
+Touched = Dict[str, Set[Any]]
+
+
+def _chunks(keys: Iterable[Any]) -> Iterable[List[Any]]:
+    keys = sorted(keys)
+    for start in range(0, len(keys), REFRESH_CHUNK):
+        yield keys[start:start + REFRESH_CHUNK]
+
+
+class ReportStore:
+    """Maintain and read the report summary tables."""
+
+    def __init__(self, get_table: Callable[[str], Optional[Table]]) -> None:
+        self._get_table = get_table
+        self._ready = False
+        self._unfilled = False
+        self._uncommitted: "weakref.WeakSet[Connection]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> Table:
+        table = self._get_table(name)
+        if table is None:
+            raise LookupError(f"Report source table '{name}' does not exist")
+        return table
+
+    # -- maintenance -------------------------------------------------------
+
+    def ensure_ready(self, conn: Connection) -> None:
+        """Create the summary tables on first use and fill them if they are new."""
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready or conn in self._uncommitted:
+                return
+            missing = [
+                table for table in summary_metadata.sorted_tables
+                if not conn.dialect.has_table(conn, table.name)
+            ]
+            if not missing and not self._unfilled:
+                self._ready = True
+                return
+            summary_metadata.create_all(conn, tables=missing, checkfirst=True)
+            self._rebuild(conn)
+            # The tables and their rows belong to the caller's transaction
+            # (DDL is transactional on PostgreSQL): they only exist once it
+            # commits. pysqlite commits the DDL at once, so after a rollback
+            # the tables may be there but empty.
+            self._uncommitted.add(conn)
+            if not event.contains(conn, "commit", self._committed):
+                event.listen(conn, "commit", self._committed)
+                event.listen(conn, "rollback", self._rolled_back)
+
+    def _committed(self, conn: Connection) -> None:
+        if conn in self._uncommitted:
+            self._uncommitted.discard(conn)
+            self._unfilled = False
+            self._ready = True
+
+    def _rolled_back(self, conn: Connection) -> None:
+        if conn in self._uncommitted:
+            self._uncommitted.discard(conn)
+            self._unfilled = True
+
+    def rebuild(self, conn: Connection) -> None:
+        self.ensure_ready(conn)
+        self._rebuild(conn)
+
+    def _rebuild(self, conn: Connection) -> None:
+        conn.execute(delete(CAREGIVER_SUMMARY))
+        conn.execute(insert(CAREGIVER_SUMMARY).from_select(
+            [column.name for column in CAREGIVER_SUMMARY.columns], self._caregiver_totals()
+        ))
+        conn.execute(delete(JOB_SUMMARY))
+        conn.execute(insert(JOB_SUMMARY).from_select(
+            [column.name for column in JOB_SUMMARY.columns], self._job_totals()
+        ))
+
+    def _caregiver_totals(self):
+        appointment, caregiver = self.table("appointment"), self.table("caregiver")
+        return (
+            select(
+                caregiver.c.caregiver_user_id,
+                func.count(appointment.c.appointment_id),
+                func.coalesce(func.sum(appointment.c.work_hours), 0),
+                func.coalesce(func.sum(caregiver.c.hourly_rate * appointment.c.work_hours), 0),
+            )
+            .select_from(
+                caregiver.join(
+                    appointment,
+                    and_(
+                        appointment.c.caregiver_user_id == caregiver.c.caregiver_user_id,
+                        appointment.c.status == "confirmed",
+                    ),
+                )
+            )
+            .group_by(caregiver.c.caregiver_user_id)
+        )
+
+    def _job_totals(self):
+        job, job_application = self.table("job"), self.table("job_application")
+        return (
+            select(job.c.job_id, func.count(job_application.c.caregiver_user_id))
+            .select_from(job.outerjoin(job_application, job_application.c.job_id == job.c.job_id))
+            .group_by(job.c.job_id)
+        )
+
+    def capture(self, conn: Connection, table: Table, filters: List[Any]) -> Touched:
+        """Collect report keys that rows of ``table`` matching ``filters`` feed into."""
+        touched: Touched = {CAREGIVERS: set(), JOBS: set()}
+        if table.name not in BASE_TABLES or not filters:
+            return touched
+        name = table.name
+        if name in ("appointment", "caregiver"):
+            touched[CAREGIVERS].update(conn.execute(select(table.c.caregiver_user_id).where(*filters)).scalars())
+        if name in ("job", "job_application"):
+            touched[JOBS].update(conn.execute(select(table.c.job_id).where(*filters)).scalars())
+        if name in ("users", "member"):
+            key = table.c.user_id if name == "users" else table.c.member_user_id
+            people = select(key).where(*filters).scalar_subquery()
+            appointment, job = self.table("appointment"), self.table("job")
+            touched[CAREGIVERS].update(conn.execute(
+                select(appointment.c.caregiver_user_id).where(appointment.c.member_user_id.in_(people))
+            ).scalars())
+            touched[JOBS].update(conn.execute(select(job.c.job_id).where(job.c.member_user_id.in_(people))).scalars())
+            if name == "users":
+                touched[CAREGIVERS].update(conn.execute(select(key).where(*filters)).scalars())
+                job_application = self.table("job_application")
+                touched[JOBS].update(conn.execute(
+                    select(job_application.c.job_id).where(job_application.c.caregiver_user_id.in_(people))
+                ).scalars())
+        if name == "caregiver":
+            job_application = self.table("job_application")
+            touched[JOBS].update(conn.execute(
+                select(job_application.c.job_id).where(
+                    job_application.c.caregiver_user_id.in_(select(table.c.caregiver_user_id).where(*filters))
+                )
+            ).scalars())
+        return touched
+
+    def refresh(self, conn: Connection, *touched: Touched) -> None:
+        """Recompute the summary rows for every captured key."""
+        caregivers: Set[Any] = set()
+        jobs: Set[Any] = set()
+        for keys in touched:
+            caregivers |= keys[CAREGIVERS]
+            jobs |= keys[JOBS]
+        if not caregivers and not jobs:
+            return
+        self.ensure_ready(conn)
+        caregiver = self.table("caregiver")
+        for chunk in _chunks(caregivers):
+            conn.execute(delete(CAREGIVER_SUMMARY).where(CAREGIVER_SUMMARY.c.caregiver_user_id.in_(chunk)))
+            conn.execute(insert(CAREGIVER_SUMMARY).from_select(
+                [column.name for column in CAREGIVER_SUMMARY.columns],
+                self._caregiver_totals().where(caregiver.c.caregiver_user_id.in_(chunk)),
+            ))
+        job = self.table("job")
+        for chunk in _chunks(jobs):
+            conn.execute(delete(JOB_SUMMARY).where(JOB_SUMMARY.c.job_id.in_(chunk)))
+            conn.execute(insert(JOB_SUMMARY).from_select(
+                [column.name for column in JOB_SUMMARY.columns],
+                self._job_totals().where(job.c.job_id.in_(chunk)),
+            ))
+
+    def refresh_queries(self) -> Dict[str, Any]:
+        """The per-key recompute statements issued by refresh(), for plan inspection."""
+        caregiver, job = self.table("caregiver"), self.table("job")
+        return {
+            "refresh caregivers": self._caregiver_totals().where(caregiver.c.caregiver_user_id.in_([1])),
+            "refresh jobs": self._job_totals().where(job.c.job_id.in_([1])),
+        }
+
+    # -- reports -----------------------------------------------------------
+
+    def applicants_per_job(self, conn: Connection) -> List[Dict[str, Any]]:
+        """6.1 Applicant counts per job, with the posting member's name."""
+        job, users = self.table("job"), self.table("users")
+        stmt = (
+            select(JOB_SUMMARY.c.job_id, users.c.given_name.label("member_name"), JOB_SUMMARY.c.applicants)
+            .select_from(
+                JOB_SUMMARY
+                .join(job, job.c.job_id == JOB_SUMMARY.c.job_id)
+                .join(users, users.c.user_id == job.c.member_user_id)
+            )
+            .order_by(JOB_SUMMARY.c.job_id)
+        )
+        return [dict(row._mapping) for row in conn.execute(stmt)]
+
+    def confirmed_hours(self, conn: Connection) -> List[Dict[str, Any]]:
+        """6.2 Total hours spent per caregiver on confirmed appointments."""
+        users = self.table("users")
+        stmt = (
+            select(
+                CAREGIVER_SUMMARY.c.caregiver_user_id,
+                users.c.given_name,
+                users.c.surname,
+                CAREGIVER_SUMMARY.c.total_hours,
+            )
+            .select_from(CAREGIVER_SUMMARY.join(users, users.c.user_id == CAREGIVER_SUMMARY.c.caregiver_user_id))
+            .order_by(CAREGIVER_SUMMARY.c.caregiver_user_id)
+        )
+        return [dict(row._mapping) for row in conn.execute(stmt)]
+
+    def average_payout(self, conn: Connection) -> Dict[str, Any]:
+        """6.3 Average payout per confirmed appointment."""
+        total, count = conn.execute(
+            select(
+                func.sum(CAREGIVER_SUMMARY.c.total_earnings),
+                func.sum(CAREGIVER_SUMMARY.c.confirmed_appointments),
+            )
+        ).one()
+        return {"avg_payout": total / count if count else None}
+
+    def above_average_earners(self, conn: Connection) -> List[Dict[str, Any]]:
+        """6.4 Caregivers whose confirmed earnings exceed the caregiver average."""
+        users = self.table("users")
+        average = select(func.avg(CAREGIVER_SUMMARY.c.total_earnings)).scalar_subquery()
+        stmt = (
+            select(
+                CAREGIVER_SUMMARY.c.caregiver_user_id,
+                users.c.given_name,
+                users.c.surname,
+                CAREGIVER_SUMMARY.c.total_earnings,
+            )
+            .select_from(CAREGIVER_SUMMARY.join(users, users.c.user_id == CAREGIVER_SUMMARY.c.caregiver_user_id))
+            .where(CAREGIVER_SUMMARY.c.total_earnings > average)
+            .order_by(CAREGIVER_SUMMARY.c.total_earnings.desc())
+        )
+        return [dict(row._mapping) for row in conn.execute(stmt)]
+
+    def total_confirmed_cost(self, conn: Connection) -> Dict[str, Any]:
+        """7. Total cost of all confirmed appointments."""
+        total = conn.execute(select(func.sum(CAREGIVER_SUMMARY.c.total_earnings))).scalar()
+        return {"total_cost": total if total is not None else 0}
+
+    def run(self, conn: Connection, name: str) -> Any:
+        if name not in REPORTS:
+            raise KeyError(name)
+        self.ensure_ready(conn)
+        return getattr(self, REPORTS[name])(conn)
+
+
+REPORTS = {
+    "applicants-per-job": "applicants_per_job",
+    "confirmed-hours": "confirmed_hours",
+    "average-payout": "average_payout",
+    "above-average-earners": "above_average_earners",
+    "total-confirmed-cost": "total_confirmed_cost",
+}
+
+
+def source_queries(get_table: Callable[[str], Optional[Table]]) -> Dict[str, Tuple[str, Any]]:
+    """The read-only queries of alchemy.part2.py, computed from the base tables.
+
+    Returns ``{number: (title, statement)}``; used to inspect their plans and
+    to run them directly.
+    """
+    def table(name: str) -> Table:
+        found = get_table(name)
+        if found is None:
+            raise LookupError(f"Report source table '{name}' does not exist")
+        return found
+
+    users, caregiver, member = table("users"), table("caregiver"), table("member")
+    address, job, job_application, appointment = (
+        table("address"), table("job"), table("job_application"), table("appointment")
+    )
+    confirmed = appointment.c.status == "confirmed"
+    by_caregiver = appointment.c.caregiver_user_id == caregiver.c.caregiver_user_id
+    caregiver_user, member_user = users.alias("c"), users.alias("m")
+
+    earnings = (
+        select(
+            appointment.c.caregiver_user_id.label("cg_id"),
+            func.sum(caregiver.c.hourly_rate * appointment.c.work_hours).label("total_earnings"),
+        )
+        .select_from(appointment.join(caregiver, by_caregiver))
+        .where(confirmed)
+        .group_by(appointment.c.caregiver_user_id)
+        .cte("earnings_per_caregiver")
+    )
+
+    return {
+        "5.1": (
+            "Caregiver and member names for confirmed appointments",
+            select(
+                caregiver_user.c.given_name.label("caregiver_name"),
+                caregiver_user.c.surname.label("caregiver_surname"),
+                member_user.c.given_name.label("member_name"),
+                member_user.c.surname.label("member_surname"),
+            )
+            .select_from(
+                appointment
+                .join(caregiver_user, appointment.c.caregiver_user_id == caregiver_user.c.user_id)
+                .join(member_user, appointment.c.member_user_id == member_user.c.user_id)
+            )
+            .where(confirmed),
+        ),
+        "5.2": (
+            "Jobs requiring soft-spoken",
+            select(job.c.job_id).where(func.lower(job.c.other_requirements).like("%soft-spoken%")),
+        ),
+        "5.3": (
+            "Babysitter work hours",
+            select(appointment.c.work_hours)
+            .select_from(appointment.join(caregiver, by_caregiver))
+            .where(caregiver.c.caregiving_type == "babysitter"),
+        ),
+        "5.4": (
+            "Members looking for elderly care in Astana with 'No pets'",
+            select(users.c.given_name, users.c.surname)
+            .select_from(
+                member
+                .join(users, users.c.user_id == member.c.member_user_id)
+                .join(job, job.c.member_user_id == member.c.member_user_id)
+                .join(address, address.c.member_user_id == member.c.member_user_id)
+            )
+            .where(
+                job.c.required_caregiving_type == "caregiver for elderly",
+                address.c.town == "Astana",
+                member.c.house_rules == "No pets",
+            ),
+        ),
+        "6.1": (
+            "Applicant counts per job",
+            select(
+                job.c.job_id,
+                users.c.given_name.label("member_name"),
+                func.count(job_application.c.caregiver_user_id).label("applicants"),
+            )
+            .select_from(
+                job
+                .join(member, job.c.member_user_id == member.c.member_user_id)
+                .join(users, users.c.user_id == member.c.member_user_id)
+                .outerjoin(job_application, job.c.job_id == job_application.c.job_id)
+            )
+            .group_by(job.c.job_id, users.c.given_name),
+        ),
+        "6.2": (
+            "Confirmed hours per caregiver",
+            select(
+                caregiver.c.caregiver_user_id,
+                users.c.given_name,
+                users.c.surname,
+                func.sum(appointment.c.work_hours).label("total_hours"),
+            )
+            .select_from(
+                appointment
+                .join(caregiver, by_caregiver)
+                .join(users, users.c.user_id == caregiver.c.caregiver_user_id)
+            )
+            .where(confirmed)
+            .group_by(caregiver.c.caregiver_user_id, users.c.given_name, users.c.surname),
+        ),
+        "6.3": (
+            "Average payout per confirmed appointment",
+            select(func.avg(caregiver.c.hourly_rate * appointment.c.work_hours).label("avg_payout"))
+            .select_from(appointment.join(caregiver, by_caregiver))
+            .where(confirmed),
+        ),
+        "6.4": (
+            "Caregivers earning above average",
+            select(caregiver.c.caregiver_user_id, users.c.given_name, users.c.surname, earnings.c.total_earnings)
+            .select_from(
+                earnings
+                .join(caregiver, caregiver.c.caregiver_user_id == earnings.c.cg_id)
+                .join(users, users.c.user_id == caregiver.c.caregiver_user_id)
+            )
+            .where(earnings.c.total_earnings > select(func.avg(earnings.c.total_earnings)).scalar_subquery()),
+        ),
+        "7": (
+            "Total cost of confirmed appointments",
+            select(func.sum(caregiver.c.hourly_rate * appointment.c.work_hours).label("total_cost"))
+            .select_from(appointment.join(caregiver, by_caregiver))
+            .where(confirmed),
+        ),
+    }
+
+
+def report_title(name: str) -> str:
+    method = getattr(ReportStore, REPORTS[name])
+    return method.__doc__.strip()
+
+
+def main() -> None:
+    from database import make_engine
+    from schema_cache import SchemaCache
+
+    parser = argparse.ArgumentParser(description="Maintain the report summary tables.")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+
+    engine: Engine = make_engine()
+    store = ReportStore(SchemaCache(engine).get_table)
+    if args.command == "rebuild":
+        try:
+            with engine.begin() as conn:
+                store.rebuild(conn)
+        except SQLAlchemyError as exc:
+            raise SystemExit(f"Rebuild failed: {exc}")
+        print("Report summary tables rebuilt.")
+
+
+if __name__ == "__main__":
+    main()
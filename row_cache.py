@@ -0,0 +1,220 @@
+"""Read-through cache of single rows by primary key.
+
+``edit_record`` loads the row it edits with a primary key select on every
+GET; with the cache on, hot rows are served from memory instead. Entries
+are keyed on (table, generation, primary key) and hold the pickled row.
+
+Configured from the environment:
+
+* ROW_CACHE_BACKEND   - ``off`` (default), ``memory`` or ``redis``.
+* ROW_CACHE_MAX_BYTES - memory backend: total size of the pickled rows
+  kept (default 16 MiB); least recently used rows are evicted first.
+* ROW_CACHE_TTL       - seconds a row may be served after it was loaded
+  (default 60, 0 for no expiry).
+* ROW_CACHE_REDIS_URL - redis backend: any Redis-compatible server
+  (default ``redis://localhost:6379/0``). Needs the optional ``redis``
+  package (requirements-redis.txt). Bound its memory with ``maxmemory``
+  and ``allkeys-lru`` on the server.
+
+The write routes in app.py invalidate after they commit. An edit discards
+the edited row. A delete also moves every table that references the
+deleted one (ON DELETE CASCADE) to a new generation, which orphans all of
+their cached rows at once. The memory backend lives in one process, so
+with several gunicorn workers the others keep serving their copy until
+the TTL runs out; the redis backend shares rows and generations between
+workers. The TTL also bounds staleness after writes made outside the app
+and a load that races a write.
+
+Hit, miss and eviction counters are served on /stats/row-cache and
+/metrics.
+"""
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+BACKENDS = ("off", "memory", "redis")
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+KEY_PREFIX = "app_row_cache:"
+
+Key = Tuple[Any, ...]
+
+
+class MemoryBackend:
+    """An LRU of pickled rows bounded by their total size, with a TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = 60) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires and expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl if self.ttl else 0.0, value)
+            self.bytes += len(value)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, keys: Sequence[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[1])
+
+    def generation(self, table_name: str) -> int:
+        return self._generations.get(table_name, 0)
+
+    def bump(self, table_name: str) -> None:
+        with self._lock:
+            self._generations[table_name] = self._generations.get(table_name, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "evictions": self.evictions}
+
+
+class RedisBackend:
+    """Rows and generations in a Redis-compatible server shared by all workers."""
+
+    name = "redis"
+
+    def __init__(self, url: str, ttl: float = 60) -> None:
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("ROW_CACHE_BACKEND=redis requires the optional 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(KEY_PREFIX + key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self.client.set(KEY_PREFIX + key, value, ex=int(self.ttl) or None)
+
+    def delete(self, keys: Sequence[str]) -> None:
+        if keys:
+            self.client.delete(*[KEY_PREFIX + key for key in keys])
+
+    def generation(self, table_name: str) -> int:
+        return int(self.client.get(f"{KEY_PREFIX}generation:{table_name}") or 0)
+
+    def bump(self, table_name: str) -> None:
+        self.client.incr(f"{KEY_PREFIX}generation:{table_name}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class RowCache:
+    def __init__(self, backend: Optional[Any] = None) -> None:
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def _key(self, table_name: str, key: Key) -> str:
+        return f"{table_name}:{self.backend.generation(table_name)}:{json.dumps(list(key), default=str)}"
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_or_load(self, table_name: str, key: Key,
+                    load: Callable[[], Optional[Mapping[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """The cached row, or ``load()`` stored for the next request. Missing rows are not cached."""
+        if self.backend is None:
+            row = load()
+            return dict(row) if row is not None else None
+        cache_key = None
+        try:
+            cache_key = self._key(table_name, key)
+            cached = self.backend.get(cache_key)
+        except Exception:
+            # A cache that is down only costs the primary key select.
+            self._count("errors")
+            cached = None
+        if cached is not None:
+            self._count("hits")
+            return pickle.loads(cached)
+        self._count("misses")
+        row = load()
+        if row is None:
+            return None
+        row = dict(row)
+        if cache_key is not None:
+            try:
+                self.backend.set(cache_key, pickle.dumps(row, protocol=pickle.HIGHEST_PROTOCOL))
+            except Exception:
+                self._count("errors")
+        return row
+
+    def discard(self, table_name: str, keys: Iterable[Key]) -> None:
+        if self.backend is None:
+            return
+        try:
+            self.backend.delete([self._key(table_name, tuple(key)) for key in keys])
+        except Exception:
+            self._count("errors")
+
+    def invalidate(self, table_names: Iterable[str]) -> None:
+        """Orphan every cached row of ``table_names``."""
+        if self.backend is None:
+            return
+        for table_name in table_names:
+            try:
+                self.backend.bump(table_name)
+            except Exception:
+                self._count("errors")
+
+    def stats(self) -> Dict[str, Any]:
+        if self.backend is None:
+            return {"backend": "off"}
+        return {"backend": self.backend.name, "hits": self.hits, "misses": self.misses, "errors": self.errors,
+                **self.backend.stats()}
+
+
+def row_cache_from_env() -> RowCache:
+    backend = os.getenv("ROW_CACHE_BACKEND", "off").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"ROW_CACHE_BACKEND must be one of {', '.join(BACKENDS)}")
+    ttl = float(os.getenv("ROW_CACHE_TTL", "60"))
+    if backend == "memory":
+        return RowCache(MemoryBackend(int(os.getenv("ROW_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES))), ttl))
+    if backend == "redis":
+        return RowCache(RedisBackend(os.getenv("ROW_CACHE_REDIS_URL", "redis://localhost:6379/0"), ttl))
+    return RowCache()
@@ -0,0 +1,148 @@
+"""Row counts for the index dashboard.
+
+Three modes are supported, selected with ROW_COUNT_MODE:
+
+* ``exact``     - one batched ``SELECT (SELECT count(*) ...), ...`` statement.
+* ``estimated`` - planner statistics (``pg_class.reltuples`` with
+  ``pg_stat_user_tables.n_live_tup`` as fallback) on PostgreSQL; other
+  dialects and tables without statistics fall back to exact counts.
+* ``cached``    - exact counts kept in process for ROW_COUNT_TTL seconds and
+  invalidated by the write routes.
+"""
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import Table, bindparam, func, select, text
+from sqlalchemy.engine import Connection
+
+MODES = ("exact", "estimated", "cached")
+
+ESTIMATE_QUERY = text(
+    """
+    SELECT c.relname,
+           c.reltuples::bigint AS reltuples,
+           s.n_live_tup,
+           s.last_analyze,
+           s.last_autoanalyze
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE c.relkind IN ('r', 'p')
+      AND n.nspname = current_schema()
+      AND c.relname IN :names
+    """
+).bindparams(bindparam("names", expanding=True))
+
+
+class RowCount(NamedTuple):
+    value: int
+    source: str
+
+
+def exact_counts(conn: Connection, tables: Sequence[Table]) -> Dict[str, int]:
+    """Count every table in a single round trip."""
+    if not tables:
+        return {}
+    stmt = select(
+        *[
+            select(func.count()).select_from(table).scalar_subquery().label(f"c{position}")
+            for position, table in enumerate(tables)
+        ]
+    )
+    row = conn.execute(stmt).one()
+    return {table.name: row[position] for position, table in enumerate(tables)}
+
+
+def estimated_counts(conn: Connection, tables: Sequence[Table]) -> Dict[str, int]:
+    """Read planner estimates; tables without statistics are left out."""
+    if conn.dialect.name != "postgresql" or not tables:
+        return {}
+    estimates: Dict[str, int] = {}
+    for name, reltuples, live_tuples, last_analyze, last_autoanalyze in conn.execute(
+        ESTIMATE_QUERY, {"names": [table.name for table in tables]}
+    ):
+        # reltuples is -1 (or 0 on older servers) until the table has been
+        # vacuumed or analyzed; n_live_tup is maintained by the stats collector.
+        if reltuples is not None and reltuples > 0:
+            estimates[name] = int(reltuples)
+        elif live_tuples:
+            estimates[name] = int(live_tuples)
+        elif last_analyze is not None or last_autoanalyze is not None:
+            estimates[name] = 0
+    return estimates
+
+
+def dependent_table_names(table: Table) -> Set[str]:
+    """Return ``table`` and every table whose foreign keys reach it (cascades)."""
+    names = {table.name}
+    pending = [table]
+    while pending:
+        target = pending.pop()
+        for candidate in table.metadata.tables.values():
+            if candidate.name in names:
+                continue
+            if any(fk.references(target) for fk in candidate.foreign_keys):
+                names.add(candidate.name)
+                pending.append(candidate)
+    return names
+
+
+class RowCounter:
+    """Produce row counts for a set of tables according to ``mode``."""
+
+    def __init__(self, mode: str = "exact", ttl: float = 60.0) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown row count mode '{mode}', expected one of {', '.join(MODES)}")
+        self.mode = mode
+        self.ttl = ttl
+        self._cache: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def counts(self, conn: Connection, tables: Iterable[Table]) -> Dict[str, RowCount]:
+        tables = list(tables)
+        if self.mode == "estimated":
+            return self._estimated(conn, tables)
+        if self.mode == "cached":
+            return self._cached(conn, tables)
+        return {name: RowCount(value, "exact") for name, value in exact_counts(conn, tables).items()}
+
+    def invalidate(self, table: Optional[Table] = None) -> None:
+        """Drop cached counts for ``table`` and its cascading dependents, or all."""
+        with self._lock:
+            if table is None:
+                self._cache.clear()
+                return
+            for name in dependent_table_names(table):
+                self._cache.pop(name, None)
+
+    def _estimated(self, conn: Connection, tables: List[Table]) -> Dict[str, RowCount]:
+        counts = {name: RowCount(value, "estimated") for name, value in estimated_counts(conn, tables).items()}
+        missing = [table for table in tables if table.name not in counts]
+        for name, value in exact_counts(conn, missing).items():
+            counts[name] = RowCount(value, "exact")
+        return counts
+
+    def _cached(self, conn: Connection, tables: List[Table]) -> Dict[str, RowCount]:
+        now = time.monotonic()
+        counts: Dict[str, RowCount] = {}
+        with self._lock:
+            for table in tables:
+                entry = self._cache.get(table.name)
+                if entry is not None and now - entry[1] < self.ttl:
+                    counts[table.name] = RowCount(entry[0], "cached")
+        missing = [table for table in tables if table.name not in counts]
+        fresh = exact_counts(conn, missing)
+        with self._lock:
+            for name, value in fresh.items():
+                self._cache[name] = (value, now)
+                counts[name] = RowCount(value, "exact")
+        return counts
+
+
+def counter_from_env() -> RowCounter:
+    return RowCounter(
+        mode=os.getenv("ROW_COUNT_MODE", "exact"),
+        ttl=float(os.getenv("ROW_COUNT_TTL", "60")),
+    )
@@ -0,0 +1,183 @@
+"""Lazy, cached schema reflection.
+
+Tables are reflected the first time a request needs them instead of when
+the module is imported. When SCHEMA_SNAPSHOT_PATH is set, a pickled copy of
+the fully reflected MetaData is written there and reused by later processes
+as long as the database's schema fingerprint still matches. Setting
+SCHEMA_PRELOAD=1 reflects everything at import time, which together with
+``gunicorn --preload`` lets the master process reflect once and share the
+result with every forked worker. Each table's access plan (see
+access_plan.py) is cached alongside it and rebuilt after re-reflection.
+"""
+import hashlib
+import os
+import pickle
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy import MetaData, Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import NoSuchTableError
+
+from access_plan import AccessPlan
+
+POSTGRES_FINGERPRINT = text(
+    """
+    SELECT md5(string_agg(definition, ';' ORDER BY definition))
+    FROM (
+        SELECT c.relname || '.' || a.attname || ':' || format_type(a.atttypid, a.atttypmod)
+               || ':' || a.attnotnull AS definition
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema()
+          AND c.relkind IN ('r', 'p')
+          AND a.attnum > 0
+          AND NOT a.attisdropped
+        UNION ALL
+        SELECT con.conrelid::regclass::text || ':' || con.conname || ':' || pg_get_constraintdef(con.oid)
+        FROM pg_constraint con
+        JOIN pg_namespace n ON n.oid = con.connamespace
+        WHERE n.nspname = current_schema()
+    ) definitions
+    """
+)
+
+# Bookkeeping tables owned by this app (report summaries and the like) are
+# not user data and stay out of the table browser.
+INTERNAL_TABLE_PREFIX = "app_"
+
+SQLITE_FINGERPRINT = text(
+    "SELECT type, name, sql FROM sqlite_master WHERE type IN ('table', 'index') ORDER BY type, name"
+)
+
+
+def schema_fingerprint(conn: Connection) -> Optional[str]:
+    """Hash the catalog in one round trip, or None if the dialect is unsupported."""
+    if conn.dialect.name == "postgresql":
+        return conn.execute(POSTGRES_FINGERPRINT).scalar()
+    if conn.dialect.name == "sqlite":
+        digest = hashlib.sha256()
+        for row in conn.execute(SQLITE_FINGERPRINT):
+            digest.update(repr(tuple(row)).encode("utf-8"))
+        return digest.hexdigest()
+    return None
+
+
+class SchemaCache:
+    """Reflect tables on demand into a single, long-lived MetaData."""
+
+    def __init__(self, engine: Engine, snapshot_path: Optional[str] = None) -> None:
+        self.engine = engine
+        self.snapshot_path = snapshot_path
+        self.metadata = MetaData()
+        self._names: Optional[List[str]] = None
+        self._complete = False
+        self._snapshot_checked = False
+        self._plans: Dict[str, AccessPlan] = {}
+        self._lock = threading.RLock()
+
+    def table_names(self) -> List[str]:
+        with self._lock:
+            self._load_snapshot()
+            if self._names is None:
+                self._names = sorted(
+                    name for name in inspect(self.engine).get_table_names()
+                    if not name.startswith(INTERNAL_TABLE_PREFIX)
+                )
+            return self._names
+
+    def get_table(self, name: str) -> Optional[Table]:
+        """Return the reflected table, reflecting it (and its FK targets) once."""
+        with self._lock:
+            self._load_snapshot()
+            table = self.metadata.tables.get(name)
+            if table is not None and self._is_reflected(table):
+                return table
+            if name not in self.table_names():
+                return None
+            try:
+                return Table(name, self.metadata, autoload_with=self.engine, extend_existing=True)
+            except NoSuchTableError:
+                return None
+
+    def plan(self, name: str) -> Optional[AccessPlan]:
+        """Return the access plan for a table, building it after reflection."""
+        with self._lock:
+            plan = self._plans.get(name)
+            if plan is not None:
+                return plan
+            table = self.get_table(name)
+            if table is None:
+                return None
+            plan = self._plans[name] = AccessPlan(table)
+            return plan
+
+    def all_tables(self) -> List[Table]:
+        """Reflect every table in one pass and persist a snapshot if configured."""
+        with self._lock:
+            if not self._complete:
+                self.metadata.reflect(bind=self.engine, only=self.table_names(), extend_existing=True)
+                # extend_existing replaces the Column objects plans refer to.
+                self._plans.clear()
+                self._complete = True
+                self._save_snapshot()
+            return [self.metadata.tables[name] for name in self.table_names()]
+
+    def invalidate(self) -> None:
+        """Forget everything reflected so far; the next access reflects again."""
+        with self._lock:
+            self.metadata.clear()
+            self._plans.clear()
+            self._names = None
+            self._complete = False
+            self._snapshot_checked = True
+
+    @staticmethod
+    def _is_reflected(table: Table) -> bool:
+        # Tables created only as foreign key targets have no columns yet.
+        return len(table.columns) > 0
+
+    def _load_snapshot(self) -> None:
+        if self._snapshot_checked:
+            return
+        self._snapshot_checked = True
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, "rb") as handle:
+                snapshot = pickle.load(handle)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as exc:
+            print(f"Note: ignoring unreadable schema snapshot: {exc}")
+            return
+        with self.engine.connect() as conn:
+            fingerprint = schema_fingerprint(conn)
+        if fingerprint is None or snapshot.get("fingerprint") != fingerprint:
+            return
+        for table in snapshot["metadata"].sorted_tables:
+            table.to_metadata(self.metadata)
+        self._names = sorted(snapshot["names"])
+        self._complete = True
+
+    def _save_snapshot(self) -> None:
+        if not self.snapshot_path:
+            return
+        with self.engine.connect() as conn:
+            fingerprint = schema_fingerprint(conn)
+        if fingerprint is None:
+            return
+        snapshot = {"fingerprint": fingerprint, "names": self._names, "metadata": self.metadata}
+        temporary_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_path, "wb") as handle:
+                pickle.dump(snapshot, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, self.snapshot_path)
+        except OSError as exc:
+            print(f"Note: could not write schema snapshot: {exc}")
+
+
+def schema_cache_from_env(engine: Engine) -> SchemaCache:
+    schema = SchemaCache(engine, snapshot_path=os.getenv("SCHEMA_SNAPSHOT_PATH") or None)
+    if os.getenv("SCHEMA_PRELOAD", "").lower() in {"1", "true", "yes", "on"}:
+        schema.all_tables()
+    return schema
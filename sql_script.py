@@ -0,0 +1,159 @@
+"""Split plain SQL scripts such as assigm3.sql into statements.
+
+The lexer understands single-quoted strings (with ``''`` and, for ``E''``
+strings, backslash escapes), double-quoted identifiers, dollar-quoted
+bodies, ``--`` and nested ``/* */`` comments, so a semicolon is only a
+statement boundary when it is actually code. translate() rewrites the
+PostgreSQL-only parts of the assignment schema for SQLite.
+"""
+import re
+from typing import Callable, Iterator, List, Optional, Tuple
+
+CODE, STRING, IDENTIFIER, COMMENT, END = "code", "string", "identifier", "comment", "end"
+
+_DOLLAR_TAG = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)?\$")
+_SERIAL = re.compile(r"\b(?:SMALL|BIG)?SERIAL\b", re.I)
+_TABLE_NAME = re.compile(r"\b(CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?|REFERENCES\s+|INSERT\s+INTO\s+)(\w+)", re.I)
+_CREATE = re.compile(r"^\s*CREATE\s+(TABLE|INDEX|UNIQUE\s+INDEX)\s+(?!IF\s+NOT\s+EXISTS)", re.I)
+_INSERT_TARGET = re.compile(r'^\s*INSERT\s+INTO\s+(?:"([^"]+)"|(\w+))', re.I)
+
+
+def _is_word(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def segments(sql: str) -> Iterator[Tuple[str, str]]:
+    """Yield ``(kind, text)`` pieces of ``sql``; raises ValueError if unterminated."""
+    position, length = 0, len(sql)
+    code_start = 0
+
+    def flush(end: int) -> Iterator[Tuple[str, str]]:
+        if end > code_start:
+            yield CODE, sql[code_start:end]
+
+    while position < length:
+        char = sql[position]
+        following = sql[position + 1] if position + 1 < length else ""
+        previous = sql[position - 1] if position else ""
+
+        if char == "-" and following == "-":
+            yield from flush(position)
+            end = sql.find("\n", position)
+            end = length if end == -1 else end
+            yield COMMENT, sql[position:end]
+            position = code_start = end
+        elif char == "/" and following == "*":
+            yield from flush(position)
+            depth, end = 1, position + 2
+            while depth:
+                if end >= length:
+                    raise ValueError(f"Unterminated comment starting at offset {position}")
+                if sql.startswith("/*", end):
+                    depth, end = depth + 1, end + 2
+                elif sql.startswith("*/", end):
+                    depth, end = depth - 1, end + 2
+                else:
+                    end += 1
+            yield COMMENT, sql[position:end]
+            position = code_start = end
+        elif char == "'":
+            # E'...' strings also treat backslash as an escape character.
+            escaped = previous in ("e", "E") and (position < 2 or not _is_word(sql[position - 2]))
+            end = position + 1
+            while True:
+                if end >= length:
+                    raise ValueError(f"Unterminated string starting at offset {position}")
+                if escaped and sql[end] == "\\":
+                    end += 2
+                elif sql[end] == "'":
+                    if sql.startswith("''", end):
+                        end += 2
+                    else:
+                        end += 1
+                        break
+                else:
+                    end += 1
+            start = position - 1 if escaped else position
+            yield from flush(start)
+            yield STRING, sql[start:end]
+            position = code_start = end
+        elif char == '"':
+            yield from flush(position)
+            end = position + 1
+            while True:
+                end = sql.find('"', end)
+                if end == -1:
+                    raise ValueError(f"Unterminated identifier starting at offset {position}")
+                if sql.startswith('""', end):
+                    end += 2
+                    continue
+                end += 1
+                break
+            yield IDENTIFIER, sql[position:end]
+            position = code_start = end
+        elif char == "$" and not _is_word(previous) and _DOLLAR_TAG.match(sql, position):
+            tag = _DOLLAR_TAG.match(sql, position).group(0)
+            end = sql.find(tag, position + len(tag))
+            if end == -1:
+                raise ValueError(f"Unterminated dollar-quoted string starting at offset {position}")
+            end += len(tag)
+            yield from flush(position)
+            yield STRING, sql[position:end]
+            position = code_start = end
+        elif char == ";":
+            yield from flush(position)
+            yield END, ";"
+            position = code_start = position + 1
+        else:
+            position += 1
+    yield from flush(length)
+
+
+def split_statements(sql: str) -> List[str]:
+    """Return the statements of ``sql`` without comments or trailing semicolons."""
+    statements, current = [], []
+    for kind, text in segments(sql):
+        if kind == END:
+            statements.append("".join(current).strip())
+            current = []
+        elif kind == COMMENT:
+            current.append(" ")
+        else:
+            current.append(text)
+    statements.append("".join(current).strip())
+    return [statement for statement in statements if statement]
+
+
+def map_code(statement: str, transform: Callable[[str], str]) -> str:
+    """Apply ``transform`` to the code of ``statement``, leaving literals untouched."""
+    return "".join(transform(text) if kind == CODE else text for kind, text in segments(statement))
+
+
+def if_not_exists(statement: str) -> str:
+    """Make CREATE TABLE/INDEX statements safe to re-run."""
+    return _CREATE.sub(lambda match: match.group(0).rstrip() + " IF NOT EXISTS ", statement, count=1)
+
+
+def translate(statement: str, dialect_name: str) -> str:
+    """Rewrite PostgreSQL-only syntax of the assignment schema for ``dialect_name``.
+
+    SQLite gets INTEGER for SERIAL (an INTEGER PRIMARY KEY is its rowid and
+    autoincrements) and lowercased unquoted table names, matching how
+    PostgreSQL folds them, so both databases reflect the same names.
+    """
+    if dialect_name != "sqlite":
+        return statement
+
+    def rewrite(code: str) -> str:
+        code = _SERIAL.sub("INTEGER", code)
+        return _TABLE_NAME.sub(lambda match: match.group(1) + match.group(2).lower(), code)
+
+    return map_code(statement, rewrite)
+
+
+def insert_target(statement: str) -> Optional[str]:
+    """The table an INSERT writes to (folded to lowercase unless quoted), else None."""
+    match = _INSERT_TARGET.match(statement)
+    if match is None:
+        return None
+    return match.group(1) if match.group(1) is not None else match.group(2).lower()
@@ -0,0 +1,237 @@
+"""Per-table change counters, strong ETags and a rendered-page cache.
+
+``app_table_versions`` holds one counter per table. The web app's write
+routes bump it in the same transaction as the write, together with every
+table that references the written one through foreign keys (ON DELETE
+CASCADE changes those too). On PostgreSQL, migration 0003 installs
+statement-level triggers that do the bumping instead, so writes from other
+processes (psql, alchemy.part2.py-style scripts) are seen as well, and
+send a NOTIFY on the ``app_table_versions`` channel. With psycopg2 a
+listener thread per process keeps the counters in memory from those
+notifications; otherwise each conditional request reads them with one
+small query. On SQLite only writes made through the web apps are counted.
+
+Table pages and the index page carry a strong ETag derived from the
+version, the request's query string and a fingerprint of the code and
+templates, and ``If-None-Match`` is answered with 304. Pages with pending
+flash messages are neither tagged nor cached.
+
+* PAGE_CACHE_ENTRIES - keep up to this many rendered table pages per
+  process, least recently used first out (default 0, off). Entries are
+  keyed on (table, query string, version), so a write makes the old ones
+  unreachable and LRU eviction drops them.
+"""
+import hashlib
+import os
+import select as select_module
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import BigInteger, Column, MetaData, String, Table, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+
+VERSIONS_TABLE = "app_table_versions"
+CHANNEL = "app_table_versions"
+LISTEN_RETRY_SECONDS = 5
+
+versions_metadata = MetaData()
+table_versions = Table(
+    VERSIONS_TABLE,
+    versions_metadata,
+    Column("table_name", String(255), primary_key=True),
+    Column("version", BigInteger, nullable=False, default=0),
+)
+
+
+def code_fingerprint(paths: Iterable[str]) -> str:
+    """Hash source files so a deploy changes every ETag."""
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        with open(path, "rb") as handle:
+            digest.update(path.encode("utf-8"))
+            digest.update(handle.read())
+    return digest.hexdigest()[:16]
+
+
+def dependents(table: Table, tables: Sequence[Table]) -> List[Table]:
+    """``table`` plus every table that references it, directly or transitively."""
+    referencing: Dict[str, List[Table]] = {}
+    for candidate in tables:
+        for key in candidate.foreign_keys:
+            referencing.setdefault(key.column.table.name, []).append(candidate)
+    found: Dict[str, Table] = {table.name: table}
+    pending = [table]
+    while pending:
+        for child in referencing.get(pending.pop().name, []):
+            if child.name not in found:
+                found[child.name] = child
+                pending.append(child)
+    return list(found.values())
+
+
+def _upsert(conn: Connection, name: str) -> None:
+    dialect_insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(conn.dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(table_versions).values(table_name=name, version=1)
+        conn.execute(statement.on_conflict_do_update(
+            index_elements=[table_versions.c.table_name],
+            set_={"version": table_versions.c.version + 1},
+        ))
+        return
+    bumped = conn.execute(
+        update(table_versions)
+        .where(table_versions.c.table_name == name)
+        .values(version=table_versions.c.version + 1)
+    )
+    if not bumped.rowcount:
+        conn.execute(table_versions.insert().values(table_name=name, version=1))
+
+
+class TableVersions:
+    def __init__(self, engine: Engine, all_tables: Callable[[], List[Table]]) -> None:
+        self.engine = engine
+        self._all_tables = all_tables
+        # Migration 0003 installs the bumping triggers on PostgreSQL.
+        self.triggers = engine.dialect.name == "postgresql"
+        self._ready = False
+        self._lock = threading.Lock()
+        self._memory: Dict[str, int] = {}
+        self._listening = False
+        self._listener_pid: Optional[int] = None
+
+    def ensure_ready(self, conn: Connection) -> None:
+        if self._ready:
+            return
+        with self._lock:
+            if not self._ready:
+                versions_metadata.create_all(conn, checkfirst=True)
+                self._ready = True
+
+    def bump(self, conn: Connection, table: Table) -> None:
+        """Count a write to ``table`` inside the writing transaction."""
+        if self.triggers:
+            return
+        self.ensure_ready(conn)
+        for changed in dependents(table, self._all_tables()):
+            _upsert(conn, changed.name)
+
+    def _read(self, conn: Connection, names: Sequence[str]) -> Dict[str, int]:
+        self.ensure_ready(conn)
+        rows = conn.execute(
+            select(table_versions.c.table_name, table_versions.c.version)
+            .where(table_versions.c.table_name.in_(list(names)))
+        )
+        return {**{name: 0 for name in names}, **dict(rows.all())}
+
+    def current(self, read_engine: Engine, names: Sequence[str]) -> Dict[str, int]:
+        """Versions of ``names`` as seen by ``read_engine`` (primary or a replica)."""
+        if read_engine is self.engine:
+            self._ensure_listener()
+            if self._listening:
+                with self._lock:
+                    return {name: self._memory.get(name, 0) for name in names}
+        with read_engine.connect() as conn:
+            return self._read(conn, names)
+
+    # LISTEN/NOTIFY
+
+    def _ensure_listener(self) -> None:
+        if not self.triggers or self.engine.dialect.driver != "psycopg2" or self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            # Threads do not survive fork, so each worker starts its own.
+            self._listener_pid = os.getpid()
+            self._listening = False
+            threading.Thread(target=self._listen, name="table-versions-listener", daemon=True).start()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                raw = self.engine.raw_connection()
+                raw.detach()
+                driver = raw.driver_connection
+                driver.autocommit = True
+                try:
+                    with driver.cursor() as cursor:
+                        cursor.execute(f"LISTEN {CHANNEL}")
+                        cursor.execute(f"SELECT table_name, version FROM {VERSIONS_TABLE}")
+                        loaded = dict(cursor.fetchall())
+                    with self._lock:
+                        self._memory = loaded
+                        self._listening = True
+                    while True:
+                        if select_module.select([driver], [], [], 60) == ([], [], []):
+                            continue
+                        driver.poll()
+                        updates = [notify.payload.rsplit(":", 1) for notify in driver.notifies]
+                        driver.notifies.clear()
+                        with self._lock:
+                            for name, version in updates:
+                                self._memory[name] = max(self._memory.get(name, 0), int(version))
+                finally:
+                    self._listening = False
+                    raw.close()
+            except Exception:
+                # Fall back to per-request reads until the listener reconnects.
+                self._listening = False
+                time.sleep(LISTEN_RETRY_SECONDS)
+
+
+def page_etag(fingerprint: str, parts: Iterable[object]) -> str:
+    digest = hashlib.sha256(fingerprint.encode("utf-8"))
+    for part in parts:
+        digest.update(b"\0" + repr(part).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+class PageCache:
+    """An LRU of rendered pages, bounded by entry count."""
+
+    def __init__(self, max_entries: int = 0) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Tuple) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            page = self._entries.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key: Tuple, page: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = page
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def filling(self, key: Tuple, chunks: Iterable[str]) -> Iterator[str]:
+        """Pass ``chunks`` through and store the page once it is complete."""
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.put(key, "".join(parts))
+
+
+def page_cache_from_env() -> PageCache:
+    return PageCache(int(os.getenv("PAGE_CACHE_ENTRIES", "0")))
@@ -0,0 +1,37 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """app.py against a fresh SQLite database seeded from assigm3.sql."""
+    database = tmp_path_factory.mktemp("db") / "test.db"
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    return importlib.import_module("app")
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture(scope="session")
+def asgi_module(app_module):
+    """asgi_app.py on the same database as ``app_module``."""
+    return importlib.import_module("asgi_app")
+
+
+@pytest.fixture
+def conn(app_module):
+    """A connection to the test database whose transaction is rolled back."""
+    with app_module.engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            yield connection
+        finally:
+            transaction.rollback()
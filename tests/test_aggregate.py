@@ -0,0 +1,93 @@
+import re
+
+import pytest
+from sqlalchemy import func, select, true
+
+from aggregate import AggregateQuery, AggregateTimeout, parse_aggregate, run_aggregate
+from reporting import source_queries
+
+EARNINGS = {
+    "table": "appointment",
+    "join": ["caregiver", {"table": "users", "as": "c", "via": "caregiver.caregiver_user_id"}],
+    "group_by": ["caregiver.caregiver_user_id", "c.given_name", "c.surname"],
+    "aggregates": [{"fn": "sum", "expr": "work_hours", "as": "total_hours"}],
+    "filters": {"status": "confirmed"},
+}
+
+
+def test_spec_compiles_to_the_report_query(app_module, conn):
+    query = parse_aggregate(EARNINGS, app_module.schema.get_table)
+    result = run_aggregate(conn, query)
+
+    _, expected = source_queries(app_module.schema.get_table)["6.2"]
+    assert result["columns"] == ["caregiver_user_id", "given_name", "surname", "total_hours"]
+    assert sorted(map(tuple, result["rows"])) == sorted(map(tuple, conn.execute(expected)))
+    assert query.tables == ["appointment", "caregiver", "users"]
+
+
+def test_normalized_spec_ignores_filter_order(app_module):
+    first = parse_aggregate({**EARNINGS, "filters": {"status": "confirmed", "work_hours__gte": 1}},
+                            app_module.schema.get_table)
+    second = parse_aggregate({**EARNINGS, "filters": {"work_hours__gte": 1, "status": "confirmed"}},
+                             app_module.schema.get_table)
+    assert first.normalized == second.normalized
+
+
+def test_limit_is_capped_and_reports_truncation(app_module, conn):
+    query = parse_aggregate({**EARNINGS, "limit": 1000}, app_module.schema.get_table, max_rows=2)
+    assert query.limit == 2
+    result = run_aggregate(conn, query)
+    assert result["row_count"] == 2
+    assert result["truncated"] is True
+    with pytest.raises(ValueError, match="'limit' must be an integer"):
+        parse_aggregate({**EARNINGS, "limit": "all"}, app_module.schema.get_table)
+
+
+def test_too_many_joins_are_rejected(app_module):
+    with pytest.raises(ValueError, match="At most 1 joins"):
+        parse_aggregate(EARNINGS, app_module.schema.get_table, max_joins=1)
+
+
+@pytest.mark.parametrize("expr, message", [
+    ("work_hours +", "Unexpected 'end'"),
+    ("(work_hours * 2", "Missing ')'"),
+    ("work_hours; DROP TABLE users", "Cannot parse expression"),
+    # Function calls are not part of the grammar.
+    ("lower(work_hours)", "Unknown column 'lower'"),
+    ("nope", "Unknown column 'nope'"),
+    ("users.given_name", "Unknown source 'users'"),
+])
+def test_bad_expressions_are_rejected(app_module, expr, message):
+    spec = {**EARNINGS, "aggregates": [{"fn": "sum", "expr": expr}]}
+    with pytest.raises(ValueError, match=re.escape(message)):
+        parse_aggregate(spec, app_module.schema.get_table)
+
+
+def test_unknown_function_and_ambiguous_column_are_rejected(app_module):
+    with pytest.raises(ValueError, match="Unknown aggregate function 'median'"):
+        parse_aggregate({**EARNINGS, "aggregates": [{"fn": "median", "expr": "work_hours"}]},
+                        app_module.schema.get_table)
+    with pytest.raises(ValueError, match="ambiguous"):
+        parse_aggregate({**EARNINGS, "group_by": ["caregiver_user_id"]}, app_module.schema.get_table)
+
+
+def test_statement_timeout_interrupts_a_slow_query(app_module, conn):
+    users = app_module.schema.get_table("users")
+    source = users
+    for number in range(6):
+        source = source.join(users.alias(f"u{number}"), true())
+    query = AggregateQuery(select(func.count()).select_from(source), ["count"], ["users"], 1, "")
+    with pytest.raises(AggregateTimeout):
+        run_aggregate(conn, query, timeout_ms=1)
+
+
+def test_api_rejects_bad_specs_and_caches_results(client):
+    response = client.post("/api/aggregate", json={"table": "nope"})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Unknown table 'nope'"}
+
+    first = client.post("/api/aggregate", json=EARNINGS)
+    second = client.post("/api/aggregate", json=EARNINGS)
+    assert first.status_code == second.status_code == 200
+    assert second.get_json()["rows"] == first.get_json()["rows"]
+    assert second.headers["X-Aggregate-Cache"] == "hit"
@@ -0,0 +1,47 @@
+import asyncio
+
+from sqlalchemy import select
+
+USER = {
+    "user_id": "9001",
+    "email": "asgi.test@example.com",
+    "given_name": "Asel",
+    "surname": "Tulegenova",
+    "city": "Almaty",
+    "phone_number": "+77010000000",
+    "profile_description": "",
+    "password": "secret",
+}
+
+
+def test_create_edit_delete_round_trip(asgi_module, app_module):
+    users = app_module.schema.get_table("users")
+
+    def stored():
+        with app_module.engine.connect() as conn:
+            row = conn.execute(select(users).where(users.c.user_id == 9001)).first()
+        return row._mapping if row is not None else None
+
+    async def round_trip():
+        async with asgi_module.app.test_app() as test_app:
+            client = test_app.test_client()
+            response = await client.post("/table/users/create", form=USER)
+            assert response.status_code == 302
+            assert stored()["given_name"] == "Asel"
+
+            response = await client.get("/table/users/edit?user_id=9001")
+            assert response.status_code == 200
+            assert "Tulegenova" in await response.get_data(as_text=True)
+
+            response = await client.post("/table/users/edit", form={**USER, "given_name": "Aselya"})
+            assert response.status_code == 302
+            assert stored()["given_name"] == "Aselya"
+
+            response = await client.post("/table/users/delete", form={"user_id": "9001"})
+            assert response.status_code == 302
+            assert stored() is None
+
+            response = await client.get("/table/users/edit?user_id=9001")
+            assert response.status_code == 404
+
+    asyncio.run(round_trip())
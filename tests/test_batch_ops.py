@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from batch_ops import delete_keys, key_filter, parse_keys, parse_values, update_rows
+
+
+def rates(conn, caregiver, keys):
+    rows = conn.execute(select(caregiver.c.caregiver_user_id, caregiver.c.hourly_rate)
+                        .where(caregiver.c.caregiver_user_id.in_(keys)))
+    return {key: float(rate) for key, rate in rows}
+
+
+def test_same_values_update_with_one_in(app_module, conn):
+    plan = app_module.schema.plan("caregiver")
+    keys = parse_keys(plan, [{"caregiver_user_id": 2}, {"caregiver_user_id": "3"}])
+    values = parse_values(plan, {"hourly_rate": "11.50"})
+
+    report = update_rows(conn, plan, [(key, values) for key in keys])
+
+    assert report.method == "update-in"
+    assert report.as_dict()["statements"] == 1
+    assert report.rows_affected == 2
+    assert rates(conn, plan.table, [2, 3]) == {2: 11.5, 3: 11.5}
+
+
+def test_per_row_values_use_executemany_outside_postgresql(app_module, conn):
+    plan = app_module.schema.plan("caregiver")
+    rows = [((2,), {"hourly_rate": 12}), ((3,), {"hourly_rate": 13}), ((2,), {"hourly_rate": 14})]
+
+    report = update_rows(conn, plan, rows)
+
+    assert report.method == "executemany"
+    # A key listed twice keeps its last values.
+    assert report.keys == 2
+    assert rates(conn, plan.table, [2, 3]) == {2: 14.0, 3: 13.0}
+
+
+def test_per_row_values_use_a_values_list_on_postgresql(app_module):
+    plan = app_module.schema.plan("caregiver")
+    statements = []
+
+    def execute(statement, parameters=None):
+        statements.append(statement)
+        return SimpleNamespace(rowcount=2)
+
+    fake = SimpleNamespace(dialect=postgresql.dialect(), execute=execute)
+    report = update_rows(fake, plan, [((2,), {"hourly_rate": 12}), ((3,), {"hourly_rate": 13})])
+
+    assert report.method == "update-from-values"
+    sql = str(statements[0].compile(dialect=postgresql.dialect()))
+    assert "FROM (VALUES" in sql
+    assert "CAST(v.caregiver_user_id AS INTEGER)" in sql
+
+
+def test_composite_keys_delete_with_tuple_in_per_chunk(app_module, conn):
+    plan = app_module.schema.plan("job_application")
+    table = plan.table
+    existing = [tuple(row) for row in conn.execute(
+        select(table.c.caregiver_user_id, table.c.job_id).order_by(table.c.caregiver_user_id, table.c.job_id).limit(3)
+    )]
+
+    report = delete_keys(conn, plan, existing + [existing[0]], chunk_size=2)
+
+    assert report.method == "tuple-in"
+    assert [chunk.keys for chunk in report.chunks] == [2, 1]
+    assert report.rows_affected == 3
+    assert conn.execute(select(table).where(key_filter(plan, existing))).all() == []
+
+
+def test_parse_keys_rejects_incomplete_keys(app_module):
+    plan = app_module.schema.plan("job_application")
+    with pytest.raises(ValueError, match="missing primary key field 'job_id'"):
+        parse_keys(plan, [{"caregiver_user_id": 1}])
+    with pytest.raises(ValueError, match="not an object"):
+        parse_keys(plan, [[1, 2]])
+
+
+def test_parse_values_rejects_unknown_columns(app_module):
+    with pytest.raises(ValueError, match="Unknown column 'nope'"):
+        parse_values(app_module.schema.plan("caregiver"), {"nope": 1})
@@ -0,0 +1,114 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Numeric, String, Table, create_engine, func, select
+from sqlalchemy.dialects import postgresql
+
+from bulk_import import _copy_batch, import_rows, load_rows, read_rows
+
+
+@pytest.fixture
+def target(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    table = Table(
+        "rates",
+        MetaData(),
+        Column("rate_id", Integer, primary_key=True, autoincrement=False),
+        Column("name", String(20), nullable=False, unique=True),
+        Column("hourly_rate", Numeric(10, 2)),
+    )
+    table.metadata.create_all(engine)
+    yield engine, table
+    engine.dispose()
+
+
+def stored(engine, table):
+    with engine.connect() as conn:
+        return conn.execute(select(table.c.rate_id).order_by(table.c.rate_id)).scalars().all()
+
+
+CSV = """rate_id,name,hourly_rate
+1,a,10
+2,b,not-a-number
+3,c,12
+4,a,13
+5,e,14
+"""
+
+
+def test_a_rejected_batch_is_retried_row_by_row(target):
+    engine, table = target
+    report = import_rows(engine, table, read_rows(io.StringIO(CSV), "csv"), batch_size=10)
+
+    # Line 3 fails coercion before the batch; line 5 repeats the unique name
+    # of line 2, so the batch fails and is retried row by row in savepoints.
+    assert stored(engine, table) == [1, 3, 5]
+    assert report.rows_read == 5
+    assert report.rows_inserted == 3
+    assert report.batches == 1
+    assert [error.line for error in report.errors] == [3, 5]
+    assert "UNIQUE" in report.errors[1].message
+
+
+def test_a_failing_batch_does_not_undo_earlier_batches(target):
+    engine, table = target
+    report = import_rows(engine, table, read_rows(io.StringIO(CSV), "csv"), batch_size=2)
+    assert report.batches == 2
+    assert stored(engine, table) == [1, 3, 5]
+    assert report.error_count == 2
+
+
+def test_jsonl_reports_malformed_lines(target):
+    engine, table = target
+    lines = '{"rate_id": 1, "name": "a", "hourly_rate": null}\n\n{oops\n[1, 2]\n{"rate_id": 2, "name": "b"}\n'
+    report = import_rows(engine, table, read_rows(io.StringIO(lines), "jsonl"))
+    assert stored(engine, table) == [1, 2]
+    assert [error.line for error in report.errors] == [3, 4]
+    assert report.errors[1].message == "expected a JSON object"
+
+
+def test_load_rows_is_all_or_nothing(target):
+    engine, table = target
+    with pytest.raises(ValueError, match="rates line 3"):
+        with engine.begin() as conn:
+            load_rows(conn, table, read_rows(io.StringIO(CSV), "csv"))
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(table)).scalar() == 0
+
+
+class FakeCopyCursor:
+    def __init__(self):
+        self.reads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def copy_expert(self, statement, source, size=8):
+        self.statement = statement
+        while True:
+            chunk = source.read(size)
+            if not chunk:
+                break
+            self.reads.append(chunk)
+
+
+def test_copy_batch_renders_rows_as_the_driver_reads_them(target):
+    _, table = target
+    cursor = FakeCopyCursor()
+    driver_connection = SimpleNamespace(cursor=lambda: cursor)
+    conn = SimpleNamespace(dialect=postgresql.dialect(),
+                           connection=SimpleNamespace(driver_connection=driver_connection))
+    payloads = [
+        {"rate_id": 1, "name": 'say "hi"', "hourly_rate": None},
+        {"rate_id": 2, "name": "b", "hourly_rate": 9},
+    ]
+
+    _copy_batch(conn, table, ["rate_id", "name", "hourly_rate"], payloads)
+
+    assert cursor.statement == "COPY rates (rate_id, name, hourly_rate) FROM STDIN WITH (FORMAT csv)"
+    assert all(len(chunk) <= 8 for chunk in cursor.reads)
+    assert "".join(cursor.reads) == '"1","say ""hi""",\n"2","b","9"\n'
@@ -0,0 +1,11 @@
+import datetime
+import decimal
+import json
+
+from export import jsonl_chunks
+
+
+def test_jsonl_uses_the_aggregate_json_encoding():
+    rows = [(1, decimal.Decimal("2.50"), datetime.date(2024, 1, 31), b"x")]
+    (chunk,) = jsonl_chunks(["id", "price", "day", "raw"], iter([rows]))
+    assert json.loads(chunk) == {"id": 1, "price": 2.5, "day": "2024-01-31", "raw": "b'x'"}
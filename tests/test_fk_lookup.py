@@ -0,0 +1,14 @@
+from sqlalchemy import Integer, MetaData, Table
+
+from fk_lookup import _integer_prefix
+
+
+def test_integer_prefix_on_reflected_integer_key(app_module):
+    users = Table("users", MetaData(), autoload_with=app_module.engine)
+    key = users.c.user_id
+    # Reflection gives the dialect's INTEGER, a subclass of Integer.
+    assert isinstance(key.type, Integer) and type(key.type) is not Integer
+
+    clause = _integer_prefix(key, "12")
+    # 12, 120-129, ... up to 10 digits: 9 ranges, not the 18 of a BIGINT.
+    assert len(clause.clauses) == 9
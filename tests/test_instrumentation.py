@@ -0,0 +1,54 @@
+import logging
+
+from sqlalchemy import Column, MetaData, String, Table, create_engine, event, select
+
+from instrumentation import Instrumentation
+
+
+def test_streamed_table_page_counts_its_queries(app_module, client):
+    queries = app_module.instrumentation.request_queries
+    before_count, before_sum = queries.totals("view_table")
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(app_module.engine, "after_cursor_execute", record)
+    try:
+        response = client.get("/table/users?page_size=5")
+        assert response.is_streamed
+        assert "Server-Timing" not in response.headers
+        # Nothing is recorded until the body has run and been closed.
+        assert queries.totals("view_table") == (before_count, before_sum)
+        body = response.get_data(as_text=True)
+        response.close()
+    finally:
+        event.remove(app_module.engine, "after_cursor_execute", record)
+
+    assert "<table" in body
+    assert any(statement.lstrip().startswith("SELECT") and "FROM users" in statement for statement in statements)
+    count, total = queries.totals("view_table")
+    assert count == before_count + 1
+    assert total - before_sum == len(statements)
+
+
+def test_buffered_response_keeps_server_timing(client):
+    response = client.get("/")
+    # pysqlite leaves rowcount at -1 for SELECT, so no row count is claimed.
+    assert 'queries, rows not reported by the driver"' in response.headers["Server-Timing"]
+
+
+def test_slow_log_redacts_secret_parameters(caplog):
+    engine = create_engine("sqlite://")
+    Instrumentation(slow_query_ms=0).instrument_engine(engine)
+    accounts = Table("accounts", MetaData(), Column("name", String), Column("password", String),
+                     Column("api_token", String))
+    with engine.begin() as conn, caplog.at_level(logging.WARNING, logger="sql.slow"):
+        accounts.create(conn)
+        conn.execute(accounts.insert().values(name="alice", password="hunter2", api_token="t0k3n"))
+        conn.execute(select(accounts.c.name).where(accounts.c.password == "hunter2"))
+
+    logged = "\n".join(record.getMessage() for record in caplog.records)
+    assert "'alice'" in logged
+    assert "hunter2" not in logged and "t0k3n" not in logged
+    assert "'password_1': '<redacted>'" in logged
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from migrations.index_specs import IndexSpec, index_statements
+
+INDEXES = [
+    IndexSpec("ix_a", "t", "(a)"),
+    IndexSpec("ix_b", "t", "(lower(b) text_pattern_ops)", ("postgresql",)),
+]
+
+
+def fake_conn(dialect, invalid=()):
+    queries = []
+
+    def execute(statement, parameters):
+        queries.append(parameters)
+        return SimpleNamespace(scalars=lambda: [name for name in invalid if name in parameters["names"]])
+
+    return SimpleNamespace(dialect=dialect, execute=execute, queries=queries)
+
+
+def test_invalid_leftovers_are_dropped_before_create_if_not_exists():
+    conn = fake_conn(postgresql.dialect(), invalid=["ix_b"])
+    assert index_statements(conn, INDEXES, concurrently=True) == [
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_b",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_a ON t (a)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_b ON t (lower(b) text_pattern_ops)",
+    ]
+    assert conn.queries == [{"names": ["ix_a", "ix_b"]}]
+
+
+def test_valid_indexes_are_left_alone():
+    conn = fake_conn(postgresql.dialect())
+    assert index_statements(conn, INDEXES) == [
+        "CREATE INDEX IF NOT EXISTS ix_a ON t (a)",
+        "CREATE INDEX IF NOT EXISTS ix_b ON t (lower(b) text_pattern_ops)",
+    ]
+
+
+def test_other_dialects_skip_the_check():
+    conn = fake_conn(sqlite.dialect())
+    assert index_statements(conn, INDEXES, concurrently=True) == ["CREATE INDEX IF NOT EXISTS ix_a ON t (a)"]
+    assert conn.queries == []
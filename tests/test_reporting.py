@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+from sqlalchemy import insert, select
+
+from reporting import CAREGIVERS, JOBS, source_queries
+
+
+def _number(value):
+    return round(float(value or 0), 2)
+
+
+def _rounded(rows):
+    return sorted(tuple(_number(value) if isinstance(value, (Decimal, float)) else value for value in row)
+                  for row in rows)
+
+
+def assert_summaries_match_sources(store, conn):
+    """Every summary-backed report equals its query over the base tables."""
+    queries = {number: statement for number, (_, statement) in source_queries(store.table).items()}
+
+    def source(number):
+        return conn.execute(queries[number]).all()
+
+    summary = store.applicants_per_job(conn)
+    assert _rounded(row.values() for row in summary) == _rounded(source("6.1"))
+    hours = [row for row in store.confirmed_hours(conn) if row["total_hours"]]
+    assert _rounded(row.values() for row in hours) == _rounded(source("6.2"))
+    assert _number(store.average_payout(conn)["avg_payout"]) == _number(source("6.3")[0][0])
+    assert _number(store.total_confirmed_cost(conn)["total_cost"]) == _number(source("7")[0][0])
+    earners = {row["caregiver_user_id"] for row in store.above_average_earners(conn)}
+    assert earners == {row.caregiver_user_id for row in source("6.4")}
+
+
+def test_rebuild_matches_source_queries(app_module, conn):
+    app_module.reports.rebuild(conn)
+    assert_summaries_match_sources(app_module.reports, conn)
+
+
+def test_refresh_after_confirming_an_appointment(app_module, conn):
+    store, appointment = app_module.reports, app_module.schema.get_table("appointment")
+    store.rebuild(conn)
+    pending = conn.execute(select(appointment.c.appointment_id).where(appointment.c.status == "pending")).scalar()
+    where = [appointment.c.appointment_id == pending]
+
+    before = store.capture(conn, appointment, where)
+    conn.execute(appointment.update().where(*where).values(status="confirmed", work_hours=7))
+    store.refresh(conn, before, store.capture(conn, appointment, where))
+
+    assert before[CAREGIVERS] and not before[JOBS]
+    assert_summaries_match_sources(store, conn)
+
+
+def test_refresh_after_a_rate_change_and_a_caregiver_delete(app_module, conn):
+    store, caregiver = app_module.reports, app_module.schema.get_table("caregiver")
+    store.rebuild(conn)
+    first, second = conn.execute(
+        select(caregiver.c.caregiver_user_id).order_by(caregiver.c.caregiver_user_id).limit(2)
+    ).scalars()
+
+    where = [caregiver.c.caregiver_user_id == first]
+    conn.execute(caregiver.update().where(*where).values(hourly_rate=99))
+    store.refresh(conn, store.capture(conn, caregiver, where))
+    assert_summaries_match_sources(store, conn)
+
+    where = [caregiver.c.caregiver_user_id == second]
+    touched = store.capture(conn, caregiver, where)
+    conn.execute(caregiver.delete().where(*where))
+    store.refresh(conn, touched)
+    assert_summaries_match_sources(store, conn)
+
+
+def test_refresh_after_a_new_application(app_module, conn):
+    store = app_module.reports
+    job_application, job = app_module.schema.get_table("job_application"), app_module.schema.get_table("job")
+    store.rebuild(conn)
+    applied = select(job_application.c.job_id).where(job_application.c.caregiver_user_id == 1)
+    job_id = conn.execute(select(job.c.job_id).where(job.c.job_id.not_in(applied)).limit(1)).scalar()
+
+    conn.execute(insert(job_application).values(caregiver_user_id=1, job_id=job_id))
+    where = [job_application.c.caregiver_user_id == 1, job_application.c.job_id == job_id]
+    touched = store.capture(conn, job_application, where)
+    store.refresh(conn, touched)
+
+    assert touched[JOBS] == {job_id}
+    assert_summaries_match_sources(store, conn)
+
+
+def test_capture_ignores_tables_outside_the_reports(app_module, conn):
+    address = app_module.schema.get_table("address")
+    touched = app_module.reports.capture(conn, address, [address.c.member_user_id == 1])
+    assert touched == {CAREGIVERS: set(), JOBS: set()}
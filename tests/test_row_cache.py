@@ -0,0 +1,120 @@
+import pickle
+
+import pytest
+
+from row_cache import MemoryBackend, RowCache, row_cache_from_env
+
+
+def loader(row, calls):
+    def load():
+        calls.append(1)
+        return row
+    return load
+
+
+def test_rows_are_loaded_once_then_served_from_memory():
+    cache, calls = RowCache(MemoryBackend()), []
+    for _ in range(3):
+        assert cache.get_or_load("users", (1,), loader({"user_id": 1}, calls)) == {"user_id": 1}
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_missing_rows_are_not_cached():
+    cache, calls = RowCache(MemoryBackend()), []
+    cache.get_or_load("users", (1,), loader(None, calls))
+    cache.get_or_load("users", (1,), loader(None, calls))
+    assert len(calls) == 2
+
+
+def test_discard_drops_one_row_and_invalidate_a_whole_table():
+    cache, calls = RowCache(MemoryBackend()), []
+    for key in [(1,), (2,)]:
+        cache.get_or_load("users", key, loader({"user_id": key[0]}, calls))
+    cache.get_or_load("job", (1,), loader({"job_id": 1}, calls))
+
+    cache.discard("users", [(1,)])
+    cache.get_or_load("users", (1,), loader({"user_id": 1}, calls))
+    cache.get_or_load("users", (2,), loader({"user_id": 2}, calls))
+    assert len(calls) == 4
+
+    cache.invalidate(["users"])
+    cache.get_or_load("users", (2,), loader({"user_id": 2}, calls))
+    cache.get_or_load("job", (1,), loader({"job_id": 1}, calls))
+    assert len(calls) == 5
+
+
+def test_memory_backend_evicts_least_recently_used_by_bytes():
+    size = len(pickle.dumps({"value": "x" * 100}, protocol=pickle.HIGHEST_PROTOCOL))
+    backend = MemoryBackend(max_bytes=size * 2)
+    cache, calls = RowCache(backend), []
+    cache.get_or_load("t", (1,), loader({"value": "x" * 100}, calls))
+    cache.get_or_load("t", (2,), loader({"value": "y" * 100}, calls))
+    cache.get_or_load("t", (1,), loader({"value": "x" * 100}, calls))  # 1 is now the most recent
+    cache.get_or_load("t", (3,), loader({"value": "z" * 100}, calls))
+
+    assert backend.stats() == {"entries": 2, "bytes": size * 2, "max_bytes": size * 2, "evictions": 1}
+    cache.get_or_load("t", (1,), loader({"value": "x" * 100}, calls))
+    assert len(calls) == 3
+    cache.get_or_load("t", (2,), loader({"value": "y" * 100}, calls))
+    assert len(calls) == 4
+
+
+def test_memory_backend_skips_rows_larger_than_the_budget():
+    backend = MemoryBackend(max_bytes=10)
+    backend.set("big", b"x" * 11)
+    assert backend.get("big") is None and backend.bytes == 0
+
+
+def test_memory_backend_expires_rows(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("row_cache.time.monotonic", lambda: now[0])
+    backend = MemoryBackend(ttl=60)
+    backend.set("k", b"v")
+    now[0] += 59
+    assert backend.get("k") == b"v"
+    now[0] += 2
+    assert backend.get("k") is None and backend.bytes == 0
+
+
+def test_a_failing_backend_falls_back_to_loading():
+    class Down:
+        def __getattr__(self, name):
+            def fail(*args):
+                raise ConnectionError("cache is down")
+            return fail
+
+    cache, calls = RowCache(Down()), []
+    assert cache.get_or_load("users", (1,), loader({"user_id": 1}, calls)) == {"user_id": 1}
+    cache.discard("users", [(1,)])
+    cache.invalidate(["users"])
+    # The key is built from the generation, so a failed get skips the set.
+    assert cache.errors == 3
+
+
+def test_backend_is_chosen_from_the_environment(monkeypatch):
+    monkeypatch.setenv("ROW_CACHE_BACKEND", "memory")
+    monkeypatch.setenv("ROW_CACHE_MAX_BYTES", "1234")
+    assert row_cache_from_env().stats()["max_bytes"] == 1234
+    monkeypatch.setenv("ROW_CACHE_BACKEND", "nope")
+    with pytest.raises(ValueError):
+        row_cache_from_env()
+
+
+def test_edit_form_sees_its_own_update(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "row_cache", RowCache(MemoryBackend()))
+    assert "Nurgaliyev" in client.get("/table/users/edit?user_id=1").get_data(as_text=True)
+    assert app_module.row_cache.stats()["misses"] == 1
+    assert client.get("/table/users/edit?user_id=1").status_code == 200
+    assert app_module.row_cache.stats()["hits"] == 1
+
+    users = app_module.schema.get_table("users")
+    with app_module.engine.connect() as conn:
+        row = dict(conn.execute(users.select().where(users.c.user_id == 1)).one()._mapping)
+    try:
+        values = {name: "" if value is None else str(value) for name, value in row.items()}
+        client.post("/table/users/edit", data={**values, "surname": "Cached"})
+        assert "Cached" in client.get("/table/users/edit?user_id=1").get_data(as_text=True)
+    finally:
+        with app_module.engine.begin() as conn:
+            conn.execute(users.update().where(users.c.user_id == 1).values(surname=row["surname"]))
@@ -0,0 +1,47 @@
+import pytest
+
+from sql_script import STRING, segments, split_statements
+
+
+def test_comments_are_not_statement_boundaries():
+    sql = "SELECT 1; -- a; b\nSELECT /* c; /* nested; */ d; */ 2;"
+    assert split_statements(sql) == ["SELECT 1", "SELECT   2"]
+
+
+def test_doubled_quotes_stay_inside_the_string():
+    assert split_statements("INSERT INTO t VALUES ('it''s; fine'); SELECT 2") == [
+        "INSERT INTO t VALUES ('it''s; fine')",
+        "SELECT 2",
+    ]
+
+
+def test_e_strings_take_backslash_escapes():
+    assert split_statements(r"SELECT E'a\'; b'; SELECT 2;") == [r"SELECT E'a\'; b'", "SELECT 2"]
+    assert (STRING, r"E'a\''") in list(segments(r"SELECT E'a\''"))
+
+
+def test_backslash_is_literal_in_plain_strings():
+    # "name'" ends in e, but it is an identifier, not an E prefix.
+    assert split_statements(r"SELECT name'\'; SELECT 2") == [r"SELECT name'\'", "SELECT 2"]
+
+
+def test_string_at_offset_zero_is_not_an_e_string():
+    assert split_statements(r"'a\'; SELECT 1;") == [r"'a\'", "SELECT 1"]
+
+
+def test_dollar_quoted_bodies():
+    sql = "CREATE FUNCTION f() RETURNS int AS $body$ SELECT 1; $x$ $body$ LANGUAGE sql; SELECT $$;$$"
+    assert split_statements(sql) == [
+        "CREATE FUNCTION f() RETURNS int AS $body$ SELECT 1; $x$ $body$ LANGUAGE sql",
+        "SELECT $$;$$",
+    ]
+
+
+def test_quoted_identifiers():
+    assert split_statements('SELECT "a;""b" FROM t; SELECT 2') == ['SELECT "a;""b" FROM t', "SELECT 2"]
+
+
+@pytest.mark.parametrize("sql", ["SELECT 'open", "SELECT $$open", 'SELECT "open', "SELECT /* open"])
+def test_unterminated_literals_raise(sql):
+    with pytest.raises(ValueError):
+        split_statements(sql)